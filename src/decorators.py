@@ -1,6 +1,22 @@
 #!/usr/bin/env python3
 
+import sys
 import time
+from collections import OrderedDict
+
+# Режим выполнения: печать времени (log_time) и автоответ на подтверждения
+# (None — спрашивать пользователя, True/False — ответить без вопроса)
+_SETTINGS = {"log_time": True, "auto_confirm": None}
+
+
+def set_log_time_enabled(enabled: bool) -> None:
+    """Включает или отключает вывод времени выполнения декоратором log_time."""
+    _SETTINGS["log_time"] = enabled
+
+
+def set_auto_confirm(answer: bool | None) -> None:
+    """Задаёт автоответ для confirm_action (None — спрашивать пользователя)."""
+    _SETTINGS["auto_confirm"] = answer
 
 
 def _copy_func_attrs(wrapper, func):
@@ -15,7 +31,10 @@ def log_time(func):
         start = time.monotonic()
         result = func(*args, **kwargs)
         duration = time.monotonic() - start
-        print(f"Функция {func.__name__} выполнилась за {duration:.3f} секунд.")
+        if _SETTINGS["log_time"]:
+            print(
+                f"Функция {func.__name__} выполнилась за {duration:.3f} секунд."
+            )
         return result
 
     _copy_func_attrs(wrapper, func)
@@ -42,6 +61,11 @@ def handle_db_errors(func):
             if 'metadata' in str(func.__name__) or 'table' in str(func.__name__):
                 return args[0] if args else {}
             return []
+        except TimeoutError as e:
+            print(f"Ошибка: превышено время ожидания - {e}")
+            if 'metadata' in str(func.__name__) or 'table' in str(func.__name__):
+                return args[0] if args else {}
+            return []
         except Exception as e:
             print(f"Неожиданная ошибка: {e}")
             if 'metadata' in str(func.__name__) or 'table' in str(func.__name__):
@@ -56,6 +80,13 @@ def confirm_action(action_name: str):
     """Декоратор: запрашивает подтверждение (y/n) перед выполнением функции."""
     def decorator(func):
         def wrapper(*args, **kwargs):
+            auto_confirm = _SETTINGS["auto_confirm"]
+            if auto_confirm is not None:
+                if not auto_confirm:
+                    print(f'Операция "{action_name}" отменена без подтверждения.')
+                    return None
+                return func(*args, **kwargs)
+
             try:
                 prompt = 'Вы уверены, что хотите выполнить "{}"? [y/n]: '
                 msg = prompt.format(action_name)
@@ -75,16 +106,86 @@ def confirm_action(action_name: str):
     return decorator
 
 
-def create_cacher():
-    """Замыкание для кэширования результатов (например, select)."""
-    cache = {}
+def _estimate_size(value) -> int:
+    """Приблизительный размер значения в байтах (с вложенными списками/словарями)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += sys.getsizeof(k) + _estimate_size(v)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += _estimate_size(item)
+    return size
+
+
+def create_cacher(max_entries: int | None = None, max_bytes: int | None = None):
+    """Замыкание для кэширования результатов (например, select).
+
+    Кэш вытесняет давно не использованные записи (LRU), когда превышен лимит
+    числа записей max_entries или суммарного размера max_bytes (None — без
+    лимита). Статистика доступна через cache_info(), очистка — cache_clear(),
+    смена лимитов и отключение — cache_configure().
+    """
+    cache = OrderedDict()
+    settings = {
+        "enabled": True,
+        "max_entries": max_entries,
+        "max_bytes": max_bytes,
+    }
+    stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+
+    def _evict() -> None:
+        """Вытесняет самые старые записи, пока кэш не уложится в лимиты."""
+        limit_entries = settings["max_entries"]
+        limit_bytes = settings["max_bytes"]
+        while cache and (
+            (limit_entries is not None and len(cache) > limit_entries)
+            or (limit_bytes is not None and stats["bytes"] > limit_bytes)
+        ):
+            _, (_, size) = cache.popitem(last=False)
+            stats["bytes"] -= size
+            stats["evictions"] += 1
 
     def cache_result(key, value_func):
         """Возвращает значение по ключу из кэша или вычисляет и кэширует."""
+        if not settings["enabled"]:
+            return value_func()
+
         if key in cache:
-            return cache[key]
+            cache.move_to_end(key)
+            stats["hits"] += 1
+            return cache[key][0]
+
+        stats["misses"] += 1
         result = value_func()
-        cache[key] = result
+        size = _estimate_size(result)
+        cache[key] = (result, size)
+        stats["bytes"] += size
+        _evict()
         return result
 
+    def cache_info() -> dict:
+        """Возвращает статистику и настройки кэша."""
+        return {**stats, "entries": len(cache), **settings}
+
+    def cache_clear() -> None:
+        """Очищает кэш (статистика попаданий сохраняется)."""
+        cache.clear()
+        stats["bytes"] = 0
+
+    def cache_configure(enabled=None, max_entries=None, max_bytes=None) -> None:
+        """Меняет настройки кэша; отключение кэша очищает его."""
+        if enabled is not None:
+            settings["enabled"] = enabled
+            if not enabled:
+                cache_clear()
+        if max_entries is not None:
+            settings["max_entries"] = max_entries
+        if max_bytes is not None:
+            settings["max_bytes"] = max_bytes
+        _evict()
+
+    cache_result.cache_info = cache_info
+    cache_result.cache_clear = cache_clear
+    cache_result.cache_configure = cache_configure
     return cache_result
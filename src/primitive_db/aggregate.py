@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""Агрегатные функции (COUNT, SUM, MIN, MAX, AVG) и группировка GROUP BY.
+
+Строки обрабатываются за один потоковый проход: для каждой группы хранятся
+только накопители агрегатов, сами строки в памяти не собираются. Накопители,
+посчитанные по частям таблицы (см. parallel.py), объединяются методом merge.
+"""
+
+AGGREGATE_FUNCTIONS = ("COUNT", "SUM", "MIN", "MAX", "AVG")
+# Типы колонок, к которым применимы SUM и AVG
+NUMERIC_TYPES = {"int", "float"}
+
+
+class Count:
+    """COUNT(*) — число строк, COUNT(col) — число непустых значений."""
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, value) -> None:
+        """Учитывает очередное значение."""
+        if value is not None:
+            self.count += 1
+
+    def merge(self, other: "Count") -> None:
+        """Добавляет итог другого накопителя."""
+        self.count += other.count
+
+    def result(self):
+        """Возвращает итог."""
+        return self.count
+
+
+class Sum:
+    """SUM(col) — сумма непустых значений (None, если их нет)."""
+
+    def __init__(self):
+        self.total = None
+
+    def add(self, value) -> None:
+        """Учитывает очередное значение."""
+        if value is not None:
+            self.total = value if self.total is None else self.total + value
+
+    def merge(self, other: "Sum") -> None:
+        """Добавляет итог другого накопителя."""
+        self.add(other.total)
+
+    def result(self):
+        """Возвращает итог."""
+        return self.total
+
+
+class Min:
+    """MIN(col) — наименьшее непустое значение."""
+
+    def __init__(self):
+        self.value = None
+
+    def add(self, value) -> None:
+        """Учитывает очередное значение."""
+        if value is not None and (self.value is None or value < self.value):
+            self.value = value
+
+    def merge(self, other: "Min") -> None:
+        """Учитывает итог другого накопителя."""
+        self.add(other.value)
+
+    def result(self):
+        """Возвращает итог."""
+        return self.value
+
+
+class Max(Min):
+    """MAX(col) — наибольшее непустое значение."""
+
+    def add(self, value) -> None:
+        """Учитывает очередное значение."""
+        if value is not None and (self.value is None or value > self.value):
+            self.value = value
+
+
+class Avg:
+    """AVG(col) — среднее непустых значений (None, если их нет)."""
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, value) -> None:
+        """Учитывает очередное значение."""
+        if value is not None:
+            self.total += value
+            self.count += 1
+
+    def merge(self, other: "Avg") -> None:
+        """Добавляет сумму и число значений другого накопителя."""
+        self.total += other.total
+        self.count += other.count
+
+    def result(self):
+        """Возвращает итог."""
+        return self.total / self.count if self.count else None
+
+
+ACCUMULATORS = {
+    "COUNT": Count,
+    "SUM": Sum,
+    "MIN": Min,
+    "MAX": Max,
+    "AVG": Avg,
+}
+
+
+def aggregate_label(func: str, column: str) -> str:
+    """Заголовок колонки результата, например 'AVG(age)'."""
+    return f"{func}({column})"
+
+
+def accumulate_rows(rows, aggregates: list, group_by: list) -> dict:
+    """Накапливает агрегаты по строкам за один проход с группировкой по хешу.
+
+    aggregates — список пар (функция, колонка или '*'), group_by — список
+    колонок. Возвращает {ключ группы: [накопители]} в порядке появления групп.
+    """
+    columns = [None if column == "*" else column for _, column in aggregates]
+    factories = [ACCUMULATORS[func] for func, _ in aggregates]
+    groups = {}
+
+    for row in rows:
+        key = tuple(row.get(name) for name in group_by)
+        accumulators = groups.get(key)
+        if accumulators is None:
+            accumulators = groups[key] = [factory() for factory in factories]
+        for accumulator, column in zip(accumulators, columns):
+            # COUNT(*) считает строку целиком: передаётся сама строка
+            accumulator.add(row if column is None else row.get(column))
+    return groups
+
+
+def merge_groups(groups: dict, other: dict) -> dict:
+    """Добавляет к groups накопители групп other (см. accumulate_rows)."""
+    for key, accumulators in other.items():
+        existing = groups.get(key)
+        if existing is None:
+            groups[key] = accumulators
+            continue
+        for accumulator, part in zip(existing, accumulators):
+            accumulator.merge(part)
+    return groups
+
+
+def finish_groups(groups: dict, aggregates: list, group_by: list) -> list[dict]:
+    """Превращает накопители групп в строки результата; без GROUP BY —
+    ровно одна строка, даже если строк не было.
+    """
+    if not groups and not group_by:
+        groups[()] = [ACCUMULATORS[func]() for func, _ in aggregates]
+
+    labels = [aggregate_label(func, column) for func, column in aggregates]
+    result = []
+    for key, accumulators in groups.items():
+        out = dict(zip(group_by, key))
+        for label, accumulator in zip(labels, accumulators):
+            out[label] = accumulator.result()
+        result.append(out)
+    return result
+
+
+def aggregate_rows(rows, aggregates: list, group_by: list) -> list[dict]:
+    """Вычисляет агрегаты по строкам за один проход с группировкой по хешу.
+
+    Возвращает по строке на группу (в порядке появления групп); без GROUP BY —
+    ровно одну строку, даже если строк не было.
+    """
+    return finish_groups(
+        accumulate_rows(rows, aggregates, group_by), aggregates, group_by
+    )
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""Буферный пул сессии: разобранные таблицы и метаданные в памяти.
+
+Таблица читается с диска один раз и при каждом обращении сверяется с подписью
+файла (размер, mtime), чтобы заметить изменения извне. Записи сразу
+применяются к строкам в памяти и копятся как отложенные изменения до сброса
+на диск (flush) — немедленно или в контрольной точке.
+"""
+
+import copy
+from collections import OrderedDict
+
+from src.primitive_db.constants import ID_COLUMN
+
+# Буферы таблиц в порядке использования (последний — самый свежий)
+_TABLES = OrderedDict()
+# Метаданные: путь к файлу -> (подпись файла, данные)
+_META = {}
+
+
+class TableBuffer:
+    """Состояние таблицы в пуле: строки, подпись файла и отложенные изменения.
+
+    columnar — колоночная копия строк (см. columnar.py); сбрасывается
+    при любом изменении строк.
+    """
+
+    def __init__(self):
+        self.rows = None
+        self.signature = None
+        self.columnar = None
+        self.appended = {}
+        self.written = {}
+        self.removed = set()
+
+    @property
+    def dirty(self) -> bool:
+        """Есть ли изменения, ещё не сброшенные на диск."""
+        return bool(self.appended or self.written or self.removed)
+
+    def stage_append(self, rows: list[dict]) -> None:
+        """Запоминает новые строки."""
+        self.columnar = None
+        for row in rows:
+            row_id = row[ID_COLUMN]
+            self.appended[row_id] = row
+            self.removed.discard(row_id)
+            if self.rows is not None:
+                self.rows[row_id] = row
+
+    def stage_write(self, rows: list[dict]) -> None:
+        """Запоминает новые версии изменённых строк."""
+        self.columnar = None
+        for row in rows:
+            row_id = row[ID_COLUMN]
+            if row_id in self.appended:
+                self.appended[row_id] = row
+            else:
+                self.written[row_id] = row
+            if self.rows is not None:
+                self.rows[row_id] = row
+
+    def stage_remove(self, ids) -> None:
+        """Запоминает удаление строк; новые несброшенные строки просто забываются."""
+        self.columnar = None
+        for row_id in ids:
+            if self.appended.pop(row_id, None) is None:
+                self.written.pop(row_id, None)
+                self.removed.add(row_id)
+            if self.rows is not None:
+                self.rows.pop(row_id, None)
+
+    def overlay(self, rows: dict) -> dict:
+        """Накладывает отложенные изменения на строки, прочитанные с диска."""
+        for row_id in self.removed:
+            rows.pop(row_id, None)
+        rows.update(self.written)
+        rows.update(self.appended)
+        return rows
+
+    def pending(self) -> tuple[list, list, list]:
+        """Возвращает отложенные изменения: (новые, изменённые, ID удалённых)."""
+        return (
+            list(self.appended.values()),
+            list(self.written.values()),
+            list(self.removed),
+        )
+
+    def take_pending(self) -> tuple[list, list, list]:
+        """Забирает отложенные изменения (см. pending)."""
+        pending = self.pending()
+        self.appended = {}
+        self.written = {}
+        self.removed = set()
+        return pending
+
+
+def get_buffer(table_name: str) -> TableBuffer:
+    """Возвращает буфер таблицы (создаёт пустой) и отмечает его использование."""
+    buffer = _TABLES.get(table_name)
+    if buffer is None:
+        buffer = _TABLES[table_name] = TableBuffer()
+    _TABLES.move_to_end(table_name)
+    return buffer
+
+
+def drop_buffer(table_name: str) -> None:
+    """Удаляет буфер таблицы вместе с несброшенными изменениями."""
+    _TABLES.pop(table_name, None)
+
+
+def dirty_tables() -> list[str]:
+    """Возвращает имена таблиц с несброшенными изменениями."""
+    return [name for name, buffer in _TABLES.items() if buffer.dirty]
+
+
+def evict(max_rows: int) -> None:
+    """Выгружает строки давно не использованных чистых таблиц,
+    пока суммарное число строк в пуле больше max_rows.
+    """
+    total = sum(len(b.rows) for b in _TABLES.values() if b.rows is not None)
+    for name, buffer in list(_TABLES.items()):
+        if total <= max_rows:
+            break
+        if buffer.rows is None or buffer.dirty:
+            continue
+        total -= len(buffer.rows)
+        del _TABLES[name]
+
+
+def cached_metadata(filepath: str, signature):
+    """Возвращает копию метаданных из пула, если подпись файла совпадает."""
+    cached = _META.get(filepath)
+    if cached is None or cached[0] != signature:
+        return None
+    return copy.deepcopy(cached[1])
+
+
+def store_metadata(filepath: str, signature, data) -> None:
+    """Запоминает копию метаданных вместе с подписью файла."""
+    _META[filepath] = (signature, copy.deepcopy(data))
+
+
+def drop_metadata(filepath: str) -> None:
+    """Забывает метаданные: следующее обращение прочитает файл."""
+    _META.pop(filepath, None)
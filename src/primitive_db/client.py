@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""Клиент сервера БД (database serve) с пулом соединений и конвейером.
+
+    from src.primitive_db.client import ConnectionPool
+
+    pool = ConnectionPool("db.sock")               # или ("127.0.0.1", 7878)
+    rows = pool.query("select users WHERE ID = 5")
+    outputs = pool.pipeline(["insert users Ann 30", "insert users Bob 25"])
+
+Адрес — путь к сокету Unix (строка) или пара (хост, порт) для TCP. Клиент
+не загружает движок БД (из модулей пакета нужен только constants).
+"""
+
+import json
+import queue
+import socket
+import threading
+from contextlib import contextmanager
+
+from src.primitive_db.constants import CLIENT_POOL_SIZE
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class Connection:
+    """Одно соединение с сервером. Не потокобезопасно: для работы из
+    нескольких потоков используйте ConnectionPool.
+    """
+
+    def __init__(self, address, timeout: float | None = None):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(address)
+        if family == socket.AF_INET:
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        self._next_id = 0
+
+    def _encode(self, commands, rows: bool) -> bytes:
+        """Кодирует запросы в строки JSON."""
+        lines = []
+        for command in commands:
+            self._next_id += 1
+            request = {"id": self._next_id, "command": command}
+            if rows:
+                request["rows"] = True
+            lines.append(_ENCODER.encode(request))
+        lines.append("")
+        return "\n".join(lines).encode("utf-8")
+
+    def _read_response(self, rows: bool):
+        """Читает ответ; возвращает строки (rows) или текст вывода."""
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Сервер закрыл соединение.")
+        response = json.loads(line)
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response.get("rows", []) if rows else response["output"]
+
+    def pipeline(self, commands, rows: bool = False) -> list:
+        """Отправляет все команды сразу и читает ответы по порядку.
+
+        Возвращает список результатов: текст вывода каждой команды или,
+        при rows=True, списки строк select. Ошибка запроса выбрасывается
+        как ValueError после чтения всех ответов.
+        """
+        commands = list(commands)
+        data = self._encode(commands, rows)
+        # Отправка в отдельном потоке: сервер отвечает, не дожидаясь конца
+        # конвейера, и большой конвейер не должен блокировать чтение ответов
+        sender = threading.Thread(target=self._sock.sendall, args=(data,))
+        sender.start()
+        results, error = [], None
+        try:
+            for _ in commands:
+                try:
+                    results.append(self._read_response(rows))
+                except ValueError as e:
+                    results.append(None)
+                    error = error or e
+        finally:
+            sender.join()
+        if error is not None:
+            raise error
+        return results
+
+    def execute(self, command: str) -> str:
+        """Выполняет команду; возвращает её текстовый вывод."""
+        self._sock.sendall(self._encode((command,), False))
+        return self._read_response(False)
+
+    def query(self, command: str) -> list[dict]:
+        """Выполняет select; возвращает строки результата списком словарей."""
+        self._sock.sendall(self._encode((command,), True))
+        return self._read_response(True)
+
+    def close(self) -> None:
+        """Закрывает соединение."""
+        self._reader.close()
+        self._sock.close()
+
+
+class ConnectionPool:
+    """Пул соединений с сервером, безопасный для использования из потоков.
+
+    Соединения открываются по мере надобности, но не больше size; когда все
+    заняты, запрос ждёт освобождения. Соединение, на котором произошла
+    сетевая ошибка, закрывается и заменяется новым.
+    """
+
+    def __init__(self, address, size: int = CLIENT_POOL_SIZE, timeout=None):
+        self.address = address
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        """Выдаёт соединение на время блока (например, для транзакции:
+        begin, команды и commit должны идти по одному соединению).
+        """
+        self._slots.acquire()
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = Connection(self.address, self.timeout)
+            yield conn
+        except (ConnectionError, OSError):
+            if conn is not None:
+                conn.close()
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def execute(self, command: str) -> str:
+        """Выполняет команду на свободном соединении."""
+        with self.connection() as conn:
+            return conn.execute(command)
+
+    def query(self, command: str) -> list[dict]:
+        """Выполняет select на свободном соединении; возвращает строки."""
+        with self.connection() as conn:
+            return conn.query(command)
+
+    def pipeline(self, commands, rows: bool = False) -> list:
+        """Выполняет команды конвейером на одном соединении."""
+        with self.connection() as conn:
+            return conn.pipeline(commands, rows)
+
+    def close(self) -> None:
+        """Закрывает свободные соединения пула."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
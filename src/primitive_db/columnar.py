@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""Колоночное представление таблицы для векторной фильтрации (NumPy).
+
+Для каждой колонки схемы хранится массив: int64 для int, float64 для float,
+bool для bool (если в колонке нет пустых значений); строки (и колонки
+с неоднородными значениями) кодируются словарём — массив кодов и список
+различных значений. Условие WHERE вычисляется как маска над массивами;
+для словарных колонок условие проверяется один раз на каждое различное
+значение.
+
+NumPy — необязательная зависимость: без него колоночное представление
+не строится и запросы выполняются построчно.
+"""
+
+import operator
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - зависит от окружения
+    np = None
+
+from src.primitive_db.predicate import compile_predicate
+from src.primitive_db.schema import split_type
+
+_COMPARATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# Типы колонок, хранимые массивами чисел: (тип Python, dtype, образец значения)
+_NUMERIC_TYPES = {
+    "int": (int, "int64", 0),
+    "float": (float, "float64", 0.0),
+    "bool": (bool, "bool", False),
+}
+
+_MISSING = object()
+
+
+def columnar_available() -> bool:
+    """Проверяет, установлен ли NumPy."""
+    return np is not None
+
+
+def _is_number(value) -> bool:
+    """Значение, сравнимое с числовым массивом без потери смысла."""
+    return isinstance(value, (int, float))
+
+
+class ColumnarTable:
+    """Колоночная копия строк таблицы (строки остаются источником данных)."""
+
+    def __init__(self, rows: list[dict], columns: list[dict]):
+        self.rows = rows
+        self.schema = columns
+        self.columns = {}
+        for col in columns:
+            encoded = self._encode(col["name"], col["type"])
+            if encoded is not None:
+                self.columns[col["name"]] = encoded
+
+    def _encode(self, name: str, col_type: str):
+        """Кодирует колонку: ("numeric", массив, образец) или
+        ("dict", коды, значения); None, если значения не хешируются.
+        """
+        try:
+            values = list(map(operator.itemgetter(name), self.rows))
+        except KeyError:
+            values = [row.get(name, _MISSING) for row in self.rows]
+        types = set(map(type, values))
+
+        base_type = split_type(col_type)[0] if isinstance(col_type, str) else None
+        if base_type in _NUMERIC_TYPES:
+            py_type, dtype, sample = _NUMERIC_TYPES[base_type]
+            if types <= {py_type}:
+                try:
+                    array = np.array(values, dtype=dtype)
+                except OverflowError:
+                    pass
+                else:
+                    return ("numeric", array, sample)
+
+        # Значения разных типов различаются и при равенстве (1 и True)
+        keys = values if len(types) <= 1 else [(v.__class__, v) for v in values]
+        try:
+            codes = {key: code for code, key in enumerate(dict.fromkeys(keys))}
+        except TypeError:
+            return None
+        array = np.fromiter(
+            map(codes.__getitem__, keys), dtype=np.int32, count=len(keys)
+        )
+        distinct = list(codes) if len(types) <= 1 else [v for _, v in codes]
+        return ("dict", array, distinct)
+
+    def mask(self, condition):
+        """Возвращает булеву маску строк для условия или None,
+        если условие нельзя вычислить по колонкам.
+
+        Маска может быть шире результата (части AND, не вычислимые
+        по колонкам, пропускаются) — условие проверяется ещё раз по строкам.
+        """
+        return self._mask(condition)[0]
+
+    def _mask(self, condition) -> tuple:
+        """Маска и признак точности (False — маска лишь шире результата)."""
+        kind = condition[0]
+        if kind == "and":
+            result, exact = None, True
+            for child in condition[1]:
+                part, part_exact = self._mask(child)
+                if part is None:
+                    exact = False
+                    continue
+                result = part if result is None else result & part
+                exact = exact and part_exact
+            return result, exact and result is not None
+        if kind == "or":
+            result, exact = np.zeros(len(self.rows), dtype=np.bool_), True
+            for child in condition[1]:
+                part, part_exact = self._mask(child)
+                if part is None:
+                    return None, False
+                result |= part
+                exact = exact and part_exact
+            return result, exact
+        if kind == "not":
+            inner, exact = self._mask(condition[1])
+            if inner is None or not exact:
+                return None, False
+            return ~inner, True
+        leaf = self._leaf_mask(condition)
+        return leaf, leaf is not None
+
+    def _leaf_mask(self, node):
+        """Маска для сравнения, IN или BETWEEN по одной колонке."""
+        column = node[2] if node[0] == "cmp" else node[1]
+        encoded = self.columns.get(column)
+        if encoded is None:
+            return None
+
+        check = compile_predicate(node)
+
+        if encoded[0] == "dict":
+            _, codes, values = encoded
+            lookup = np.fromiter(
+                (check({} if v is _MISSING else {column: v}) for v in values),
+                dtype=np.bool_,
+                count=len(values),
+            )
+            return lookup[codes]
+
+        _, array, sample = encoded
+        kind = node[0]
+        try:
+            if kind == "cmp" and _is_number(node[3]):
+                return _COMPARATORS[node[1]](array, node[3])
+            if kind == "in":
+                numbers = [v for v in node[2] if _is_number(v)]
+                return np.isin(array, numbers)
+            if kind == "between" and _is_number(node[2]) and _is_number(node[3]):
+                return (array >= node[2]) & (array <= node[3])
+        except OverflowError:
+            return None
+
+        # Значение другого типа: результат одинаков для всех строк колонки
+        return np.full(len(self.rows), check({column: sample}), dtype=np.bool_)
+
+    def select(self, condition):
+        """Возвращает строки, попавшие в маску условия, или None (см. mask)."""
+        mask = self.mask(condition)
+        if mask is None:
+            return None
+        rows = self.rows
+        return [rows[i] for i in np.flatnonzero(mask).tolist()]
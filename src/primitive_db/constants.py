@@ -5,6 +5,106 @@
 META_PATH = "db_meta.json"
 ID_COLUMN = "ID"
 ID_COLUMN_TYPE = "int"
-ALLOWED_TYPES = {"int", "str", "bool"}
+ALLOWED_TYPES = {"int", "float", "str", "bool", "date", "timestamp"}
+# Суффикс типа колонки, допускающей пустое значение (например, int?),
+# и литерал пустого значения в командах и файлах импорта
+NULLABLE_SUFFIX = "?"
+NULL_LITERAL = "null"
 DATA_DIR = "data"
 TABLE_FILE_EXT = ".json"
+# Ключ записи таблицы в метаданных с последним выданным ID
+SEQUENCE_KEY = "last_id"
+
+# Хранение данных таблиц
+LOG_FILE_EXT = ".jsonl"
+BINARY_FILE_EXT = ".tbl"
+# Размер страницы двоичного формата: сегменты колонок выравниваются по нему
+BINARY_PAGE_SIZE = 4096
+DEFAULT_STORAGE = "log"
+# Изменения двоичной таблицы дописываются рядом с ней в файл с расширением
+# DELTA_FILE_EXT; когда записей в нём больше BINARY_DELTA_MAX_SHARE от числа
+# строк таблицы (и больше COMPACT_MIN_DEAD), он вливается в файл таблицы
+DELTA_FILE_EXT = ".delta"
+BINARY_DELTA_MAX_SHARE = 0.1
+INDEX_FILE_EXT = ".idx"
+# Ключ записи таблицы в метаданных со списком индексов {колонка: тип}
+INDEXES_KEY = "indexes"
+DEFAULT_INDEX_KIND = "hash"
+# Ключ записи таблицы в метаданных со статистикой для планировщика (analyze)
+STATS_KEY = "stats"
+# Автоуплотнение журнала: мёртвых записей не меньше порога и больше живых
+COMPACT_MIN_DEAD = 1000
+
+# Буферный пул: сброс изменений на диск при каждой записи ("write")
+# или в контрольных точках ("checkpoint"). Контрольная точка (каждые
+# BUFFER_CHECKPOINT_EVERY команд, по команде checkpoint и при выходе) также
+# фиксирует файлы на диске и очищает журнал упреждающей записи
+BUFFER_FLUSH_POLICY = "write"
+BUFFER_CHECKPOINT_EVERY = 100
+# Сколько строк держать в памяти, прежде чем выгружать давно не использованные
+# таблицы без несохранённых изменений
+BUFFER_POOL_MAX_ROWS = 5_000_000
+
+# Кэш результатов select
+SELECT_CACHE_ENABLED = True
+SELECT_CACHE_MAX_ENTRIES = 128
+SELECT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Колоночное представление таблиц для векторной фильтрации (нужен NumPy);
+# строится для таблиц не меньше COLUMNAR_MIN_ROWS строк
+COLUMNAR_ENABLED = True
+COLUMNAR_MIN_ROWS = 10_000
+
+# ORDER BY: сколько строк сортировать в памяти; больший результат
+# сортируется внешним слиянием через временные файлы
+SORT_MEMORY_ROWS = 100_000
+
+# Параллельный перебор: файл таблицы делится на сегменты по SEGMENT_ROWS
+# строк, которые процессы пула (SCAN_WORKERS, None — по числу ядер) читают
+# и фильтруют одновременно; используется для таблиц не меньше
+# PARALLEL_SCAN_MIN_ROWS строк
+SEGMENT_ROWS = 65_536
+SCAN_WORKERS = None
+PARALLEL_SCAN_MIN_ROWS = 200_000
+
+# Зонные карты: статистика колонок по блокам из ZONE_ROWS строк, по которой
+# перебор пропускает блоки, не подходящие под WHERE; у журнала строк карта
+# лежит рядом с файлом таблицы в файле с расширением ZONE_FILE_EXT
+ZONE_ROWS = 4096
+ZONE_FILE_EXT = ".zones"
+
+# JOIN по индексу: сколько строк потоковой стороны обрабатывать за один поиск
+JOIN_BATCH_ROWS = 1000
+
+# Планировщик запросов: условная стоимость строки при переборе файла с диска,
+# в буферном пуле и при чтении по ID с диска. Загрузка всей таблицы в пул
+# окупается следующими запросами, поэтому её стоимость умножается на
+# PLAN_LOAD_DISCOUNT. Без статистики (analyze) доля строк, подходящих под
+# равенство и под сравнение, — PLAN_DEFAULT_EQ_SELECTIVITY
+# и PLAN_DEFAULT_RANGE_SELECTIVITY
+PLAN_COST_DISK_ROW = 1.0
+PLAN_COST_MEMORY_ROW = 0.05
+PLAN_COST_FETCH_ROW = 4.0
+PLAN_LOAD_DISCOUNT = 0.5
+PLAN_DEFAULT_EQ_SELECTIVITY = 0.05
+PLAN_DEFAULT_RANGE_SELECTIVITY = 0.3
+
+# Журнал упреждающей записи: изменения сначала дописываются в журнал и
+# сбрасываются на диск (fsync) после каждой записи ("always"), группой не
+# чаще раза в WAL_FSYNC_INTERVAL_MS ("interval") или по усмотрению ОС ("os")
+WAL_PATH = "db_wal.jsonl"
+WAL_FSYNC_POLICY = "interval"
+WAL_FSYNC_INTERVAL_MS = 100
+
+# Межпроцессные блокировки (fcntl): файлы блокировок и время ожидания
+LOCK_FILE_EXT = ".lock"
+LOCK_TIMEOUT_SECONDS = 10
+# Сколько ID резервировать в метаданных за раз: процессы получают
+# непересекающиеся блоки и не переписывают метаданные при каждой вставке
+ID_BLOCK_SIZE = 100
+
+# Режим сервера (database serve): сокет Unix в каталоге БД или TCP на localhost
+SERVER_SOCKET_PATH = "db.sock"
+SERVER_HOST = "127.0.0.1"
+# Клиент: сколько соединений держит пул
+CLIENT_POOL_SIZE = 4
@@ -1,17 +1,58 @@
 #!/usr/bin/env python3
 
+from itertools import islice
+
 from src.decorators import confirm_action, handle_db_errors, log_time
+from src.primitive_db.aggregate import (
+    NUMERIC_TYPES,
+    aggregate_label,
+    aggregate_rows,
+)
 from src.primitive_db.constants import (
     ALLOWED_TYPES,
+    DEFAULT_INDEX_KIND,
+    ID_BLOCK_SIZE,
     ID_COLUMN,
     ID_COLUMN_TYPE,
+    INDEXES_KEY,
+    JOIN_BATCH_ROWS,
     META_PATH,
+    SEQUENCE_KEY,
+    STATS_KEY,
+)
+from src.primitive_db.index import (
+    SortedIndex,
+    build_index,
+    discard_index,
+    get_index,
 )
+from src.primitive_db.lock import metadata_lock
+from src.primitive_db.parallel import parallel_aggregate, parallel_scan
+from src.primitive_db.planner import collect_stats, plan_scan
+from src.primitive_db.predicate import (
+    compile_predicate,
+    condition_columns,
+    condition_from_dict,
+    join_conjuncts,
+    plan_ids,
+    rename_columns,
+    split_conjuncts,
+)
+from src.primitive_db.schema import is_valid_type, split_type, table_schema
+from src.primitive_db.sort import sort_rows
+from src.primitive_db.transfer import read_records, write_records
 from src.primitive_db.utils import (
+    append_table_rows,
+    columnar_table,
+    count_table_rows,
+    fetch_table_rows,
+    iter_table_rows,
     load_metadata,
     load_table_data,
+    load_table_rows,
+    recover_wal,
+    repair_table_files,
     save_metadata,
-    save_table_data,
 )
 
 
@@ -85,15 +126,16 @@ def create_table(metadata: dict, table_name: str, columns: list) -> dict:
 
         col_type = col_type.strip()
 
-        if col_type not in ALLOWED_TYPES:
+        if not is_valid_type(col_type):
             raise ValueError(
                 "Ошибка: неверный тип данных. "
-                "Разрешены только int, str, bool."
+                f"Разрешены только {', '.join(sorted(ALLOWED_TYPES))} "
+                "(с суффиксом ? — допускающие пустое значение)."
             )
 
         parsed_columns.append({"name": col_name, "type": col_type})
 
-    metadata["tables"][table_name] = {"columns": parsed_columns}
+    metadata["tables"][table_name] = {"columns": parsed_columns, SEQUENCE_KEY: 0}
     return metadata
 
 
@@ -120,152 +162,658 @@ def drop_table(metadata: dict, table_name: str) -> dict:
         raise ValueError(f"Ошибка: таблица '{table_name}' не существует.")
 
     del metadata["tables"][table_name]
+    _ID_BLOCKS.pop(table_name, None)
     return metadata
 
 
-def _to_bool(v):
-    """Приводит значение к bool (строка/число/булево)."""
-    if isinstance(v, bool):
-        return v
-    if isinstance(v, int):
-        return v != 0
-    if isinstance(v, str):
-        s = v.strip().lower()
-        if s in ("true", "t", "yes", "y", "1"):
-            return True
-        if s in ("false", "f", "no", "n", "0"):
-            return False
-    raise ValueError(f"Нельзя привести к bool: {v!r}")
+@handle_db_errors
+def _get_table_schema(metadata: dict, table_name: str):
+    """Возвращает список описаний колонок таблицы из метаданных
+    (разобранный один раз, см. schema.table_schema).
+    """
+    return table_schema(metadata, table_name).columns
+
+
+def _recover_sequence(metadata: dict, table_name: str) -> int:
+    """Возвращает последний выданный ID; при отсутствии счётчика вычисляет его
+    по максимальному ID в данных таблицы.
+    """
+    table = metadata["tables"][table_name]
+    last_id = table.get(SEQUENCE_KEY)
+    if not isinstance(last_id, int):
+        table_data = load_table_data(table_name)
+        last_id = max((row.get(ID_COLUMN, 0) for row in table_data), default=0)
+        table[SEQUENCE_KEY] = last_id
+    return last_id
+
+
+def recover_sequences(filepath: str = META_PATH, verify: bool = False) -> None:
+    """Восстанавливает отсутствующие счётчики ID (таблицы старой версии).
+
+    При verify=True (после сбоя) счётчики, отставшие от максимального ID
+    в данных, тоже поднимаются: новые строки не получат занятых ID.
+    Таблица, данные которой прочитать не удалось, пропускается с сообщением,
+    чтобы она не мешала запуску.
+    """
+    with metadata_lock(filepath).hold():
+        meta = _ensure_schema(load_metadata(filepath))
+        changed = False
+        for name, table in meta["tables"].items():
+            last_id = table.get(SEQUENCE_KEY)
+            if isinstance(last_id, int) and not verify:
+                continue
+            try:
+                if not isinstance(last_id, int):
+                    _recover_sequence(meta, name)
+                    changed = True
+                    continue
+                max_id = max(
+                    (row.get(ID_COLUMN, 0) for row in iter_table_rows(name)),
+                    default=0,
+                )
+            except (OSError, ValueError) as e:
+                print(f"Ошибка: счётчик ID таблицы '{name}' не проверен - {e}")
+                continue
+            if max_id > last_id:
+                table[SEQUENCE_KEY] = max_id
+                changed = True
+        if changed:
+            save_metadata(filepath, meta)
+
+
+def recover_database(filepath: str = META_PATH) -> int:
+    """Восстановление при запуске: применяет журнал упреждающей записи,
+    отрезает оборванные дозаписи в файлах таблиц и проверяет счётчики ID.
+
+    Возвращает число применённых записей журнала (0 — сбоя не было).
+    """
+    replayed = recover_wal()
+    meta = _ensure_schema(load_metadata(filepath))
+    repair_table_files(meta["tables"])
+    recover_sequences(filepath, verify=replayed > 0)
+    return replayed
+
+
+@handle_db_errors
+def create_index(
+    metadata: dict, table_name: str, column: str, kind: str = DEFAULT_INDEX_KIND
+) -> dict:
+    """Строит индекс по колонке таблицы и добавляет его в метаданные."""
+    cols = _get_table_schema(metadata, table_name)
+    if column not in [c["name"] for c in cols]:
+        raise ValueError(f"В таблице '{table_name}' нет колонки '{column}'.")
 
+    indexes = metadata["tables"][table_name].setdefault(INDEXES_KEY, {})
+    if column in indexes:
+        raise ValueError(f"Индекс по колонке '{column}' уже существует.")
 
-# Маппинг имён типов на функции приведения значения
-TYPE_CASTERS = {
-    "int": int,
-    "str": str,
-    "bool": _to_bool,
-}
+    build_index(table_name, column, kind, load_table_data(table_name))
+    indexes[column] = kind
+    return metadata
 
 
 @handle_db_errors
-def _get_table_schema(metadata: dict, table_name: str):
-    """Возвращает список описаний колонок таблицы из метаданных."""
-    tables = metadata.get("tables", {})
-    if table_name not in tables:
+def drop_index(metadata: dict, table_name: str, column: str) -> dict:
+    """Удаляет индекс по колонке таблицы из метаданных и с диска."""
+    if table_name not in metadata.get("tables", {}):
         raise ValueError(f"Таблица '{table_name}' не существует.")
 
-    raw_cols = tables[table_name].get("columns", [])
-    cols = []
-
-    for c in raw_cols:
-        if isinstance(c, dict):
-            name = c.get("name")
-            typ = c.get("type")
-        elif isinstance(c, (tuple, list)) and len(c) == 2:
-            name, typ = c[0], c[1]
-        elif isinstance(c, str) and ":" in c:
-            name, typ = c.split(":", 1)
-            name = name.strip()
-            typ = typ.strip()
-        else:
-            continue
+    indexes = metadata["tables"][table_name].get(INDEXES_KEY, {})
+    if column not in indexes:
+        raise ValueError(f"Индекса по колонке '{column}' нет.")
 
-        cols.append({"name": name, "type": typ})
+    del indexes[column]
+    discard_index(table_name, column)
+    return metadata
 
-    return cols
 
+def _as_condition(where_clause):
+    """Приводит WHERE к дереву условия: словарь {колонка: значение}
+    (старый вид) переводится в AND равенств, пустое условие — в None.
+    """
+    if where_clause is None or isinstance(where_clause, dict):
+        return condition_from_dict(where_clause)
+    return where_clause
+
+
+def _indexed_ids(metadata: dict, table_name: str, where_clause):
+    """Возвращает ID строк, найденные по индексам для условия WHERE,
+    или None, если индексы не помогают (см. predicate.plan_ids).
+    """
+    indexes = metadata["tables"][table_name].get(INDEXES_KEY, {})
+    return plan_ids(
+        _as_condition(where_clause),
+        indexes,
+        lambda column: get_index(
+            table_name, column, indexes[column], load_table_data
+        ),
+    )
+
+
+def scan_table(
+    metadata: dict,
+    table_name: str,
+    where_clause=None,
+    lazy: bool = False,
+    parallel: bool = True,
+    plan=None,
+):
+    """Возвращает строки-кандидаты для WHERE способом, который выбрал
+    планировщик (см. planner.py): по ID, по индексу или перебором.
+
+    При lazy=True перебор выполняется потоково (без загрузки таблицы
+    в пул), чтобы его можно было остановить, набрав нужное число строк.
+    При переборе условие по возможности вычисляется векторно по колоночному
+    представлению таблицы (см. columnar.py); при lazy=True — только если оно
+    уже построено. Иначе большая таблица, которой нет в буферном пуле,
+    фильтруется по сегментам в пуле процессов (см. parallel.py), если
+    parallel не отключён — например, когда перебор можно остановить раньше.
+    Потоковый и параллельный перебор пропускают блоки файла по зонным картам.
+    Окончательную проверку условия выполняют select/update/delete.
+    """
+    condition = _as_condition(where_clause)
+    if plan is None:
+        plan = plan_scan(metadata, table_name, condition, lazy)
+
+    if plan.access in ("pk", "index"):
+        plan.source = "чтение строк по ID"
+        ids = _indexed_ids(metadata, table_name, plan.index_condition)
+        return plan.trace(fetch_table_rows(table_name, ids) if ids else [])
+
+    if condition is not None:
+        columns = _get_table_schema(metadata, table_name)
+        build = not lazy and plan.access == "scan"
+        table = columnar_table(table_name, columns, build=build)
+        if table is not None:
+            rows = table.select(condition)
+            if rows is not None:
+                plan.source = "колоночное представление"
+                return plan.trace(rows)
+        if parallel and plan.cold:
+            rows = parallel_scan(table_name, condition)
+            if rows is not None:
+                plan.source = "параллельный перебор сегментов"
+                return plan.trace(rows)
+    if lazy or plan.access == "zones":
+        plan.source = "потоковое чтение"
+        return plan.trace(iter_table_rows(table_name, condition))
+    plan.source = "буферный пул"
+    return plan.trace(load_table_data(table_name))
 
-def _row_matches_where(row: dict, where_clause: dict | None) -> bool:
-    """Проверяет, удовлетворяет ли строка условию WHERE."""
-    if not where_clause:
-        return True
-    for key, expected in where_clause.items():
-        if key not in row:
-            return False
-        if row[key] != expected:
-            return False
-    return True
+
+@handle_db_errors
+def analyze_table(metadata: dict, table_name: str) -> dict:
+    """Собирает статистику таблицы для планировщика (число строк, различных
+    и пустых значений, границы числовых колонок) и сохраняет её в метаданных.
+    """
+    _get_table_schema(metadata, table_name)
+    metadata["tables"][table_name][STATS_KEY] = collect_stats(
+        iter_table_rows(table_name)
+    )
+    return metadata
+
+
+# ID, зарезервированные процессом в метаданных, но ещё не выданные:
+# таблица -> [следующий ID, последний ID блока]
+_ID_BLOCKS = {}
+
+
+def _reserve_ids(metadata: dict, table_name: str, count: int) -> int:
+    """Выдаёт count подряд идущих ID; возвращает первый из них.
+
+    ID берутся из блока, зарезервированного процессом. Новый блок (не меньше
+    ID_BLOCK_SIZE) резервируется под блокировкой метаданных по их актуальной
+    версии, поэтому разные процессы не выдают одинаковых ID, а метаданные
+    не переписываются при каждой вставке.
+    """
+    table = metadata["tables"][table_name]
+    block = _ID_BLOCKS.get(table_name)
+    last_id = table.get(SEQUENCE_KEY)
+    # Таблицу могли удалить и создать заново: счётчик тогда меньше блока
+    if (
+        block is None
+        or block[1] - block[0] + 1 < count
+        or not isinstance(last_id, int)
+        or last_id < block[1]
+    ):
+        with metadata_lock(META_PATH).hold():
+            fresh = _ensure_schema(load_metadata(META_PATH))
+            if table_name not in fresh["tables"]:
+                raise ValueError(f"Таблица '{table_name}' не существует.")
+            first_id = _recover_sequence(fresh, table_name) + 1
+            block = [first_id, first_id + max(count, ID_BLOCK_SIZE) - 1]
+            fresh["tables"][table_name][SEQUENCE_KEY] = block[1]
+            save_metadata(META_PATH, fresh)
+        _ID_BLOCKS[table_name] = block
+
+    first_id = block[0]
+    block[0] += count
+    table[SEQUENCE_KEY] = block[1]
+    return first_id
+
+
+def release_ids(filepath: str = META_PATH) -> None:
+    """Возвращает в метаданные невыданные ID (при выходе), если после
+    резервирования блока другие процессы не брали ID этой таблицы.
+    """
+    if not _ID_BLOCKS:
+        return
+    with metadata_lock(filepath).hold():
+        meta = _ensure_schema(load_metadata(filepath))
+        changed = False
+        for name, (next_id, last_id) in _ID_BLOCKS.items():
+            table = meta["tables"].get(name)
+            if table is not None and table.get(SEQUENCE_KEY) == last_id:
+                table[SEQUENCE_KEY] = next_id - 1
+                changed = True
+        _ID_BLOCKS.clear()
+        if changed:
+            save_metadata(filepath, meta)
 
 
 @log_time
 @handle_db_errors
 def insert(metadata: dict, table_name: str, values: list):
     """Добавляет запись в таблицу с автоинкрементом ID."""
-    cols = _get_table_schema(metadata, table_name)
+    schema = table_schema(metadata, table_name)
+    row = {ID_COLUMN: None}
+    row.update(zip(schema.names, schema.cast_values(values)))
 
-    if not cols or cols[0]["name"] != ID_COLUMN:
-        raise ValueError(f"Первая колонка должна быть {ID_COLUMN}:int")
+    # Счётчик сохраняется до записи строки: сбой оставит пропуск, но не дубль
+    row[ID_COLUMN] = _reserve_ids(metadata, table_name, 1)
+    append_table_rows(table_name, [row])
+    return row
 
-    data_cols = cols[1:]
 
-    if len(values) != len(data_cols):
-        raise ValueError(
-            f"Ожидалось {len(data_cols)} значений, получено {len(values)}."
-        )
+def _insert_rows(metadata: dict, table_name: str, rows) -> list[dict]:
+    """Приводит типы и добавляет строки одним блоком (см. insert_many)."""
+    schema = table_schema(metadata, table_name)
+    names = schema.names
+    cast_rows = schema.cast_rows(rows)
 
-    table_data = load_table_data(table_name)
+    if not cast_rows:
+        return []
 
-    if table_data:
-        max_id = max(row.get(ID_COLUMN, 0) for row in table_data)
-    else:
-        max_id = 0
-    new_id = max_id + 1
+    first_id = _reserve_ids(metadata, table_name, len(cast_rows))
+    new_rows = []
+    for row_id, values in enumerate(cast_rows, start=first_id):
+        row = {ID_COLUMN: row_id}
+        row.update(zip(names, values))
+        new_rows.append(row)
 
-    row = {ID_COLUMN: new_id}
-    for col_def, raw_value in zip(data_cols, values):
-        col_name = col_def["name"]
-        col_type = col_def["type"]
+    load_table_rows(table_name, new_rows)
+    return new_rows
 
-        if col_type not in TYPE_CASTERS:
-            raise ValueError(
-                f"Неподдерживаемый тип '{col_type}' для колонки '{col_name}'."
-            )
 
-        caster = TYPE_CASTERS[col_type]
-        value = caster(raw_value)
-        row[col_name] = value
+@log_time
+@handle_db_errors
+def insert_many(metadata: dict, table_name: str, rows) -> list[dict]:
+    """Добавляет много записей за один раз: схема разбирается один раз,
+    ID выдаются одним блоком, строки записываются одной операцией.
 
-    table_data.append(row)
-    save_table_data(table_name, table_data)
-    return table_data
+    rows — итерируемый набор списков значений (без ID); если хоть одна
+    строка не проходит проверку, не добавляется ничего.
+    """
+    return _insert_rows(metadata, table_name, rows)
 
 
 @log_time
 @handle_db_errors
-def select(table_data: list[dict], where_clause: dict | None = None) -> list[dict]:
-    """Возвращает строки таблицы, удовлетворяющие WHERE (или все, если условия нет)."""
-    if not where_clause:
-        return list(table_data)
+def import_rows(metadata: dict, table_name: str, filepath: str) -> list[dict]:
+    """Загружает строки из файла CSV или JSON Lines (см. transfer.read_records)."""
+    names = table_schema(metadata, table_name).names
+    return _insert_rows(metadata, table_name, read_records(filepath, names))
+
+
+def iter_select(rows, where_clause=None, limit=None, offset=0, order_by=None):
+    """Лениво выдаёт строки, удовлетворяющие WHERE, с учётом ORDER BY,
+    OFFSET и LIMIT.
+
+    Условие компилируется один раз; без ORDER BY перебор источника строк
+    прекращается, как только набрано limit строк.
+    """
+    matches = compile_predicate(_as_condition(where_clause))
+    if matches is not None:
+        rows = filter(matches, rows)
+    if order_by:
+        return sort_rows(rows, order_by, limit, offset)
+    stop = None if limit is None else offset + limit
+    return islice(rows, offset, stop)
 
-    result = []
-    for row in table_data:
-        if _row_matches_where(row, where_clause):
-            result.append(row)
-    return result
+
+@log_time
+@handle_db_errors
+def select(
+    table_data, where_clause=None, limit=None, offset=0, order_by=None
+) -> list[dict]:
+    """Возвращает строки таблицы, удовлетворяющие WHERE (или все, если условия нет)."""
+    return list(iter_select(table_data, where_clause, limit, offset, order_by))
 
 
 @handle_db_errors
-def update(table_data: list[dict], set_clause: dict, where_clause: dict) -> list[dict]:
-    """Обновляет поля записей по условию WHERE согласно SET."""
+def update(table_data: list[dict], set_clause: dict, where_clause) -> list[dict]:
+    """Обновляет поля записей по условию WHERE согласно SET.
+
+    Строки не изменяются на месте: возвращаются новые версии только тех
+    строк, в которых SET действительно меняет значения, — их и нужно
+    сохранить (строки, где значения уже такие, не перезаписываются).
+    Значения SET должны быть уже приведены к типам колонок
+    (TableSchema.cast_set).
+    """
     if not set_clause:
-        return table_data
-
-    for row in table_data:
-        if _row_matches_where(row, where_clause):
-            for key, value in set_clause.items():
-                row[key] = value
+        return []
 
-    return table_data
+    changed = []
+    for row in iter_select(table_data, where_clause):
+        new_row = {**row, **set_clause}
+        if new_row != row:
+            changed.append(new_row)
+    return changed
 
 
 @handle_db_errors
 @confirm_action("удаление записей")
-def delete(table_data: list[dict], where_clause: dict) -> list[dict]:
-    """Удаляет записи, удовлетворяющие условию WHERE."""
+def delete(table_data: list[dict], where_clause) -> list[dict]:
+    """Находит записи, удовлетворяющие условию WHERE, и возвращает их для удаления."""
     if not where_clause:
-        return table_data
+        return []
+
+    return list(iter_select(table_data, where_clause))
+
+
+def _aggregate_from_indexes(
+    metadata: dict, table_name: str, aggregates: list, group_by: list
+):
+    """Вычисляет агрегаты без перебора строк, если это возможно:
+    COUNT(*) — по числу строк, COUNT(col) — по индексу колонки,
+    MIN/MAX(col) — по сортированному индексу, GROUP BY col с одними COUNT(*) —
+    по индексу колонки группировки. Иначе возвращает None.
+    """
+    indexes = metadata["tables"][table_name].get(INDEXES_KEY, {})
+
+    def load(column):
+        return get_index(table_name, column, indexes[column], load_table_data)
+
+    labels = [aggregate_label(func, column) for func, column in aggregates]
+
+    if group_by:
+        if len(group_by) != 1 or group_by[0] not in indexes:
+            return None
+        if any(agg != ("COUNT", "*") for agg in aggregates):
+            return None
+        column = group_by[0]
+        return [
+            {column: value, **dict.fromkeys(labels, len(ids))}
+            for value, ids in load(column).entries.items()
+        ]
+
+    result = {}
+    for label, (func, column) in zip(labels, aggregates):
+        if func == "COUNT" and column == "*":
+            result[label] = count_table_rows(table_name)
+        elif func == "COUNT" and column in indexes:
+            result[label] = load(column).count_values()
+        elif func in ("MIN", "MAX") and indexes.get(column) == SortedIndex.kind:
+            index = load(column)
+            result[label] = index.min_value() if func == "MIN" else index.max_value()
+        else:
+            return None
+    return [result]
+
+
+@log_time
+@handle_db_errors
+def aggregate(
+    metadata: dict,
+    table_name: str,
+    aggregates: list,
+    where_clause=None,
+    group_by=(),
+) -> list[dict]:
+    """Вычисляет агрегаты (COUNT, SUM, MIN, MAX, AVG) с GROUP BY.
+
+    aggregates — список пар (функция, колонка или '*'). Строки читаются
+    потоково за один проход и в памяти не собираются; без WHERE агрегаты
+    по возможности берутся из индексов и числа строк таблицы. Если планировщик
+    выбрал перебор, большая таблица, которой нет в буферном пуле,
+    агрегируется по сегментам параллельно (см. parallel.py).
+    """
+    types = {c["name"]: c["type"] for c in _get_table_schema(metadata, table_name)}
+    group_by = list(group_by)
+
+    for func, column in aggregates:
+        if column == "*":
+            if func != "COUNT":
+                raise ValueError(f"{func}(*) не поддерживается, укажите колонку.")
+            continue
+        if column not in types:
+            raise ValueError(f"В таблице '{table_name}' нет колонки '{column}'.")
+        base_type = split_type(types[column])[0]
+        if func in ("SUM", "AVG") and base_type not in NUMERIC_TYPES:
+            raise ValueError(
+                f"{func} применима только к числовым колонкам, "
+                f"'{column}' имеет тип {types[column]}."
+            )
+    for column in group_by:
+        if column not in types:
+            raise ValueError(f"В таблице '{table_name}' нет колонки '{column}'.")
+
+    condition = _as_condition(where_clause)
+    plan = plan_scan(metadata, table_name, condition, lazy=True)
+    if condition is None:
+        result = _aggregate_from_indexes(metadata, table_name, aggregates, group_by)
+        if result is not None:
+            plan.source = "индексы и число строк (без перебора)"
+            return result
+
+    # Параллельно — если планировщик выбрал перебор, а условие не сужается
+    # уже построенным колоночным представлением
+    if (
+        plan.access in ("zones", "scan")
+        and plan.cold
+        and (
+            condition is None
+            or columnar_table(
+                table_name, _get_table_schema(metadata, table_name), build=False
+            )
+            is None
+        )
+    ):
+        result = parallel_aggregate(table_name, condition, aggregates, group_by)
+        if result is not None:
+            plan.source = "параллельная агрегация сегментов"
+            return result
+
+    rows = scan_table(metadata, table_name, condition, lazy=True, plan=plan)
+    return aggregate_rows(iter_select(rows, condition), aggregates, group_by)
+
+
+def join_columns(metadata: dict, left: str, right: str) -> dict:
+    """Колонки результата JOIN: имя -> (таблица, колонка).
+
+    Каждая колонка доступна как 'таблица.колонка', а без префикса — если она
+    есть только в одной из таблиц (для неоднозначных имён значение None).
+    """
+    mapping = {}
+    for table_name in (left, right):
+        for col in _get_table_schema(metadata, table_name):
+            name = col["name"]
+            mapping[f"{table_name}.{name}"] = (table_name, name)
+            mapping[name] = None if name in mapping else (table_name, name)
+    return mapping
+
+
+def resolve_join_column(columns: dict, name: str) -> tuple[str, str]:
+    """Находит колонку JOIN по имени (см. join_columns)."""
+    if name not in columns:
+        raise ValueError(f"Неизвестная колонка '{name}'.")
+    if columns[name] is None:
+        raise ValueError(
+            f"Колонка '{name}' есть в обеих таблицах, укажите таблицу: "
+            f"<table>.{name}."
+        )
+    return columns[name]
+
+
+def _rows_by_key(metadata: dict, table_name: str, column: str, keys) -> dict:
+    """Находит по индексу (или по ID) строки, у которых колонка равна
+    одному из ключей; возвращает {ключ: [строки]}.
+    """
+    if column == ID_COLUMN:
+        ids = keys
+    else:
+        kind = metadata["tables"][table_name][INDEXES_KEY][column]
+        index = get_index(table_name, column, kind, load_table_data)
+        ids = set()
+        for key in keys:
+            ids |= index.lookup(key)
+
+    found = {}
+    for row in fetch_table_rows(table_name, ids):
+        found.setdefault(row.get(column), []).append(row)
+    return found
+
+
+def _join_pairs(metadata: dict, sides: list):
+    """Выдаёт пары совпавших строк (левая, правая) для JOIN по равенству.
+
+    sides — [(таблица, колонка соединения, условие стороны)] для левой
+    и правой таблиц. Если у большей таблицы есть индекс по колонке
+    соединения (колонка ID проиндексирована всегда), меньшая читается
+    потоково, а совпадения ищутся по индексу порциями по JOIN_BATCH_ROWS.
+    Иначе по меньшей таблице строится хеш-таблица, а большая читается потоково.
+    """
+    def side_rows(side):
+        table_name, _, condition = side
+        rows = scan_table(metadata, table_name, condition, lazy=True)
+        return iter_select(rows, condition)
+
+    def indexed(side):
+        table_name, column, _ = side
+        indexes = metadata["tables"][table_name].get(INDEXES_KEY, {})
+        return column == ID_COLUMN or column in indexes
+
+    sizes = [count_table_rows(side[0]) for side in sides]
+    large = 0 if sizes[0] > sizes[1] else 1
+    small = 1 - large
+    small_table, small_column, _ = sides[small]
+    large_table, large_column, large_condition = sides[large]
+
+    def ordered(small_row, large_row):
+        return (small_row, large_row) if small == 0 else (large_row, small_row)
+
+    if indexed(sides[large]):
+        matches = compile_predicate(large_condition)
+        rows = side_rows(sides[small])
+        while True:
+            batch = list(islice(rows, JOIN_BATCH_ROWS))
+            if not batch:
+                return
+            keys = {row.get(small_column) for row in batch} - {None}
+            found = _rows_by_key(metadata, large_table, large_column, keys)
+            for row in batch:
+                for other in found.get(row.get(small_column), ()):
+                    if matches is None or matches(other):
+                        yield ordered(row, other)
+
+    table = {}
+    for row in side_rows(sides[small]):
+        key = row.get(small_column)
+        if key is not None:
+            table.setdefault(key, []).append(row)
+    for row in side_rows(sides[large]):
+        for other in table.get(row.get(large_column), ()):
+            yield ordered(other, row)
+
+
+def iter_join(metadata: dict, left: str, right: str, on: tuple, where_clause=None):
+    """Лениво выдаёт строки соединения left JOIN right ON on[0] = on[1].
+
+    Колонки результата — 'таблица.колонка'. Части WHERE (через AND), которые
+    касаются одной таблицы, проверяются при чтении этой таблицы (и могут
+    использовать её индексы), остальные — на соединённых строках.
+    """
+    for table_name in (left, right):
+        if table_name not in metadata.get("tables", {}):
+            raise ValueError(f"Таблица '{table_name}' не существует.")
+    if left == right:
+        raise ValueError("Соединение таблицы с самой собой не поддерживается.")
+
+    columns = join_columns(metadata, left, right)
+    on_columns = [resolve_join_column(columns, name) for name in on]
+    if {on_columns[0][0], on_columns[1][0]} != {left, right}:
+        raise ValueError("Условие ON должно связывать колонки обеих таблиц.")
+    if on_columns[0][0] != left:
+        on_columns.reverse()
+
+    condition = _as_condition(where_clause)
+    pushed = {left: [], right: []}
+    rest = []
+    for part in split_conjuncts(condition):
+        tables = {
+            resolve_join_column(columns, name)[0]
+            for name in condition_columns(part)
+        }
+        if len(tables) == 1:
+            table_name = tables.pop()
+            pushed[table_name].append(
+                rename_columns(part, lambda name: columns[name][1])
+            )
+        else:
+            rest.append(
+                rename_columns(part, lambda name: "{}.{}".format(*columns[name]))
+            )
+
+    sides = [
+        (table_name, column, join_conjuncts(pushed[table_name]))
+        for table_name, column in on_columns
+    ]
+    left_prefix, right_prefix = f"{left}.", f"{right}."
+
+    def combined():
+        for left_row, right_row in _join_pairs(metadata, sides):
+            row = {left_prefix + k: v for k, v in left_row.items()}
+            row.update((right_prefix + k, v) for k, v in right_row.items())
+            yield row
+
+    return iter_select(combined(), join_conjuncts(rest))
+
+
+@log_time
+@handle_db_errors
+def join(
+    metadata: dict,
+    left: str,
+    right: str,
+    on: tuple,
+    where_clause=None,
+    limit=None,
+    offset=0,
+    order_by=None,
+) -> list[dict]:
+    """Возвращает строки соединения двух таблиц (см. iter_join)."""
+    rows = iter_join(metadata, left, right, on, where_clause)
+    return list(iter_select(rows, None, limit, offset, order_by))
+
+
+@log_time
+@handle_db_errors
+def export_rows(
+    metadata: dict,
+    table_name: str,
+    filepath: str,
+    where_clause=None,
+    fmt: str | None = None,
+) -> int:
+    """Выгружает строки таблицы (с фильтром WHERE) в файл CSV или JSON Lines.
+
+    Строки читаются потоково и сразу пишутся в файл; возвращает их число.
+    """
+    cols = _get_table_schema(metadata, table_name)
+    columns = [c["name"] for c in cols]
 
-    new_data = [row for row in table_data if not _row_matches_where(row, where_clause)]
-    return new_data
+    rows = scan_table(metadata, table_name, where_clause, lazy=True, parallel=False)
+    return write_records(filepath, columns, iter_select(rows, where_clause), fmt)
 
 
 def describe_table(filepath: str, table_name: str) -> dict:
@@ -1,34 +1,110 @@
 #!/usr/bin/env python3
 
+import io
 import shlex
+import sys
+import time
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from itertools import islice
 
 from prettytable import PrettyTable
 
-from src.decorators import create_cacher
-from src.primitive_db.constants import META_PATH
+from src.decorators import create_cacher, set_auto_confirm, set_log_time_enabled
+from src.primitive_db.aggregate import aggregate_label
+from src.primitive_db.constants import (
+    BUFFER_CHECKPOINT_EVERY,
+    BUFFER_FLUSH_POLICY,
+    DEFAULT_INDEX_KIND,
+    ID_COLUMN,
+    INDEXES_KEY,
+    META_PATH,
+    SELECT_CACHE_ENABLED,
+    SELECT_CACHE_MAX_BYTES,
+    SELECT_CACHE_MAX_ENTRIES,
+    STATS_KEY,
+)
 from src.primitive_db.core import (
     _ensure_schema,
+    _get_table_schema,
+    aggregate,
+    analyze_table,
+    create_index,
     create_table,
     delete,
+    drop_index,
     drop_table,
+    export_rows,
+    import_rows,
     insert,
+    iter_join,
+    iter_select,
+    join,
+    join_columns,
+    recover_database,
+    release_ids,
+    resolve_join_column,
+    scan_table,
     select,
     update,
 )
+from src.primitive_db.index import flush_indexes
+from src.primitive_db.lock import metadata_lock
+from src.primitive_db.parallel import (
+    scan_workers,
+    set_scan_workers,
+    shutdown_scan_pool,
+)
 from src.primitive_db.parser import (
+    parse_aggregate_clause,
+    parse_condition,
+    parse_join_clause,
+    parse_limit_clause,
     parse_multiple_conditions,
+    parse_order_clause,
     parse_set_clause,
-    parse_where_clause,
 )
+from src.primitive_db.planner import (
+    ACCESS_TITLES,
+    explaining,
+    start_explain,
+    stop_explain,
+)
+from src.primitive_db.schema import table_schema
+from src.primitive_db.sort import sort_rows
 from src.primitive_db.utils import (
-    delete_table_data_file,
+    begin_transaction,
+    checkpoint,
+    commit_transaction,
+    compact_table_data,
+    convert_table_data,
+    drop_table_data,
+    flush_tables,
+    in_transaction,
     load_metadata,
-    load_table_data,
+    remove_table_rows,
+    rollback_transaction,
     save_metadata,
-    save_table_data,
+    set_flush_policy,
+    table_version,
+    table_write_lock,
+    write_table_rows,
 )
 
-select_cacher = create_cacher()
+select_cacher = create_cacher(SELECT_CACHE_MAX_ENTRIES, SELECT_CACHE_MAX_BYTES)
+select_cacher.cache_configure(enabled=SELECT_CACHE_ENABLED)
+
+# Приёмник строк результата: None — печатать таблицей, список — собирать
+# строки без отрисовки (см. execute_captured)
+_ROW_SINK = {"rows": None}
+
+
+def _cached(cache_key, compute):
+    """Результат select из кэша; под explain запрос выполняется заново,
+    чтобы план и время отражали реальное чтение строк.
+    """
+    if explaining():
+        return compute()
+    return select_cacher(cache_key, compute)
 
 
 def _print_help() -> None:
@@ -43,12 +119,66 @@ def _print_help() -> None:
     print("<command> drop <table> - удалить таблицу")
     print("<command> describe <table> - показать структуру таблицы")
     print("<command> insert <table> <v1> <v2> ... - добавить запись")
-    print("<command> select <table> [WHERE col = value] - вывести записи")
     print(
-        "<command> update <table> SET col = value WHERE col = value - "
+        "<command> select <table> [WHERE <условие>] [ORDER BY col [ASC|DESC]] "
+        "[LIMIT n] [OFFSET m] [PAGE n] - вывести записи"
+    )
+    print(
+        "<command> select <table> JOIN <table2> ON <table>.col = <table2>.col "
+        "[WHERE <условие>] ... - соединение таблиц"
+    )
+    print(
+        "<command> select <table> COUNT(*)|SUM(col)|MIN(col)|MAX(col)|AVG(col), "
+        "... [WHERE <условие>] [GROUP BY col, ...] - агрегаты"
+    )
+    print(
+        "<command> update <table> SET col = value WHERE <условие> - "
         "обновить записи"
     )
-    print("<command> delete <table> WHERE col = value - удалить записи")
+    print("<command> delete <table> WHERE <условие> - удалить записи")
+    print(
+        "  <условие>: =, !=, <, <=, >, >=, IN (...), BETWEEN a AND b, "
+        "AND, OR, NOT, скобки"
+    )
+    print(
+        "<command> import <table> <file.csv|file.jsonl> - "
+        "загрузить записи из файла"
+    )
+    print(
+        "<command> export <table> [WHERE col = value] to <file> "
+        "[format csv|jsonl] - выгрузить записи в файл"
+    )
+    print("<command> compact <table> - уплотнить файл данных таблицы")
+    print(
+        "<command> convert <table> to binary|json|log - "
+        "перевести данные таблицы в другой формат хранения"
+    )
+    print(
+        "<command> create index <table> <column> [hash|sorted] - "
+        "создать индекс по колонке"
+    )
+    print("<command> drop index <table> <column> - удалить индекс")
+    print(
+        "<command> analyze <table> - собрать статистику таблицы "
+        "для планировщика запросов"
+    )
+    print(
+        "<command> explain select|update|delete ... - показать план запроса "
+        "с оценками, фактическим числом строк и временем"
+    )
+    print("<command> checkpoint - сбросить изменения из памяти на диск")
+    print(
+        "<command> begin | commit | rollback - начать, зафиксировать "
+        "или откатить транзакцию"
+    )
+    print(
+        "<command> cache [on|off|clear|limit <entries> <bytes>] - "
+        "статистика и настройка кэша select"
+    )
+    print(
+        "<command> parallel [<n>|auto] - число процессов параллельного "
+        "перебора больших таблиц"
+    )
 
 
 def _cmd_tables(meta: dict) -> None:
@@ -89,266 +219,999 @@ def _cmd_describe(meta: dict, table_name: str) -> None:
 
         print(f"- {name}:{typ}")
 
+    indexes = meta["tables"][table_name].get(INDEXES_KEY, {})
+    for column, kind in indexes.items():
+        print(f"- индекс: {column} ({kind})")
 
-def welcome() -> None:
-    """Приветствие и справка, затем запуск основного цикла."""
-    print("Первая попытка запустить проект!")
-    print("***")
-    _print_help()
-    run()
 
+def _cmd_create_index(meta: dict, args: list) -> None:
+    """Обрабатывает команду create index: строит индекс и сохраняет метаданные."""
+    if len(args) not in (2, 3):
+        print("Ошибка: используйте create index <table> <column> [hash|sorted]")
+        return
 
-def run() -> None:
-    """Основной цикл: чтение команд, разбор и вызов обработчиков."""
-    while True:
-        meta = _ensure_schema(load_metadata(META_PATH))
+    table_name, column = args[0], args[1]
+    kind = args[2].lower() if len(args) == 3 else DEFAULT_INDEX_KIND
 
+    if not create_index(meta, table_name, column, kind):
+        return
+
+    save_metadata(META_PATH, meta)
+    print(f"Индекс '{kind}' по колонке '{column}' таблицы '{table_name}' создан.")
+
+
+def _cmd_drop_index(meta: dict, args: list) -> None:
+    """Обрабатывает команду drop index: удаляет индекс и сохраняет метаданные."""
+    if len(args) != 2:
+        print("Ошибка: используйте drop index <table> <column>")
+        return
+
+    table_name, column = args
+    if not drop_index(meta, table_name, column):
+        return
+
+    save_metadata(META_PATH, meta)
+    print(f"Индекс по колонке '{column}' таблицы '{table_name}' удалён.")
+
+
+def _cmd_cache(args: list) -> None:
+    """Обрабатывает команду cache: статистика, включение/отключение, лимиты."""
+    if not args:
+        info = select_cacher.cache_info()
+        state = "включён" if info["enabled"] else "отключён"
+        print(f"Кэш select {state}.")
+        print(
+            f"Записей: {info['entries']} (лимит {info['max_entries']}), "
+            f"байт: {info['bytes']} (лимит {info['max_bytes']})"
+        )
+        print(
+            f"Попаданий: {info['hits']}, промахов: {info['misses']}, "
+            f"вытеснений: {info['evictions']}"
+        )
+        return
+
+    action = args[0].lower()
+    if action == "on" and len(args) == 1:
+        select_cacher.cache_configure(enabled=True)
+        print("Кэш select включён.")
+    elif action == "off" and len(args) == 1:
+        select_cacher.cache_configure(enabled=False)
+        print("Кэш select отключён.")
+    elif action == "clear" and len(args) == 1:
+        select_cacher.cache_clear()
+        print("Кэш select очищен.")
+    elif action == "limit" and len(args) == 3:
         try:
-            raw = input("Введите команду: ").strip()
+            max_entries, max_bytes = int(args[1]), int(args[2])
+        except ValueError:
+            print("Ошибка: лимиты должны быть целыми числами.")
+            return
+        select_cacher.cache_configure(max_entries=max_entries, max_bytes=max_bytes)
+        print("Лимиты кэша select обновлены.")
+    else:
+        print("Ошибка: используйте cache [on|off|clear|limit <entries> <bytes>]")
+
+
+def _cmd_parallel(args: list) -> None:
+    """Обрабатывает команду parallel: показать или задать число процессов."""
+    if len(args) > 1:
+        print("Ошибка: используйте parallel [<n>|auto]")
+        return
+    if args:
+        workers = None
+        if args[0].lower() != "auto":
+            try:
+                workers = int(args[0])
+            except ValueError:
+                workers = 0
+            if workers < 1:
+                print("Ошибка: число процессов — целое число от 1 или auto.")
+                return
+        set_scan_workers(workers)
+    workers = scan_workers()
+    if workers < 2:
+        print("Параллельный перебор отключён (1 процесс).")
+    else:
+        print(f"Параллельный перебор: процессов {workers}.")
+
+
+def _print_rows(rows: list[dict]) -> None:
+    """Выводит строки таблицей PrettyTable (или передаёт их в приёмник)."""
+    sink = _ROW_SINK["rows"]
+    if sink is not None:
+        sink.extend(rows)
+        return
+    columns = list(rows[0].keys())
+    pt = PrettyTable(columns)
+    for row in rows:
+        pt.add_row([row.get(c) for c in columns])
+    print(pt)
+
+
+def _print_pages(rows, page_size: int) -> None:
+    """Постраничный вывод: строки читаются и отрисовываются по одной странице."""
+    shown = 0
+    while True:
+        page = list(islice(rows, page_size))
+        if not page:
+            break
+        _print_rows(page)
+        shown += len(page)
+        if len(page) < page_size:
+            break
+        try:
+            answer = input(f"-- показано {shown}; Enter — далее, q — выход: ")
         except EOFError:
             print()
             break
+        if answer.strip().lower() == "q":
+            break
 
-        if not raw:
-            continue
+    if not shown:
+        print("Записей не найдено.")
+
+
+def _cmd_aggregate(
+    meta: dict,
+    table_name: str,
+    aggregates: list,
+    where_clause,
+    group_by: list,
+    order_by: list,
+    paging: dict,
+) -> None:
+    """Выводит результат агрегатного запроса (по строке на группу)."""
+    columns = list(group_by) + [aggregate_label(f, c) for f, c in aggregates]
+    unknown = [column for column, _ in order_by if column not in columns]
+    if unknown:
+        print(
+            f"Ошибка: ORDER BY по '{unknown[0]}' невозможен, "
+            f"доступны: {', '.join(columns)}."
+        )
+        return
 
-        parts = shlex.split(raw)
-        cmd = parts[0]
-        args = parts[1:]
+    cache_key = (
+        table_name,
+        table_version(table_name),
+        where_clause,
+        tuple(aggregates),
+        tuple(group_by),
+    )
+    result = _cached(
+        cache_key,
+        lambda: aggregate(meta, table_name, aggregates, where_clause, group_by),
+    )
 
-        if cmd == "exit":
-            break
+    limit, offset = paging["limit"], paging["offset"]
+    if order_by:
+        rows = sort_rows(result, order_by, limit, offset)
+    else:
+        stop = None if limit is None else offset + limit
+        rows = islice(result, offset, stop)
 
-        elif cmd == "help":
-            _print_help()
-            continue
+    if paging["page"]:
+        _print_pages(rows, paging["page"])
+        return
 
-        elif cmd == "tables":
-            _cmd_tables(meta)
-            continue
+    rows = list(rows)
+    if not rows:
+        print("Записей не найдено.")
+        return
+    _print_rows(rows)
+
+
+def _cmd_join(
+    meta: dict,
+    table_name: str,
+    join_spec: dict,
+    where_clause,
+    order_by: list,
+    paging: dict,
+) -> None:
+    """Выводит результат соединения двух таблиц (JOIN ... ON ...)."""
+    right = join_spec["table"]
+    if right not in meta.get("tables", {}):
+        print(f"Ошибка: таблица '{right}' не существует.")
+        return
 
-        elif cmd == "describe":
-            if len(args) != 1:
-                print("Ошибка: используйте describe <table>")
-                continue
-            _cmd_describe(meta, args[0])
-            continue
+    columns = join_columns(meta, table_name, right)
+    try:
+        order_by = [
+            ("{}.{}".format(*resolve_join_column(columns, column)), desc)
+            for column, desc in order_by
+        ]
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return
 
-        elif cmd == "create":
-            if len(args) < 2:
-                print("Ошибка: используйте create <table> <col:type> [<col:type> ...]")
-                continue
+    limit, offset = paging["limit"], paging["offset"]
 
-            table_name = args[0]
-            col_specs = args[1:]
+    if paging["page"]:
+        try:
+            rows = iter_join(meta, table_name, right, join_spec["on"], where_clause)
+        except ValueError as e:
+            print(f"Ошибка: {e}")
+            return
+        _print_pages(iter_select(rows, None, limit, offset, order_by), paging["page"])
+        return
 
-            cols = []
-            ok = True
-            for spec in col_specs:
-                if ":" not in spec:
-                    print(
-                        f"Ошибка: неверный формат колонки '{spec}'. "
-                        "Нужно name:type (без пробелов)"
-                    )
-                    ok = False
-                    break
-                name, typ = spec.split(":", 1)
-                cols.append((name.strip(), typ.strip()))
+    cache_key = (
+        table_name,
+        table_version(table_name),
+        right,
+        table_version(right),
+        join_spec["on"],
+        where_clause,
+        limit,
+        offset,
+        tuple(order_by),
+    )
+    result = _cached(
+        cache_key,
+        lambda: join(
+            meta,
+            table_name,
+            right,
+            join_spec["on"],
+            where_clause,
+            limit,
+            offset,
+            order_by,
+        ),
+    )
 
-            if not ok:
-                continue
+    if not result:
+        print("Записей не найдено.")
+        return
+    _print_rows(result)
+
+
+def _cmd_select(meta: dict, args: list) -> None:
+    """Обрабатывает команду select: агрегаты, WHERE, GROUP BY, ORDER BY,
+    LIMIT/OFFSET и постраничный вывод.
+    """
+    if len(args) < 1:
+        print(
+            "Ошибка: используйте select <table> [агрегаты] [WHERE <условие>] "
+            "[GROUP BY col] [ORDER BY col [ASC|DESC]] [LIMIT n] [OFFSET m] "
+            "[PAGE n]"
+        )
+        return
 
-            existed_before = table_name in meta.get("tables", {})
+    # Допускается и запись в стиле SQL: select * from <table> ...
+    if len(args) > 2 and args[0] == "*" and args[1].lower() == "from":
+        args = args[2:]
 
-            meta2 = create_table(meta, table_name, cols)
+    table_name = args[0]
+    if table_name not in meta.get("tables", {}):
+        print(f"Ошибка: таблица '{table_name}' не существует.")
+        return
 
-            created_now = (
-                (not existed_before) and (table_name in meta2.get("tables", {}))
-            )
-            if created_now:
-                save_metadata(META_PATH, meta2)
-                print(f"Таблица '{table_name}' создана.")
+    where_clause = None
+    try:
+        query, paging = parse_limit_clause(" ".join(args[1:]))
+        query, order_by = parse_order_clause(query)
+        query, join_spec = parse_join_clause(query)
+        query, aggregates, group_by = parse_aggregate_clause(query)
+        if query:
+            where_str = query
+            if where_str.upper().startswith("WHERE"):
+                where_str = where_str[5:].strip()
+            where_clause = parse_condition(where_str)
+    except ValueError as e:
+        print(f"Ошибка парсинга WHERE: {e}")
+        return
 
-            continue
+    if join_spec:
+        if aggregates:
+            print("Ошибка: агрегаты вместе с JOIN не поддерживаются.")
+            return
+        _cmd_join(meta, table_name, join_spec, where_clause, order_by, paging)
+        return
+
+    if aggregates:
+        _cmd_aggregate(
+            meta, table_name, aggregates, where_clause, group_by, order_by, paging
+        )
+        return
+
+    columns = [c["name"] for c in _get_table_schema(meta, table_name)]
+    unknown = [column for column, _ in order_by if column not in columns]
+    if unknown:
+        print(f"Ошибка: в таблице '{table_name}' нет колонки '{unknown[0]}'.")
+        return
 
-        elif cmd == "drop":
-            if len(args) != 1:
-                print("Ошибка: используйте drop <table>")
-                continue
+    limit, offset = paging["limit"], paging["offset"]
+    bounded = limit is not None or offset > 0
+    # С ORDER BY строки тоже читаются потоково: сортировка сама решает,
+    # сколько держать в памяти
+    lazy = bounded or bool(order_by)
+    # LIMIT без ORDER BY останавливает перебор раньше: параллельно
+    # перебирать всю таблицу незачем
+    parallel = not bounded or bool(order_by)
+
+    if paging["page"]:
+        rows = scan_table(meta, table_name, where_clause, lazy=True)
+        _print_pages(
+            iter_select(rows, where_clause, limit, offset, order_by), paging["page"]
+        )
+        return
 
-            table_name = args[0]
-            existed = "tables" in meta and table_name in meta.get("tables", {})
+    # Версия таблицы в ключе: после любой записи старый результат
+    # становится недостижим и со временем вытесняется
+    cache_key = (table_name, table_version(table_name), where_clause)
+    if bounded:
+        cache_key += (limit, offset)
+    if order_by:
+        cache_key += (tuple(order_by),)
+
+    result = _cached(
+        cache_key,
+        lambda: select(
+            scan_table(meta, table_name, where_clause, lazy=lazy, parallel=parallel),
+            where_clause,
+            limit,
+            offset,
+            order_by,
+        ),
+    )
 
-            new_meta = drop_table(meta, table_name)
+    if not result:
+        print("Записей не найдено.")
+        return
 
-            if new_meta is None:
-                continue
+    _print_rows(result)
 
-            if (
-                existed
-                and "tables" in new_meta
-                and table_name not in new_meta["tables"]
-            ):
-                save_metadata(META_PATH, new_meta)
-                delete_table_data_file(table_name)
-                print(f"Таблица '{table_name}' удалена.")
-            elif not existed:
-                print(f"Таблица '{table_name}' не существовала.")
 
-            continue
+def _cmd_analyze(meta: dict, args: list) -> None:
+    """Обрабатывает команду analyze: собирает статистику таблицы."""
+    if len(args) != 1:
+        print("Ошибка: используйте analyze <table>")
+        return
+    table_name = args[0]
+    if table_name not in meta.get("tables", {}):
+        print(f"Ошибка: таблица '{table_name}' не существует.")
+        return
 
-        elif cmd == "select":
-
-            if len(args) < 1:
-                print("Ошибка: используйте select <table> [WHERE column = value]")
-                continue
-
-            table_name = args[0]
-            if table_name not in meta.get("tables", {}):
-                print(f"Ошибка: таблица '{table_name}' не существует.")
-                continue
-
-            table_data = load_table_data(table_name)
-
-            where_clause = None
-            if len(args) > 1:
-                where_str = " ".join(args[1:]).strip()
-                if where_str.upper().startswith("WHERE"):
-                    where_str = where_str[5:].strip()
-
-                try:
-                    where_clause = parse_multiple_conditions(
-                        where_str, parse_where_clause
-                    )
-                except ValueError as e:
-                    print(f"Ошибка парсинга WHERE: {e}")
-                    continue
-
-            if where_clause:
-                cache_key = (table_name, frozenset(where_clause.items()))
-            else:
-                cache_key = (table_name, frozenset())
-            result = select_cacher(
-                cache_key,
-                lambda: select(table_data, where_clause),
-            )
+    meta = analyze_table(meta, table_name)
+    stats = meta["tables"][table_name].get(STATS_KEY)
+    if stats is None:
+        return
+    save_metadata(META_PATH, meta)
+    print(
+        f"Статистика таблицы '{table_name}' собрана: строк {stats['rows']}, "
+        f"колонок {len(stats['columns'])}."
+    )
 
-            if not result:
-                print("Записей не найдено.")
-                continue
 
-            if result:
-                columns = list(result[0].keys())
-                pt = PrettyTable(columns)
-                for row in result:
-                    pt.add_row([row.get(c) for c in columns])
-                print(pt)
+def _explained_query(args: list) -> list | None:
+    """Аргументы select для explain. Для update и delete строится выборка
+    тех же строк по их WHERE: сами изменения не выполняются.
+    """
+    if not args or args[0] not in ("select", "update", "delete") or len(args) < 2:
+        return None
+    if args[0] == "select":
+        return args[1:]
+    rest = " ".join(args[2:])
+    where_pos = rest.upper().find("WHERE")
+    if where_pos == -1:
+        return [args[1]]
+    return [args[1], rest[where_pos:]]
+
+
+def _print_plan(plan) -> None:
+    """Выводит план чтения одной таблицы."""
+    location = "на диске" if plan.cold else "в буферном пуле"
+    stats = "есть" if plan.has_stats else f"нет (analyze {plan.table_name})"
+    print(
+        f"Таблица '{plan.table_name}': строк {plan.rows}, {location}, "
+        f"статистика: {stats}"
+    )
+    pt = PrettyTable(["способ", "строк прочитать", "стоимость", "выбран"])
+    for access, rows, cost, note in plan.options:
+        title = ACCESS_TITLES[access] + (f" ({note})" if note else "")
+        pt.add_row([title, rows, f"{cost:.1f}", "*" if access == plan.access else ""])
+    print(pt)
+    print(
+        f"Строк по условию: ожидалось {plan.estimated}; "
+        f"получено способом доступа: {plan.read} ({plan.source or 'не читались'})"
+    )
 
-            continue
 
-        elif cmd == "update":
-            if len(args) < 2:
-                print(
-                    "Ошибка: используйте update <table> SET col = value "
-                    "WHERE col = value"
-                )
-                continue
+def _cmd_explain(meta: dict, args: list) -> None:
+    """Обрабатывает команду explain: выполняет запрос без вывода строк
+    и показывает планы чтения таблиц, число строк и время.
+    """
+    query = _explained_query(args)
+    if query is None:
+        print("Ошибка: используйте explain select|update|delete <table> ...")
+        return
 
-            table_name = args[0]
-            if table_name not in meta.get("tables", {}):
-                print(f"Ошибка: таблица '{table_name}' не существует.")
-                continue
+    rows = []
+    sink, stdin = _ROW_SINK["rows"], sys.stdin
+    output = io.StringIO()
+    _ROW_SINK["rows"] = rows
+    sys.stdin = io.StringIO()
+    start_explain()
+    started = time.perf_counter()
+    try:
+        with redirect_stdout(output):
+            _cmd_select(meta, query)
+    finally:
+        elapsed = time.perf_counter() - started
+        plans = stop_explain()
+        _ROW_SINK["rows"] = sink
+        sys.stdin = stdin
+
+    if not plans:
+        print(output.getvalue().strip() or "Запрос не читает строки таблиц.")
+        return
+    for plan in plans:
+        _print_plan(plan)
+    planning = sum(plan.planning for plan in plans)
+    print(f"Строк в результате: {len(rows)}")
+    print(
+        f"Время: планирование {planning * 1000:.2f} мс, "
+        f"выполнение {(elapsed - planning) * 1000:.2f} мс"
+    )
 
-            cmd_str = " ".join(args[1:]).strip()
-            cmd_up = cmd_str.upper()
 
-            set_pos = cmd_up.find("SET")
-            where_pos = cmd_up.find("WHERE")
+def _cmd_export(meta: dict, args: list) -> None:
+    """Обрабатывает команду export: потоковая выгрузка записей в файл."""
+    usage = (
+        "Ошибка: используйте export <table> [WHERE col = value] to <file> "
+        "[format csv|jsonl]"
+    )
+    lowered = [a.lower() for a in args]
+    if len(args) < 3 or "to" not in lowered:
+        print(usage)
+        return
 
-            if set_pos == -1:
-                print("Ошибка: требуется ключевое слово SET")
-                continue
+    to_pos = len(lowered) - 1 - lowered[::-1].index("to")
+    table_name = args[0]
+    where_str = " ".join(args[1:to_pos]).strip()
+    target = args[to_pos + 1 :]
 
-            if where_pos != -1:
-                set_str = cmd_str[set_pos + 3 : where_pos].strip()
-                where_str = cmd_str[where_pos + 5 :].strip()
-            else:
-                set_str = cmd_str[set_pos + 3 :].strip()
-                where_str = ""
+    fmt = None
+    if len(target) == 3 and target[1].lower() == "format":
+        fmt = target[2].lower()
+    elif len(target) != 1:
+        print(usage)
+        return
+    filepath = target[0]
 
-            try:
-                set_clause = (
-                    parse_multiple_conditions(set_str, parse_set_clause)
-                    if set_str
-                    else {}
-                )
-                where_clause = (
-                    parse_multiple_conditions(where_str, parse_where_clause)
-                    if where_str
-                    else {}
-                )
-            except ValueError as e:
-                print(f"Ошибка парсинга SET/WHERE: {e}")
-                continue
-
-            table_data = load_table_data(table_name)
-            new_data = update(table_data, set_clause, where_clause)
-            save_table_data(table_name, new_data)
-            print("Записи обновлены.")
-            continue
+    if table_name not in meta.get("tables", {}):
+        print(f"Ошибка: таблица '{table_name}' не существует.")
+        return
 
-        elif cmd == "delete":
-            if len(args) < 2:
-                print("Ошибка: используйте delete <table> WHERE column = value")
-                continue
+    if where_str.upper().startswith("WHERE"):
+        where_str = where_str[5:].strip()
+    elif where_str:
+        print(usage)
+        return
 
-            table_name = args[0]
-            if table_name not in meta.get("tables", {}):
-                print(f"Ошибка: таблица '{table_name}' не существует.")
-                continue
+    try:
+        where_clause = parse_condition(where_str)
+    except ValueError as e:
+        print(f"Ошибка парсинга WHERE: {e}")
+        return
 
-            where_str = " ".join(args[1:]).strip()
-            if where_str.upper().startswith("WHERE"):
-                where_str = where_str[5:].strip()
+    count = export_rows(meta, table_name, filepath, where_clause, fmt)
+    if isinstance(count, int):
+        print(f"Выгружено записей: {count} в '{filepath}'.")
 
-            try:
-                where_clause = parse_multiple_conditions(where_str, parse_where_clause)
-            except ValueError as e:
-                print(f"Ошибка парсинга WHERE: {e}")
-                continue
 
-            table_data = load_table_data(table_name)
-            new_data = delete(table_data, where_clause)
+def _cmd_convert(meta: dict, args: list) -> None:
+    """Обрабатывает команду convert: перевод таблицы в другой формат хранения."""
+    if len(args) != 3 or args[1].lower() != "to":
+        print("Ошибка: используйте convert <table> to binary|json|log")
+        return
 
-            if new_data is None:
-                continue
+    table_name, storage_name = args[0], args[2].lower()
+    if table_name not in meta.get("tables", {}):
+        print(f"Ошибка: таблица '{table_name}' не существует.")
+        return
 
-            if not isinstance(new_data, list):
-                print("Ошибка: функция delete вернула неверный тип данных.")
-                continue
+    try:
+        count = convert_table_data(table_name, storage_name)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return
+    print(
+        f"Таблица '{table_name}' переведена в формат '{storage_name}', "
+        f"строк: {count}."
+    )
+
+
+def _checkpoint() -> None:
+    """Контрольная точка: сбрасывает на диск изменённые таблицы и индексы
+    и очищает журнал упреждающей записи (кроме открытой транзакции).
+    """
+    if in_transaction():
+        return
+    checkpoint()
+    flush_indexes()
+
+
+# Команды, недоступные внутри транзакции: меняют схему или файлы таблиц
+# в обход отложенных изменений
+_NON_TRANSACTIONAL_COMMANDS = {
+    "create",
+    "drop",
+    "compact",
+    "convert",
+    "checkpoint",
+    "analyze",
+}
+
+
+def _cmd_transaction(cmd: str) -> None:
+    """Обрабатывает команды begin, commit и rollback."""
+    try:
+        if cmd == "begin":
+            begin_transaction()
+            print("Транзакция начата.")
+        elif cmd == "commit":
+            count = commit_transaction()
+            print(f"Транзакция зафиксирована (изменено таблиц: {count}).")
+        else:
+            count = rollback_transaction()
+            print(f"Транзакция отменена (затронуто таблиц: {count}).")
+    except ValueError as e:
+        print(f"Ошибка: {e}")
 
-            save_table_data(table_name, new_data)
-            print("Записи удалены.")
+
+def _finish() -> None:
+    """Завершение работы: откат незафиксированной транзакции, возврат
+    невыданных ID и контрольная точка.
+    """
+    if in_transaction():
+        rollback_transaction()
+        print("Незафиксированная транзакция отменена.")
+    release_ids(META_PATH)
+    _checkpoint()
+    shutdown_scan_pool()
+
+
+def _recover() -> None:
+    """Восстанавливает БД после сбоя предыдущего запуска, если он был."""
+    replayed = recover_database(META_PATH)
+    if replayed:
+        print(f"Восстановление после сбоя: применено записей журнала: {replayed}.")
+
+
+def welcome() -> None:
+    """Приветствие и справка, затем запуск основного цикла."""
+    print("Первая попытка запустить проект!")
+    print("***")
+    _print_help()
+    run()
+
+
+def run() -> None:
+    """Основной цикл: чтение команд, разбор и вызов обработчиков."""
+    _recover()
+    commands_since_checkpoint = 0
+
+    while True:
+        if commands_since_checkpoint >= BUFFER_CHECKPOINT_EVERY:
+            _checkpoint()
+            commands_since_checkpoint = 0
+
+        try:
+            raw = input("Введите команду: ").strip()
+        except EOFError:
+            print()
+            break
+
+        if not raw:
+            continue
+
+        try:
+            parts = shlex.split(raw)
+        except ValueError as e:
+            print(f"Ошибка разбора команды: {e}")
             continue
 
-        elif cmd == "insert":
-            if len(args) < 2:
-                print("Ошибка: используйте insert <table> <v1> <v2> ...")
-                continue
+        commands_since_checkpoint += 1
+        if not execute(parts):
+            break
+
+    _finish()
 
-            table_name = args[0]
-            values = args[1:]
 
-            if table_name not in meta.get("tables", {}):
-                print(f"Ошибка: таблица '{table_name}' не существует.")
-                continue
+# Команды, изменяющие данные одной таблицы (первый аргумент — имя таблицы)
+_WRITE_COMMANDS = {"insert", "update", "delete", "import"}
+# Команды, изменяющие метаданные: выполняются под блокировкой метаданных
+_SCHEMA_COMMANDS = {"create", "drop", "analyze"}
 
-            result = insert(meta, table_name, values)
-            if result:
-                print("Запись добавлена.")
 
+def _parse_script(lines) -> list[list]:
+    """Разбирает все строки сценария заранее; пустые строки и комментарии
+    (# или --) пропускаются, строки с ошибками разбора — с сообщением.
+    """
+    commands = []
+    for lineno, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith(("#", "--")):
             continue
+        try:
+            commands.append(shlex.split(line))
+        except ValueError as e:
+            print(f"Строка {lineno}: ошибка разбора команды: {e}")
+    return commands
+
+
+def _write_target(parts: list | None) -> str | None:
+    """Возвращает таблицу, которую изменяет команда, или None."""
+    if parts and parts[0] in _WRITE_COMMANDS and len(parts) > 1:
+        return parts[1]
+    return None
+
+
+def run_script(lines, assume_yes: bool = False) -> None:
+    """Пакетный режим: выполняет команды сценария без интерактивного ввода.
+
+    Подряд идущие записи в одну таблицу накапливаются в памяти и сбрасываются
+    на диск одной записью; время выполнения не печатается, а подтверждения
+    принимаются только при assume_yes (иначе опасные операции отменяются).
+    """
+    commands = _parse_script(lines)
+
+    set_log_time_enabled(False)
+    set_auto_confirm(assume_yes)
+    set_flush_policy("checkpoint")
+    try:
+        _recover()
+        for i, parts in enumerate(commands):
+            if not execute(parts):
+                break
+            target = _write_target(parts)
+            following = commands[i + 1] if i + 1 < len(commands) else None
+            if target is None or _write_target(following) != target:
+                flush_tables()
+    finally:
+        _finish()
+        set_flush_policy(BUFFER_FLUSH_POLICY)
+        set_auto_confirm(None)
+        set_log_time_enabled(True)
+
+
+@contextmanager
+def _command_locks(parts: list):
+    """Захватывает межпроцессные блокировки команды: записи таблицы для
+    изменяющих команд, метаданных — для изменяющих схему.
+
+    Блокировка записи таблицы всегда берётся раньше блокировки метаданных
+    (как при выдаче ID во время вставки), чтобы процессы не ждали друг друга
+    по кругу.
+    """
+    cmd, args = parts[0], parts[1:]
+    with ExitStack() as stack:
+        target = _write_target(parts)
+        if cmd == "drop" and len(args) == 1:
+            target = args[0]
+        if target is not None:
+            stack.enter_context(table_write_lock(target))
+        if cmd in _SCHEMA_COMMANDS:
+            stack.enter_context(metadata_lock(META_PATH).hold())
+        yield
+
+
+def execute(parts: list) -> bool:
+    """Выполняет одну разобранную команду; возвращает False для exit.
+
+    Если блокировку не удалось получить за LOCK_TIMEOUT_SECONDS
+    (БД занята другим процессом), команда не выполняется.
+    """
+    try:
+        with _command_locks(parts):
+            return _execute(parts)
+    except TimeoutError as e:
+        print(f"Ошибка: {e}")
+        return True
+
+
+def execute_captured(parts: list, collect_rows: bool = False) -> tuple:
+    """Выполняет команду, перехватывая её вывод (для режима сервера).
+
+    Возвращает (продолжать?, текст вывода, строки результата). При
+    collect_rows строки select не отрисовываются таблицей, а возвращаются
+    списком словарей (иначе вместо списка — None). Ввод
+    недоступен: постраничный вывод останавливается после первой страницы.
+    """
+    rows = [] if collect_rows else None
+    output = io.StringIO()
+    stdin = sys.stdin
+    _ROW_SINK["rows"] = rows
+    sys.stdin = io.StringIO()
+    try:
+        with redirect_stdout(output):
+            keep_going = execute(parts)
+    finally:
+        sys.stdin = stdin
+        _ROW_SINK["rows"] = None
+    return keep_going, output.getvalue(), rows
+
+
+def _execute(parts: list) -> bool:
+    """Выполняет команду под блокировками (см. execute)."""
+    meta = _ensure_schema(load_metadata(META_PATH))
+    cmd = parts[0]
+    args = parts[1:]
+
+    if cmd == "exit":
+        return False
+
+    if cmd in _NON_TRANSACTIONAL_COMMANDS and in_transaction():
+        print(f"Ошибка: команда '{cmd}' недоступна внутри транзакции.")
+        return True
+
+    if cmd in ("begin", "commit", "rollback"):
+        _cmd_transaction(cmd)
+        return True
+
+    elif cmd == "help":
+        _print_help()
+        return True
+
+    elif cmd == "tables":
+        _cmd_tables(meta)
+        return True
+
+    elif cmd == "describe":
+        if len(args) != 1:
+            print("Ошибка: используйте describe <table>")
+            return True
+        _cmd_describe(meta, args[0])
+        return True
+
+    elif cmd == "create" and args and args[0].lower() == "index":
+        _cmd_create_index(meta, args[1:])
+        return True
+
+    elif cmd == "drop" and args and args[0].lower() == "index":
+        _cmd_drop_index(meta, args[1:])
+        return True
+
+    elif cmd == "create":
+        if len(args) < 2:
+            print("Ошибка: используйте create <table> <col:type> [<col:type> ...]")
+            return True
+
+        table_name = args[0]
+        col_specs = args[1:]
+
+        cols = []
+        ok = True
+        for spec in col_specs:
+            if ":" not in spec:
+                print(
+                    f"Ошибка: неверный формат колонки '{spec}'. "
+                    "Нужно name:type (без пробелов)"
+                )
+                ok = False
+                break
+            name, typ = spec.split(":", 1)
+            cols.append((name.strip(), typ.strip()))
+
+        if not ok:
+            return True
+
+        existed_before = table_name in meta.get("tables", {})
+
+        meta2 = create_table(meta, table_name, cols)
+
+        created_now = (
+            (not existed_before) and (table_name in meta2.get("tables", {}))
+        )
+        if created_now:
+            save_metadata(META_PATH, meta2)
+            print(f"Таблица '{table_name}' создана.")
+
+        return True
+
+    elif cmd == "drop":
+        if len(args) != 1:
+            print("Ошибка: используйте drop <table>")
+            return True
+
+        table_name = args[0]
+        existed = "tables" in meta and table_name in meta.get("tables", {})
+        index_columns = (
+            list(meta["tables"][table_name].get(INDEXES_KEY, {}))
+            if existed
+            else []
+        )
+
+        new_meta = drop_table(meta, table_name)
+
+        if new_meta is None:
+            return True
+
+        if (
+            existed
+            and "tables" in new_meta
+            and table_name not in new_meta["tables"]
+        ):
+            drop_table_data(META_PATH, new_meta, table_name, index_columns)
+            print(f"Таблица '{table_name}' удалена.")
+        elif not existed:
+            print(f"Таблица '{table_name}' не существовала.")
+
+        return True
+
+    elif cmd == "select":
+        _cmd_select(meta, args)
+        return True
+
+    elif cmd == "explain":
+        _cmd_explain(meta, args)
+        return True
+
+    elif cmd == "analyze":
+        _cmd_analyze(meta, args)
+        return True
+
+    elif cmd == "update":
+        if len(args) < 2:
+            print(
+                "Ошибка: используйте update <table> SET col = value "
+                "WHERE col = value"
+            )
+            return True
+
+        table_name = args[0]
+        if table_name not in meta.get("tables", {}):
+            print(f"Ошибка: таблица '{table_name}' не существует.")
+            return True
 
+        cmd_str = " ".join(args[1:]).strip()
+        cmd_up = cmd_str.upper()
+
+        set_pos = cmd_up.find("SET")
+        where_pos = cmd_up.find("WHERE")
+
+        if set_pos == -1:
+            print("Ошибка: требуется ключевое слово SET")
+            return True
+
+        if where_pos != -1:
+            set_str = cmd_str[set_pos + 3 : where_pos].strip()
+            where_str = cmd_str[where_pos + 5 :].strip()
         else:
-            print("Неизвестная команда. Введите help для списка команд.")
-            continue
+            set_str = cmd_str[set_pos + 3 :].strip()
+            where_str = ""
+
+        try:
+            set_clause = (
+                parse_multiple_conditions(set_str, parse_set_clause)
+                if set_str
+                else {}
+            )
+            where_clause = parse_condition(where_str)
+        except ValueError as e:
+            print(f"Ошибка парсинга SET/WHERE: {e}")
+            return True
+
+        # Значения SET приводятся к типам колонок до чтения строк: иначе
+        # в колонку (и её индекс) попало бы значение другого типа
+        try:
+            set_clause = table_schema(meta, table_name).cast_set(set_clause)
+        except ValueError as e:
+            print(f"Ошибка валидации: {e}")
+            return True
+
+        table_data = scan_table(meta, table_name, where_clause)
+        changed = update(table_data, set_clause, where_clause)
+        if changed:
+            write_table_rows(table_name, changed)
+        print(f"Обновлено записей: {len(changed)}.")
+        return True
+
+    elif cmd == "delete":
+        if len(args) < 2:
+            print("Ошибка: используйте delete <table> WHERE column = value")
+            return True
+
+        table_name = args[0]
+        if table_name not in meta.get("tables", {}):
+            print(f"Ошибка: таблица '{table_name}' не существует.")
+            return True
+
+        where_str = " ".join(args[1:]).strip()
+        if where_str.upper().startswith("WHERE"):
+            where_str = where_str[5:].strip()
+
+        try:
+            where_clause = parse_condition(where_str)
+        except ValueError as e:
+            print(f"Ошибка парсинга WHERE: {e}")
+            return True
+
+        table_data = scan_table(meta, table_name, where_clause)
+        removed = delete(table_data, where_clause)
+
+        if removed is None:
+            return True
+
+        if not isinstance(removed, list):
+            print("Ошибка: функция delete вернула неверный тип данных.")
+            return True
+
+        if removed:
+            remove_table_rows(table_name, [row[ID_COLUMN] for row in removed])
+        print(f"Удалено записей: {len(removed)}.")
+        return True
+
+    elif cmd == "insert":
+        if len(args) < 2:
+            print("Ошибка: используйте insert <table> <v1> <v2> ...")
+            return True
+
+        table_name = args[0]
+        values = args[1:]
+
+        if table_name not in meta.get("tables", {}):
+            print(f"Ошибка: таблица '{table_name}' не существует.")
+            return True
+
+        result = insert(meta, table_name, values)
+        if result:
+            print("Запись добавлена.")
+
+        return True
+
+    elif cmd == "export":
+        _cmd_export(meta, args)
+        return True
+
+    elif cmd == "import":
+        if len(args) != 2:
+            print("Ошибка: используйте import <table> <file.csv|file.jsonl>")
+            return True
+
+        table_name, filepath = args
+        if table_name not in meta.get("tables", {}):
+            print(f"Ошибка: таблица '{table_name}' не существует.")
+            return True
+
+        rows = import_rows(meta, table_name, filepath)
+        if rows:
+            print(f"Импортировано записей: {len(rows)}.")
+        return True
+
+    elif cmd == "checkpoint":
+        _checkpoint()
+        print("Изменения сохранены на диск.")
+        return True
+
+    elif cmd == "cache":
+        _cmd_cache(args)
+        return True
+
+    elif cmd == "parallel":
+        _cmd_parallel(args)
+        return True
+
+    elif cmd == "convert":
+        _cmd_convert(meta, args)
+        return True
+
+    elif cmd == "compact":
+        if len(args) != 1:
+            print("Ошибка: используйте compact <table>")
+            return True
+
+        table_name = args[0]
+        if table_name not in meta.get("tables", {}):
+            print(f"Ошибка: таблица '{table_name}' не существует.")
+            return True
+
+        count = compact_table_data(table_name)
+        print(f"Таблица '{table_name}' уплотнена, строк: {count}.")
+        return True
+
+    else:
+        print("Неизвестная команда. Введите help для списка команд.")
+        return True
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+"""Вторичные индексы таблиц: хеш-индекс (равенство) и сортированный (диапазоны).
+
+Индекс хранится в памяти на время сессии и сохраняется в файл
+data/<table>.<column>.idx вместе с подписью файла данных (размер, mtime).
+Если подпись не совпадает, индекс считается устаревшим и перестраивается.
+"""
+
+import json
+import os
+from bisect import bisect_left, bisect_right
+
+from src.primitive_db.constants import DATA_DIR, ID_COLUMN, INDEX_FILE_EXT
+from src.primitive_db.storage import table_signature
+
+# Загруженные индексы: (таблица, колонка) -> индекс
+_LOADED = {}
+# С какого числа удаляемых строк сортированный индекс не удаляет их по одной,
+# а отбирает оставшиеся за один проход
+_BULK_DISCARD_ROWS = 100
+
+
+def sort_key(value) -> tuple:
+    """Ключ сортировки, позволяющий сравнивать значения разных типов."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (bool, int, float)):
+        return (1, value)
+    return (2, str(value))
+
+
+class HashIndex:
+    """Хеш-индекс: значение колонки -> множество ID строк."""
+
+    kind = "hash"
+
+    def __init__(self, table_name: str, column: str):
+        self.table_name = table_name
+        self.column = column
+        self.by_id = {}
+        self.entries = {}
+        self.signature = None
+        self.dirty = False
+
+    def add(self, row_id: int, value) -> None:
+        """Добавляет пару (ID, значение) в индекс."""
+        self.by_id[row_id] = value
+        self.entries.setdefault(value, set()).add(row_id)
+
+    def fill(self, items) -> None:
+        """Заполняет пустой индекс парами (ID, значение) (при построении
+        и загрузке из файла).
+        """
+        by_id = self.by_id
+        entries = self.entries
+        for row_id, value in items:
+            by_id[row_id] = value
+            entries.setdefault(value, set()).add(row_id)
+
+    def discard(self, row_id: int) -> None:
+        """Удаляет строку с указанным ID из индекса, если она там есть."""
+        if row_id not in self.by_id:
+            return
+        value = self.by_id.pop(row_id)
+        ids = self.entries.get(value)
+        if ids is not None:
+            ids.discard(row_id)
+            if not ids:
+                del self.entries[value]
+
+    def discard_many(self, ids) -> None:
+        """Удаляет из индекса строки с указанными ID."""
+        for row_id in ids:
+            self.discard(row_id)
+
+    def put(self, row: dict) -> None:
+        """Добавляет или обновляет строку в индексе."""
+        row_id = row[ID_COLUMN]
+        value = row.get(self.column)
+        if row_id in self.by_id:
+            if self.by_id[row_id] == value:
+                return
+            self.discard(row_id)
+        self.add(row_id, value)
+
+    def lookup(self, value) -> set:
+        """Возвращает множество ID строк с указанным значением."""
+        return set(self.entries.get(value, ()))
+
+    def count_values(self) -> int:
+        """Возвращает число строк с непустым значением колонки."""
+        return len(self.by_id) - len(self.entries.get(None, ()))
+
+    def items(self):
+        """Пары (ID, значение) в порядке хранения в файле."""
+        return self.by_id.items()
+
+
+class SortedIndex(HashIndex):
+    """Сортированный индекс: дополнительно поддерживает выборку по диапазону.
+
+    keys и ids — параллельные списки, упорядоченные по (ключ значения, ID),
+    поэтому и вставка, и удаление строки находят позицию двоичным поиском.
+    """
+
+    kind = "sorted"
+
+    def __init__(self, table_name: str, column: str):
+        super().__init__(table_name, column)
+        self.keys = []
+        self.ids = []
+
+    def _position(self, key: tuple, row_id: int) -> int:
+        """Позиция пары (ключ, ID) в упорядоченных списках."""
+        low = bisect_left(self.keys, key)
+        high = bisect_right(self.keys, key, low)
+        return bisect_left(self.ids, row_id, low, high)
+
+    def add(self, row_id: int, value) -> None:
+        """Добавляет пару (ID, значение), сохраняя порядок значений."""
+        super().add(row_id, value)
+        key = sort_key(value)
+        pos = self._position(key, row_id)
+        self.keys.insert(pos, key)
+        self.ids.insert(pos, row_id)
+
+    def fill(self, items) -> None:
+        """Заполняет пустой индекс одной сортировкой всех пар, без вставок
+        по одной.
+        """
+        super().fill(items)
+        pairs = sorted(
+            (sort_key(value), row_id) for row_id, value in self.by_id.items()
+        )
+        self.keys = [key for key, _ in pairs]
+        self.ids = [row_id for _, row_id in pairs]
+
+    def discard(self, row_id: int) -> None:
+        """Удаляет строку с указанным ID из индекса, если она там есть."""
+        if row_id not in self.by_id:
+            return
+        key = sort_key(self.by_id[row_id])
+        super().discard(row_id)
+        pos = self._position(key, row_id)
+        if pos < len(self.ids) and self.ids[pos] == row_id:
+            del self.keys[pos]
+            del self.ids[pos]
+
+    def discard_many(self, ids) -> None:
+        """Удаляет строки с указанными ID; многие строки удаляются за один
+        проход по спискам, а не сдвигом списков на каждую.
+        """
+        gone = {row_id for row_id in ids if row_id in self.by_id}
+        if len(gone) < _BULK_DISCARD_ROWS:
+            super().discard_many(gone)
+            return
+        for row_id in gone:
+            HashIndex.discard(self, row_id)
+        kept = [
+            (key, row_id)
+            for key, row_id in zip(self.keys, self.ids)
+            if row_id not in gone
+        ]
+        self.keys = [key for key, _ in kept]
+        self.ids = [row_id for _, row_id in kept]
+
+    def range(self, low=None, high=None, include_low=True, include_high=True) -> set:
+        """Возвращает ID строк со значениями в диапазоне [low, high]."""
+        if low is None:
+            start = 0
+        elif include_low:
+            start = bisect_left(self.keys, sort_key(low))
+        else:
+            start = bisect_right(self.keys, sort_key(low))
+
+        if high is None:
+            end = len(self.keys)
+        elif include_high:
+            end = bisect_right(self.keys, sort_key(high))
+        else:
+            end = bisect_left(self.keys, sort_key(high))
+
+        return set(self.ids[start:end])
+
+    def min_value(self):
+        """Наименьшее непустое значение колонки (None, если его нет)."""
+        for row_id in self.ids:
+            if self.by_id[row_id] is not None:
+                return self.by_id[row_id]
+        return None
+
+    def max_value(self):
+        """Наибольшее непустое значение колонки (None, если его нет)."""
+        for row_id in reversed(self.ids):
+            if self.by_id[row_id] is not None:
+                return self.by_id[row_id]
+        return None
+
+    def items(self):
+        """Пары (ID, значение) в порядке возрастания значений."""
+        return ((row_id, self.by_id[row_id]) for row_id in self.ids)
+
+
+INDEX_KINDS = {
+    HashIndex.kind: HashIndex,
+    SortedIndex.kind: SortedIndex,
+}
+
+
+def index_path(table_name: str, column: str) -> str:
+    """Возвращает путь к файлу индекса."""
+    return os.path.join(DATA_DIR, f"{table_name}.{column}{INDEX_FILE_EXT}")
+
+
+def _save_index(index) -> None:
+    """Сохраняет индекс в файл."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    payload = {
+        "kind": index.kind,
+        "signature": index.signature,
+        "items": [[row_id, value] for row_id, value in index.items()],
+    }
+    with open(index_path(index.table_name, index.column), "w", encoding="utf-8") as f:
+        # json.dumps кодирует целиком в C, json.dump — по частям на Python
+        f.write(json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+    index.dirty = False
+
+
+def _load_index(table_name: str, column: str, kind: str, signature):
+    """Загружает индекс из файла, если он актуален; иначе возвращает None."""
+    try:
+        with open(index_path(table_name, column), "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    # Подпись сравнивается в виде JSON: вложенные кортежи (подпись дельта-файла
+    # двоичной таблицы) после чтения из файла становятся списками
+    stored = payload.get("signature")
+    if (
+        payload.get("kind") != kind
+        or stored is None
+        or stored != json.loads(json.dumps(signature))
+    ):
+        return None
+
+    index = INDEX_KINDS[kind](table_name, column)
+    index.fill(payload.get("items", []))
+    index.signature = signature
+    return index
+
+
+def build_index(table_name: str, column: str, kind: str, rows: list[dict]):
+    """Строит индекс по строкам таблицы, сохраняет его и регистрирует в сессии."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(
+            f"Неизвестный тип индекса '{kind}'. "
+            f"Допустимы: {', '.join(INDEX_KINDS)}."
+        )
+
+    index = INDEX_KINDS[kind](table_name, column)
+    index.fill((row[ID_COLUMN], row.get(column)) for row in rows)
+    index.signature = table_signature(table_name)
+
+    _save_index(index)
+    _LOADED[(table_name, column)] = index
+    return index
+
+
+def get_index(table_name: str, column: str, kind: str, load_rows):
+    """Возвращает актуальный индекс: из памяти, из файла или построенный заново
+    по строкам, которые возвращает load_rows(table_name).
+    """
+    signature = table_signature(table_name)
+
+    index = _LOADED.get((table_name, column))
+    if index is not None and index.kind == kind and index.signature == signature:
+        return index
+
+    index = _load_index(table_name, column, kind, signature)
+    if index is None:
+        return build_index(table_name, column, kind, load_rows(table_name))
+
+    _LOADED[(table_name, column)] = index
+    return index
+
+
+def _table_indexes(table_name: str) -> list:
+    """Возвращает загруженные в память индексы таблицы."""
+    return [index for (t, _), index in _LOADED.items() if t == table_name]
+
+
+def rows_written(table_name: str, rows: list[dict], before) -> None:
+    """Переносит в загруженные индексы добавленные или изменённые строки.
+
+    before — подпись файла данных до записи; индекс, устаревший ещё до неё,
+    выгружается и будет перестроен при следующем обращении.
+    """
+    signature = table_signature(table_name)
+    for index in _table_indexes(table_name):
+        if index.signature != before:
+            del _LOADED[(table_name, index.column)]
+            continue
+        if index.by_id:
+            for row in rows:
+                index.put(row)
+        else:
+            index.fill((row[ID_COLUMN], row.get(index.column)) for row in rows)
+        index.signature = signature
+        index.dirty = True
+
+
+def rows_removed(table_name: str, ids, before) -> None:
+    """Удаляет из загруженных индексов строки с указанными ID."""
+    ids = list(ids)
+    signature = table_signature(table_name)
+    for index in _table_indexes(table_name):
+        if index.signature != before:
+            del _LOADED[(table_name, index.column)]
+            continue
+        index.discard_many(ids)
+        index.signature = signature
+        index.dirty = True
+
+
+def discard_index(table_name: str, column: str) -> None:
+    """Удаляет индекс из сессии и его файл."""
+    _LOADED.pop((table_name, column), None)
+    path = index_path(table_name, column)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def drop_table_indexes(table_name: str, columns) -> None:
+    """Удаляет все индексы таблицы (при drop таблицы)."""
+    for column in columns:
+        discard_index(table_name, column)
+    for index in _table_indexes(table_name):
+        discard_index(table_name, index.column)
+
+
+def flush_indexes() -> None:
+    """Сохраняет на диск изменённые за сессию индексы."""
+    for index in list(_LOADED.values()):
+        if index.dirty:
+            _save_index(index)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""Межпроцессные блокировки (fcntl) для совместной работы с одной БД.
+
+У каждой таблицы есть файл data/<table>.lock с двумя блокировками:
+
+- блокировка записи (байт 0) — берётся командой, изменяющей таблицу, на всё
+  время чтения-изменения-записи и не даёт двум процессам менять таблицу
+  одновременно;
+- блокировка данных (байт 1) — разделяемая при чтении файла таблицы и
+  исключительная лишь на короткое время публикации новой версии (дозапись
+  в журнал или атомарная замена файла). Пока пишущий процесс готовит
+  изменения, читатели работают с последней опубликованной версией.
+
+Блокировки повторно входимы в пределах процесса и ждут не дольше
+LOCK_TIMEOUT_SECONDS; без fcntl (Windows) блокировки не выполняются.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - зависит от платформы
+    fcntl = None
+
+from src.primitive_db.constants import DATA_DIR, LOCK_FILE_EXT, LOCK_TIMEOUT_SECONDS
+
+# Байты файла блокировки таблицы
+_WRITER_BYTE = 0
+_DATA_BYTE = 1
+
+
+class LockTimeoutError(TimeoutError):
+    """Блокировку не удалось получить за отведённое время."""
+
+
+class FileLock:
+    """Блокировка одного байта файла (fcntl.lockf), повторно входимая.
+
+    Файл открывается один раз и не закрывается: закрытие любого дескриптора
+    файла сняло бы все блокировки процесса на нём.
+    """
+
+    def __init__(self, path: str, offset: int, title: str):
+        self.path = path
+        self.offset = offset
+        self.title = title
+        self._fd = None
+        # Режимы вложенных захватов; действует самый сильный
+        self._held = []
+
+    def _lockf(self, mode) -> None:
+        """Устанавливает режим блокировки байта (без ожидания)."""
+        if self._fd is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.lockf(self._fd, mode, 1, self.offset, os.SEEK_SET)
+
+    def _mode(self):
+        """Режим, соответствующий текущим захватам (None — свободна)."""
+        if not self._held:
+            return None
+        return fcntl.LOCK_EX if fcntl.LOCK_EX in self._held else fcntl.LOCK_SH
+
+    def try_acquire(self, shared: bool = False) -> bool:
+        """Захватывает блокировку, если это возможно сразу."""
+        return self.acquire(shared, timeout=0)
+
+    def acquire(self, shared: bool = False, timeout=None) -> bool:
+        """Захватывает блокировку, ожидая не дольше timeout секунд.
+
+        При timeout=0 возвращает False, если блокировка занята; иначе
+        по истечении времени ожидания выбрасывает LockTimeoutError.
+        """
+        if fcntl is None:
+            return True
+
+        mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if self._mode() in (fcntl.LOCK_EX, mode):
+            self._held.append(mode)
+            return True
+
+        timeout = LOCK_TIMEOUT_SECONDS if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while True:
+            try:
+                self._lockf(mode | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    if timeout == 0:
+                        return False
+                    raise LockTimeoutError(
+                        f"{self.title} занята другим процессом "
+                        f"дольше {timeout} с."
+                    ) from None
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        self._held.append(mode)
+        return True
+
+    def release(self) -> None:
+        """Снимает последний захват (исключительный понижается до
+        разделяемого, если тот ещё удерживается).
+        """
+        if fcntl is None:
+            return
+        before = self._mode()
+        self._held.pop()
+        after = self._mode()
+        if after is None:
+            self._lockf(fcntl.LOCK_UN)
+        elif after != before:
+            self._lockf(after)
+
+    @contextmanager
+    def hold(self, shared: bool = False):
+        """Контекстный менеджер: захват на время блока."""
+        self.acquire(shared)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# Созданные блокировки: (путь, байт) -> FileLock
+_LOCKS = {}
+
+
+def get_lock(path: str, offset: int, title: str) -> FileLock:
+    """Возвращает блокировку байта файла (одну на процесс)."""
+    key = (path, offset)
+    lock = _LOCKS.get(key)
+    if lock is None:
+        lock = _LOCKS[key] = FileLock(path, offset, title)
+    return lock
+
+
+def _table_lock_path(table_name: str) -> str:
+    """Путь к файлу блокировок таблицы."""
+    return os.path.join(DATA_DIR, f"{table_name}{LOCK_FILE_EXT}")
+
+
+def writer_lock(table_name: str) -> FileLock:
+    """Блокировка записи таблицы (на время изменяющей команды)."""
+    return get_lock(
+        _table_lock_path(table_name),
+        _WRITER_BYTE,
+        f"Блокировка записи таблицы '{table_name}'",
+    )
+
+
+def data_lock(table_name: str) -> FileLock:
+    """Блокировка файла данных таблицы (чтение и публикация версии)."""
+    return get_lock(
+        _table_lock_path(table_name),
+        _DATA_BYTE,
+        f"Блокировка данных таблицы '{table_name}'",
+    )
+
+
+def metadata_lock(filepath: str) -> FileLock:
+    """Блокировка метаданных (изменение схемы и выдача ID)."""
+    return get_lock(f"{filepath}{LOCK_FILE_EXT}", 0, "Блокировка метаданных")
@@ -1,11 +1,72 @@
 #!/usr/bin/env python3
 
-from .engine import run
+import argparse
+import sys
 
+from .constants import SERVER_HOST, SERVER_SOCKET_PATH
+from .engine import run, run_script
 
-def main():
-    """Точка входа: запускает основной цикл приложения."""
-    run()
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(prog="database")
+    parser.add_argument(
+        "mode",
+        nargs="?",
+        choices=("serve",),
+        help="serve — запустить сервер (команды по сокету, см. README)",
+    )
+    parser.add_argument(
+        "--script",
+        metavar="FILE",
+        help="выполнить команды из файла ('-' — из стандартного ввода)",
+    )
+    parser.add_argument(
+        "--yes",
+        action="store_true",
+        help="подтверждать опасные операции в пакетном режиме без вопроса",
+    )
+    parser.add_argument(
+        "--socket",
+        default=SERVER_SOCKET_PATH,
+        help=f"сокет Unix сервера (по умолчанию {SERVER_SOCKET_PATH})",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        help="слушать TCP-порт вместо сокета Unix",
+    )
+    parser.add_argument(
+        "--host",
+        default=SERVER_HOST,
+        help=f"адрес для TCP (по умолчанию {SERVER_HOST})",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Точка входа: интерактивный цикл, пакетное выполнение сценария
+    или режим сервера.
+    """
+    args = _parse_args(argv)
+
+    if args.mode == "serve":
+        from .server import serve
+
+        serve(args.socket, args.host, args.port, assume_yes=args.yes)
+        return
+
+    if args.script is None:
+        run()
+        return
+
+    if args.script == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(args.script, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+
+    run_script(lines, assume_yes=args.yes)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""Параллельный перебор таблицы по сегментам в пуле процессов.
+
+Файл таблицы делится движком хранения на сегменты по SEGMENT_ROWS строк
+с границами ID (см. storage.py). Процессы пула читают свои сегменты с диска
+сами, проверяют условие WHERE и возвращают найденные строки или накопители
+агрегатов, которые затем объединяются в порядке сегментов. Блоки сегментов,
+где по зонным картам условию не удовлетворяет ни одна строка, не читаются,
+а сегменты из одних таких блоков не отправляются процессам вовсе.
+
+Пул создаётся при первом параллельном переборе (процессы запускаются
+методом spawn) и живёт до конца работы; число процессов — SCAN_WORKERS
+или по числу ядер.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.primitive_db.aggregate import accumulate_rows, finish_groups, merge_groups
+from src.primitive_db.constants import PARALLEL_SCAN_MIN_ROWS, SCAN_WORKERS
+from src.primitive_db.predicate import compile_predicate
+from src.primitive_db.storage import STORAGE_ENGINES, StaleSegmentError, get_storage
+
+_POOL = {"executor": None, "workers": SCAN_WORKERS}
+
+
+def scan_workers() -> int:
+    """Число процессов параллельного перебора (1 — перебор в одном процессе)."""
+    return _POOL["workers"] or os.cpu_count() or 1
+
+
+def set_scan_workers(workers: int | None) -> None:
+    """Задаёт число процессов (None — по числу ядер); пул пересоздаётся."""
+    if workers is not None and workers < 1:
+        raise ValueError("Число процессов должно быть не меньше 1.")
+    shutdown_scan_pool()
+    _POOL["workers"] = workers
+
+
+def shutdown_scan_pool() -> None:
+    """Останавливает процессы пула, если они запущены."""
+    executor = _POOL["executor"]
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+        _POOL["executor"] = None
+
+
+def _executor() -> ProcessPoolExecutor:
+    """Возвращает пул процессов, создавая его при первом обращении."""
+    if _POOL["executor"] is None:
+        _POOL["executor"] = ProcessPoolExecutor(
+            max_workers=scan_workers(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _POOL["executor"]
+
+
+def _scan_segment(storage_name: str, segment: dict, condition, aggregates, group_by):
+    """Выполняется в процессе пула: читает сегмент и фильтрует его строки;
+    с aggregates возвращает накопители групп вместо строк.
+    """
+    rows = STORAGE_ENGINES[storage_name].read_segment(segment)
+    matches = compile_predicate(condition)
+    if matches is not None:
+        rows = filter(matches, rows)
+    if aggregates is None:
+        return list(rows)
+    return accumulate_rows(rows, aggregates, group_by)
+
+
+def _run(table_name: str, condition, aggregates=None, group_by=()):
+    """Раздаёт сегменты таблицы процессам пула; возвращает список частичных
+    результатов в порядке сегментов или None, если параллельный перебор
+    неприменим (мало строк или процессов, формат без сегментов, файл
+    заменён во время перебора).
+    """
+    if scan_workers() < 2:
+        return None
+    storage = get_storage(table_name)
+    # Счётчик строк дешевле разбиения на сегменты (оно читает смещения
+    # строк и зоны таблицы), поэтому малые таблицы отсекаются первыми
+    if storage.count(table_name) < PARALLEL_SCAN_MIN_ROWS:
+        return None
+    segments = storage.segments(table_name, condition)
+    if segments is None:
+        return None
+
+    executor = _executor()
+    futures = [
+        executor.submit(
+            _scan_segment, storage.name, segment, condition, aggregates, group_by
+        )
+        for segment in segments
+    ]
+    try:
+        return [future.result() for future in futures]
+    except StaleSegmentError:
+        for future in futures:
+            future.cancel()
+        return None
+    except BrokenProcessPool:
+        # Процесс пула аварийно завершился: пул создаётся заново
+        shutdown_scan_pool()
+        return None
+
+
+def parallel_scan(table_name: str, condition) -> list[dict] | None:
+    """Строки таблицы, удовлетворяющие условию, найденные параллельно,
+    или None, если нужен обычный перебор.
+    """
+    parts = _run(table_name, condition)
+    if parts is None:
+        return None
+    return [row for part in parts for row in part]
+
+
+def parallel_aggregate(
+    table_name: str, condition, aggregates: list, group_by: list
+) -> list[dict] | None:
+    """Агрегаты по строкам, удовлетворяющим условию: сегменты агрегируются
+    параллельно, накопители объединяются. None — нужен обычный перебор.
+    """
+    parts = _run(table_name, condition, aggregates, group_by)
+    if parts is None:
+        return None
+    groups = {}
+    for part in parts:
+        merge_groups(groups, part)
+    return finish_groups(groups, aggregates, group_by)
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+import re
+
 
 def _split_by_and(s: str) -> list:
     """Разбивает строку по ' AND ' (без учёта регистра); пробелы схлопываются в один."""
@@ -22,8 +24,14 @@ def _split_by_and(s: str) -> list:
     return parts
 
 
+# Десятичная дробь: 1.5, -.5, 2e3 (но не nan, inf и т.п.)
+_FLOAT_RE = re.compile(r"[+-]?(?:\d+\.\d*|\.\d+|\d+(?=[eE]))(?:[eE][+-]?\d+)?")
+
+
 def _parse_value(value_str: str):
-    """Преобразует строку в значение: число, bool или строка (в кавычках)."""
+    """Преобразует строку в значение: число (целое или дробное), bool,
+    None (null без кавычек) или строка (в кавычках).
+    """
     value_str = value_str.strip()
 
     if (value_str.startswith('"') and value_str.endswith('"')) or \
@@ -34,11 +42,16 @@ def _parse_value(value_str: str):
         return True
     if value_str.lower() == "false":
         return False
+    if value_str.lower() == "null":
+        return None
 
     try:
         return int(value_str)
     except ValueError:
-        return value_str
+        pass
+    if _FLOAT_RE.fullmatch(value_str):
+        return float(value_str)
+    return value_str
 
 
 def parse_where_clause(where_str: str) -> dict:
@@ -107,3 +120,280 @@ def parse_multiple_conditions(conditions_str: str, parser_func) -> dict:
             result.update(parsed)
 
     return result
+
+
+# Ключевые слова хвоста select, за каждым следует неотрицательное целое
+_PAGING_KEYWORDS = ("LIMIT", "OFFSET", "PAGE")
+
+
+def parse_limit_clause(query: str) -> tuple[str, dict]:
+    """Отделяет от конца запроса LIMIT n, OFFSET m и PAGE n (в любом порядке).
+
+    Возвращает остаток запроса и словарь {"limit", "offset", "page"}
+    (limit и page — None, если не указаны; offset — 0).
+    """
+    tokens = query.split()
+    paging = {"limit": None, "offset": 0, "page": None}
+    seen = set()
+
+    while len(tokens) >= 2 and tokens[-2].upper() in _PAGING_KEYWORDS:
+        keyword = tokens[-2].upper()
+        if keyword in seen:
+            raise ValueError(f"{keyword} указан несколько раз")
+        try:
+            value = int(tokens[-1])
+        except ValueError:
+            raise ValueError(
+                f"После {keyword} ожидается целое число, получено '{tokens[-1]}'"
+            ) from None
+        if value < 0 or (keyword != "OFFSET" and value == 0):
+            raise ValueError(f"Недопустимое значение {keyword}: {value}")
+
+        paging[keyword.lower()] = value
+        seen.add(keyword)
+        tokens = tokens[:-2]
+
+    return " ".join(tokens), paging
+
+
+# Лексемы условия WHERE: строка в кавычках, оператор сравнения, скобки/запятая
+# и «слово» (имя колонки, число, ключевое слово или значение без кавычек)
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+        (?P<string>"[^"]*"|'[^']*')
+        |(?P<op><=|>=|!=|<>|=|<|>)
+        |(?P<punct>[(),])
+        |(?P<word>[^\s()<>=!,'"]+)
+    )""",
+    re.VERBOSE,
+)
+_KEYWORDS = {"AND", "OR", "NOT", "IN", "BETWEEN"}
+
+
+def _tokenize(s: str) -> list[tuple[str, str]]:
+    """Разбивает условие на лексемы (вид, текст)."""
+    tokens = []
+    pos = 0
+    s = s.rstrip()
+    while pos < len(s):
+        match = _TOKEN_RE.match(s, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Неожиданный символ в условии: '{s[pos:].strip()}'")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "word" and text.upper() in _KEYWORDS:
+            kind, text = "keyword", text.upper()
+        if kind == "op" and text == "<>":
+            text = "!="
+        tokens.append((kind, text))
+        pos = match.end()
+    return tokens
+
+
+class _ConditionParser:
+    """Рекурсивный спуск по лексемам условия WHERE.
+
+    Грамматика (в порядке убывания приоритета: NOT, AND, OR):
+        expr      := and_expr (OR and_expr)*
+        and_expr  := not_expr (AND not_expr)*
+        not_expr  := NOT not_expr | '(' expr ')' | predicate
+        predicate := column op value
+                   | column [NOT] IN '(' value (',' value)* ')'
+                   | column [NOT] BETWEEN value AND value
+    """
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _peek(self, kind=None, text=None) -> bool:
+        if self.pos >= len(self.tokens):
+            return False
+        tok_kind, tok_text = self.tokens[self.pos]
+        return (kind is None or tok_kind == kind) and (text is None or tok_text == text)
+
+    def _take(self, kind=None, text=None) -> str:
+        if not self._peek(kind, text):
+            found = self.tokens[self.pos][1] if self.pos < len(self.tokens) else "конец"
+            expected = text or kind
+            raise ValueError(f"Ожидалось '{expected}', найдено '{found}'")
+        self.pos += 1
+        return self.tokens[self.pos - 1][1]
+
+    def parse(self):
+        node = self._expr()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Лишний текст в условии: '{self.tokens[self.pos][1]}'")
+        return node
+
+    def _expr(self):
+        nodes = [self._and_expr()]
+        while self._peek("keyword", "OR"):
+            self.pos += 1
+            nodes.append(self._and_expr())
+        return nodes[0] if len(nodes) == 1 else ("or", tuple(nodes))
+
+    def _and_expr(self):
+        nodes = [self._not_expr()]
+        while self._peek("keyword", "AND"):
+            self.pos += 1
+            nodes.append(self._not_expr())
+        return nodes[0] if len(nodes) == 1 else ("and", tuple(nodes))
+
+    def _not_expr(self):
+        if self._peek("keyword", "NOT"):
+            self.pos += 1
+            return ("not", self._not_expr())
+        if self._peek("punct", "("):
+            self.pos += 1
+            node = self._expr()
+            self._take("punct", ")")
+            return node
+        return self._predicate()
+
+    def _predicate(self):
+        column = self._take("word")
+
+        negate = False
+        if self._peek("keyword", "NOT"):
+            self.pos += 1
+            negate = True
+
+        if self._peek("keyword", "IN"):
+            self.pos += 1
+            self._take("punct", "(")
+            values = [self._value()]
+            while self._peek("punct", ","):
+                self.pos += 1
+                values.append(self._value())
+            self._take("punct", ")")
+            node = ("in", column, tuple(values))
+        elif self._peek("keyword", "BETWEEN"):
+            self.pos += 1
+            low = self._value()
+            self._take("keyword", "AND")
+            node = ("between", column, low, self._value())
+        elif negate:
+            raise ValueError("После NOT ожидается IN или BETWEEN")
+        else:
+            op = self._take("op")
+            node = ("cmp", op, column, self._value())
+
+        return ("not", node) if negate else node
+
+    def _value(self):
+        """Значение: строка в кавычках или несколько слов подряд
+        (как в 'name = Alice Smith'), приводимые через _parse_value.
+        """
+        if self._peek("string"):
+            return _parse_value(self._take("string"))
+        words = []
+        while self._peek("word"):
+            words.append(self._take("word"))
+        if not words:
+            raise ValueError("Ожидалось значение")
+        return _parse_value(" ".join(words))
+
+
+def parse_condition(where_str: str):
+    """Разбирает условие WHERE в дерево (кортежи, пригодные как ключ кэша).
+
+    Узлы: ("cmp", op, column, value), ("in", column, values),
+    ("between", column, low, high), ("not", node), ("and", nodes), ("or", nodes).
+    Пустое условие — None.
+    """
+    if not where_str or not where_str.strip():
+        return None
+    return _ConditionParser(_tokenize(where_str)).parse()
+
+
+_AGGREGATE_RE = re.compile(
+    r"\s*(COUNT|SUM|MIN|MAX|AVG)\s*\(\s*(\*|[^\s(),]+)\s*\)\s*(,)?", re.IGNORECASE
+)
+_GROUP_BY_RE = re.compile(r"\bGROUP\s+BY\s+(.+)$", re.IGNORECASE | re.DOTALL)
+
+
+def parse_aggregate_clause(query: str) -> tuple[str, list, list]:
+    """Выделяет из запроса select агрегаты в начале и GROUP BY в конце.
+
+    Пример: "COUNT(*), AVG(age) WHERE active = true GROUP BY city".
+    Возвращает (остаток запроса, [(функция, колонка или '*')], [колонки]).
+    """
+    aggregates = []
+    pos = 0
+    while True:
+        match = _AGGREGATE_RE.match(query, pos)
+        if not match:
+            break
+        aggregates.append((match.group(1).upper(), match.group(2)))
+        pos = match.end()
+        if not match.group(3):
+            break
+
+    rest = query[pos:].strip()
+    group_by = []
+    match = _GROUP_BY_RE.search(rest)
+    if match:
+        group_by = [c.strip() for c in match.group(1).split(",")]
+        if not all(group_by) or any(" " in c for c in group_by):
+            raise ValueError("GROUP BY: ожидается список колонок через запятую")
+        rest = rest[: match.start()].strip()
+
+    if group_by and not aggregates:
+        raise ValueError("GROUP BY используется только с агрегатными функциями")
+    return rest, aggregates, group_by
+
+
+_ORDER_BY_RE = re.compile(r"\bORDER\s+BY\s+(.+)$", re.IGNORECASE | re.DOTALL)
+
+
+def parse_order_clause(query: str) -> tuple[str, list]:
+    """Выделяет ORDER BY из конца запроса select (перед LIMIT/OFFSET/PAGE).
+
+    Пример: "WHERE age > 18 ORDER BY city, age DESC".
+    Возвращает (остаток запроса, [(колонка, по убыванию?)]); колонкой может
+    быть и агрегат, например COUNT(*).
+    """
+    match = _ORDER_BY_RE.search(query)
+    if not match:
+        return query, []
+
+    order_by = []
+    for item in match.group(1).split(","):
+        words = item.split()
+        desc = False
+        if len(words) == 2 and words[1].upper() in ("ASC", "DESC"):
+            desc = words[1].upper() == "DESC"
+            words = words[:1]
+        if len(words) != 1:
+            raise ValueError(
+                "ORDER BY: ожидается список 'колонка [ASC|DESC]' через запятую"
+            )
+        column = words[0]
+        aggregate = _AGGREGATE_RE.fullmatch(column)
+        if aggregate:
+            column = f"{aggregate.group(1).upper()}({aggregate.group(2)})"
+        order_by.append((column, desc))
+
+    return query[: match.start()].strip(), order_by
+
+
+_JOIN_RE = re.compile(
+    r"^JOIN\s+(\S+)\s+ON\s+([^\s=]+)\s*=\s*([^\s=]+)\s*", re.IGNORECASE
+)
+
+
+def parse_join_clause(query: str) -> tuple[str, dict | None]:
+    """Выделяет JOIN из начала запроса select.
+
+    Пример: "JOIN orders ON users.ID = orders.user_id WHERE ...".
+    Возвращает (остаток запроса, {"table": ..., "on": (колонка, колонка)})
+    или (запрос, None), если соединения нет.
+    """
+    if not query.upper().startswith("JOIN"):
+        return query, None
+    match = _JOIN_RE.match(query)
+    if not match:
+        raise ValueError("JOIN: ожидается 'JOIN <table> ON <col> = <col>'")
+    join = {"table": match.group(1), "on": (match.group(2), match.group(3))}
+    return query[match.end():].strip(), join
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+"""Планировщик запросов: выбор способа чтения строк таблицы по стоимости.
+
+Для условия WHERE рассматриваются поиск по ID, поиск по индексам, перебор
+с пропуском блоков по зонным картам и полный перебор. Число строк, которые
+прочитает каждый способ, оценивается по статистике таблицы (её собирает
+команда analyze) или, без неё, по долям PLAN_DEFAULT_*_SELECTIVITY;
+стоимость строки зависит от того, читается ли таблица с диска или из
+буферного пула (см. PLAN_COST_* в constants.py). Выбирается самый дешёвый
+способ.
+
+Команда explain включает сбор планов (start_explain): каждый построенный
+план запоминается и считает строки, полученные выбранным способом.
+"""
+
+import math
+import time
+
+from src.primitive_db.constants import (
+    ID_COLUMN,
+    INDEXES_KEY,
+    PLAN_COST_DISK_ROW,
+    PLAN_COST_FETCH_ROW,
+    PLAN_COST_MEMORY_ROW,
+    PLAN_DEFAULT_EQ_SELECTIVITY,
+    PLAN_DEFAULT_RANGE_SELECTIVITY,
+    PLAN_LOAD_DISCOUNT,
+    STATS_KEY,
+)
+from src.primitive_db.predicate import condition_columns, indexed_part
+from src.primitive_db.storage import get_storage
+from src.primitive_db.utils import count_table_rows, table_cold
+
+# Способы доступа в порядке предпочтения при равной стоимости
+ACCESS_TITLES = {
+    "pk": "поиск по ID",
+    "index": "индекс",
+    "zones": "перебор по зонным картам",
+    "scan": "полный перебор",
+}
+
+# Планы, построенные во время explain (None — explain не выполняется)
+_EXPLAIN = {"plans": None}
+
+def _is_number(value) -> bool:
+    """Число (не bool), по которому можно интерполировать диапазон."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def collect_stats(rows) -> dict:
+    """Статистика таблицы для планировщика: {"rows": число строк,
+    "columns": {колонка: {"distinct", "nulls", "min", "max"}}}.
+
+    Пустым считается и отсутствующее значение; границы min/max собираются
+    только для числовых значений (иначе None).
+    """
+    count = 0
+    present = {}
+    distinct = {}
+    for row in rows:
+        count += 1
+        for column, value in row.items():
+            if value is None:
+                continue
+            present[column] = present.get(column, 0) + 1
+            try:
+                distinct.setdefault(column, set()).add(value)
+            except TypeError:
+                pass
+
+    columns = {}
+    for column, filled in present.items():
+        values = distinct.get(column, ())
+        numbers = [value for value in values if _is_number(value)]
+        columns[column] = {
+            "distinct": len(values),
+            "nulls": count - filled,
+            "min": min(numbers) if numbers else None,
+            "max": max(numbers) if numbers else None,
+        }
+    return {"rows": count, "columns": columns}
+
+
+def _fraction_below(stats: dict, value) -> float | None:
+    """Доля значений колонки меньше value по границам min/max
+    (равномерное распределение) или None, если границ нет.
+    """
+    low, high = stats.get("min"), stats.get("max")
+    if low is None or high is None or not _is_number(value):
+        return None
+    if high <= low:
+        return 0.0 if value <= low else 1.0
+    return min(1.0, max(0.0, (value - low) / (high - low)))
+
+
+def _selectivity(node, stats: dict | None, rows: int) -> float:
+    """Доля строк таблицы, удовлетворяющих узлу условия."""
+    kind = node[0]
+    if kind == "and":
+        return math.prod(_selectivity(child, stats, rows) for child in node[1])
+    if kind == "or":
+        return 1.0 - math.prod(
+            1.0 - _selectivity(child, stats, rows) for child in node[1]
+        )
+    if kind == "not":
+        return 1.0 - _selectivity(node[1], stats, rows)
+
+    column = node[2] if kind == "cmp" else node[1]
+    if column == ID_COLUMN:
+        equal = 1.0 / rows if rows else 0.0
+    else:
+        equal = PLAN_DEFAULT_EQ_SELECTIVITY
+    column_stats = (stats or {}).get("columns", {}).get(column)
+    filled = 1.0
+    if column_stats is not None and stats["rows"]:
+        filled = 1.0 - column_stats["nulls"] / stats["rows"]
+        if column != ID_COLUMN:
+            distinct = column_stats["distinct"]
+            equal = filled / distinct if distinct else 0.0
+
+    if kind == "in":
+        return min(1.0, len(node[2]) * equal)
+    if kind == "cmp" and node[1] == "=":
+        return equal
+    if kind == "cmp" and node[1] == "!=":
+        return max(0.0, filled - equal)
+
+    if column_stats is None:
+        return PLAN_DEFAULT_RANGE_SELECTIVITY
+    if kind == "between":
+        low = _fraction_below(column_stats, node[2])
+        high = _fraction_below(column_stats, node[3])
+        if low is None or high is None:
+            return PLAN_DEFAULT_RANGE_SELECTIVITY
+        return filled * max(0.0, high - low)
+    below = _fraction_below(column_stats, node[3])
+    if below is None:
+        return PLAN_DEFAULT_RANGE_SELECTIVITY
+    return filled * (below if node[1] in ("<", "<=") else 1.0 - below)
+
+
+def estimate_rows(condition, stats: dict | None, rows: int) -> int:
+    """Оценка числа строк из rows, удовлетворяющих условию."""
+    if condition is None:
+        return rows
+    share = _selectivity(condition, stats, rows)
+    return max(1, round(share * rows)) if share > 0 and rows else 0
+
+
+class Plan:
+    """План чтения строк одной таблицы: варианты доступа с оценками
+    и выбранный из них, а под explain — фактические счётчики.
+    """
+
+    def __init__(self, table_name: str, condition, rows: int, cold: bool, stats):
+        self.table_name = table_name
+        self.condition = condition
+        self.rows = rows
+        self.cold = cold
+        self.has_stats = stats is not None
+        self.estimated = estimate_rows(condition, stats, rows)
+        # Варианты: (способ, строк прочитать, стоимость, пояснение)
+        self.options = []
+        self._parts = {}
+        self.access = "scan"
+        self.index_condition = None
+        self.source = None
+        self.read = 0
+        self.planning = 0.0
+
+    def add(self, access: str, rows: int, cost: float, note="", part=None) -> None:
+        """Добавляет вариант доступа (part — часть условия для индексов)."""
+        self.options.append((access, rows, cost, note))
+        self._parts[access] = part
+
+    def choose(self) -> None:
+        """Выбирает самый дешёвый вариант (при равенстве — более ранний)."""
+        access = min(self.options, key=lambda option: option[2])[0]
+        self.access = access
+        self.index_condition = self._parts[access]
+
+    def trace(self, rows):
+        """Возвращает rows; под explain — со счётчиком полученных строк."""
+        if _EXPLAIN["plans"] is None:
+            return rows
+        if isinstance(rows, list):
+            self.read += len(rows)
+            return rows
+        return self._counted(rows)
+
+    def _counted(self, rows):
+        for row in rows:
+            self.read += 1
+            yield row
+
+
+def plan_scan(metadata: dict, table_name: str, condition, lazy: bool = False) -> Plan:
+    """Строит план чтения строк таблицы для условия (дерево WHERE).
+
+    lazy — строки читаются потоково и таблица не загружается в пул, иначе
+    стоимость полного перебора с диска уменьшается на PLAN_LOAD_DISCOUNT:
+    загруженная таблица ускорит следующие запросы.
+    """
+    started = time.perf_counter()
+    table = metadata["tables"][table_name]
+    indexes = table.get(INDEXES_KEY, {})
+    cold = table_cold(table_name)
+    stats = table.get(STATS_KEY)
+    by_id = indexed_part(condition, {})
+    by_index = indexed_part(condition, indexes)
+    zones = None
+    if cold and condition is not None:
+        zones = get_storage(table_name).zone_estimate(table_name, condition)
+        if zones is not None and not zones["skipped"]:
+            zones = None
+
+    # Подсчёт строк таблицы на диске может стоить прохода по файлу: если
+    # выбирать не из чего, число строк нужно только для explain
+    if cold and by_id is None and by_index is None and zones is None and not (
+        explaining()
+    ):
+        rows = stats["rows"] if stats else 0
+    else:
+        rows = count_table_rows(table_name)
+    plan = Plan(table_name, condition, rows, cold, stats)
+    fetch_cost = PLAN_COST_FETCH_ROW if cold else PLAN_COST_MEMORY_ROW
+
+    if by_id is not None:
+        found = estimate_rows(by_id, stats, rows)
+        plan.add("pk", found, found * fetch_cost, part=by_id)
+
+    if by_index is not None and by_index != by_id:
+        found = estimate_rows(by_index, stats, rows)
+        columns = ", ".join(sorted(condition_columns(by_index) & set(indexes)))
+        plan.add("index", found, found * fetch_cost, columns, by_index)
+
+    if zones is not None:
+        plan.add(
+            "zones",
+            zones["rows"],
+            zones["rows"] * PLAN_COST_DISK_ROW,
+            f"пропуск {zones['skipped']} из {zones['zones']} зон",
+        )
+
+    if not cold:
+        cost = rows * PLAN_COST_MEMORY_ROW
+    elif lazy:
+        cost = rows * PLAN_COST_DISK_ROW
+    else:
+        cost = rows * PLAN_COST_DISK_ROW * PLAN_LOAD_DISCOUNT
+    plan.add("scan", rows, cost)
+    plan.choose()
+
+    plan.planning = time.perf_counter() - started
+    if _EXPLAIN["plans"] is not None:
+        _EXPLAIN["plans"].append(plan)
+    return plan
+
+
+def start_explain() -> None:
+    """Начинает сбор планов для explain."""
+    _EXPLAIN["plans"] = []
+
+
+def stop_explain() -> list[Plan]:
+    """Заканчивает сбор планов; возвращает построенные планы."""
+    plans = _EXPLAIN["plans"] or []
+    _EXPLAIN["plans"] = None
+    return plans
+
+
+def explaining() -> bool:
+    """Выполняется ли запрос под explain."""
+    return _EXPLAIN["plans"] is not None
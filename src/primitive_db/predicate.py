@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+"""Компиляция условий WHERE в функции-предикаты и выбор строк по индексам.
+
+Дерево условия строит parser.parse_condition; здесь оно один раз на запрос
+превращается во вложенные замыкания, которые затем вызываются для каждой
+строки без повторного разбора условия.
+"""
+
+import operator
+
+from src.primitive_db.constants import ID_COLUMN
+from src.primitive_db.index import SortedIndex
+
+_COMPARATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# Границы диапазона для операторов сравнения:
+# (нижняя?, включительно?) — см. SortedIndex.range
+_RANGE_BOUNDS = {
+    "<": (False, False),
+    "<=": (False, True),
+    ">": (True, False),
+    ">=": (True, True),
+}
+
+_MISSING = object()
+
+
+def condition_from_dict(where_clause: dict | None):
+    """Переводит условие старого вида {колонка: значение} в дерево (AND равенств)."""
+    if not where_clause:
+        return None
+    nodes = tuple(
+        ("cmp", "=", column, value) for column, value in where_clause.items()
+    )
+    return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+
+def _leaf_column(node) -> str:
+    """Колонка листового узла (сравнение, IN или BETWEEN)."""
+    return node[2] if node[0] == "cmp" else node[1]
+
+
+def condition_columns(condition) -> set:
+    """Возвращает множество колонок, упомянутых в условии."""
+    if condition is None:
+        return set()
+    kind = condition[0]
+    if kind in ("and", "or"):
+        return set().union(*(condition_columns(child) for child in condition[1]))
+    if kind == "not":
+        return condition_columns(condition[1])
+    return {_leaf_column(condition)}
+
+
+def rename_columns(condition, rename):
+    """Возвращает условие, в котором каждая колонка заменена на rename(колонка)."""
+    if condition is None:
+        return None
+    kind = condition[0]
+    if kind in ("and", "or"):
+        return (kind, tuple(rename_columns(child, rename) for child in condition[1]))
+    if kind == "not":
+        return ("not", rename_columns(condition[1], rename))
+    if kind == "cmp":
+        return ("cmp", condition[1], rename(condition[2]), condition[3])
+    return (kind, rename(condition[1])) + condition[2:]
+
+
+def split_conjuncts(condition) -> list:
+    """Разбивает условие на части верхнего уровня, соединённые AND."""
+    if condition is None:
+        return []
+    if condition[0] == "and":
+        return list(condition[1])
+    return [condition]
+
+
+def join_conjuncts(parts: list):
+    """Собирает условие из частей, соединённых AND (None для пустого списка)."""
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ("and", tuple(parts))
+
+
+def _compile_cmp(op: str, column: str, value):
+    """Сравнение колонки со значением; нет колонки или несравнимые типы — False."""
+    if op == "=":
+        def check(row):
+            return row.get(column, _MISSING) == value
+        return check
+
+    compare = _COMPARATORS[op]
+
+    def check(row):
+        try:
+            return compare(row[column], value)
+        except (KeyError, TypeError):
+            return False
+    return check
+
+
+def _compile_in(column: str, values: tuple):
+    """Проверка вхождения значения колонки в список."""
+    try:
+        values = frozenset(values)
+    except TypeError:
+        pass
+
+    def check(row):
+        return row.get(column, _MISSING) in values
+    return check
+
+
+def _compile_between(column: str, low, high):
+    """Проверка low <= значение <= high."""
+    def check(row):
+        try:
+            return low <= row[column] <= high
+        except (KeyError, TypeError):
+            return False
+    return check
+
+
+def _compile_all(checks: tuple):
+    """AND: все проверки истинны (вычисление прекращается на первой ложной)."""
+    def check(row):
+        for part in checks:
+            if not part(row):
+                return False
+        return True
+    return check
+
+
+def _compile_any(checks: tuple):
+    """OR: хотя бы одна проверка истинна."""
+    def check(row):
+        for part in checks:
+            if part(row):
+                return True
+        return False
+    return check
+
+
+def _compile(node):
+    """Рекурсивно компилирует узел дерева условия."""
+    kind = node[0]
+    if kind == "cmp":
+        return _compile_cmp(node[1], node[2], node[3])
+    if kind == "in":
+        return _compile_in(node[1], node[2])
+    if kind == "between":
+        return _compile_between(node[1], node[2], node[3])
+    if kind == "not":
+        inner = _compile(node[1])
+        return lambda row: not inner(row)
+    if kind == "and":
+        return _compile_all(tuple(_compile(child) for child in node[1]))
+    if kind == "or":
+        return _compile_any(tuple(_compile(child) for child in node[1]))
+    raise ValueError(f"Неизвестный узел условия: {kind!r}")
+
+
+def compile_predicate(condition):
+    """Компилирует дерево условия в функцию row -> bool; None для пустого условия."""
+    if condition is None:
+        return None
+    return _compile(condition)
+
+
+def plan_ids(condition, indexes: dict, load_index):
+    """Возвращает множество ID строк-кандидатов по индексам или None,
+    если условие нельзя сузить индексами (нужен полный перебор).
+
+    indexes — {колонка: тип индекса} из метаданных, load_index(column) —
+    актуальный индекс колонки. Равенство и IN используют любой индекс,
+    сравнения и BETWEEN — только сортированный. Колонка ID проиндексирована
+    всегда: её значение и есть ключ строки. Кандидаты — надмножество
+    результата: условие всё равно проверяется предикатом.
+    """
+    if condition is None:
+        return None
+
+    kind = condition[0]
+
+    if kind == "cmp":
+        _, op, column, value = condition
+        if op == "=":
+            return _lookup(column, (value,), indexes, load_index)
+        if op in _RANGE_BOUNDS and indexes.get(column) == SortedIndex.kind:
+            is_low, inclusive = _RANGE_BOUNDS[op]
+            index = load_index(column)
+            if is_low:
+                return index.range(low=value, include_low=inclusive)
+            return index.range(high=value, include_high=inclusive)
+        return None
+
+    if kind == "in":
+        return _lookup(condition[1], condition[2], indexes, load_index)
+
+    if kind == "between":
+        _, column, low, high = condition
+        if indexes.get(column) != SortedIndex.kind:
+            return None
+        return load_index(column).range(low, high)
+
+    if kind == "and":
+        ids = None
+        for child in condition[1]:
+            found = plan_ids(child, indexes, load_index)
+            if found is None:
+                continue
+            ids = found if ids is None else ids & found
+            if not ids:
+                break
+        return ids
+
+    if kind == "or":
+        ids = set()
+        for child in condition[1]:
+            found = plan_ids(child, indexes, load_index)
+            if found is None:
+                return None
+            ids |= found
+        return ids
+
+    return None
+
+
+def indexed_part(condition, indexes: dict):
+    """Возвращает часть условия, которую plan_ids сужает индексами, или None.
+
+    Правила те же, что у plan_ids: у AND остаются части с индексами, OR
+    сужается, только если сужается каждая его ветвь. С indexes={} остаётся
+    только поиск по ID (равенство и IN по колонке ID).
+    """
+    if condition is None:
+        return None
+
+    kind = condition[0]
+
+    if kind == "cmp":
+        _, op, column, _ = condition
+        if op == "=" and (column == ID_COLUMN or column in indexes):
+            return condition
+        if op in _RANGE_BOUNDS and indexes.get(column) == SortedIndex.kind:
+            return condition
+        return None
+
+    if kind == "in":
+        column = condition[1]
+        return condition if column == ID_COLUMN or column in indexes else None
+
+    if kind == "between":
+        return condition if indexes.get(condition[1]) == SortedIndex.kind else None
+
+    if kind == "and":
+        parts = [indexed_part(child, indexes) for child in condition[1]]
+        return join_conjuncts([part for part in parts if part is not None])
+
+    if kind == "or":
+        parts = [indexed_part(child, indexes) for child in condition[1]]
+        if any(part is None for part in parts):
+            return None
+        return ("or", tuple(parts))
+
+    return None
+
+
+def _lookup(column: str, values, indexes: dict, load_index):
+    """ID строк, у которых колонка равна одному из значений."""
+    if column == ID_COLUMN:
+        return set(values)
+    if column not in indexes:
+        return None
+    index = load_index(column)
+    ids = set()
+    for value in values:
+        ids |= index.lookup(value)
+    return ids
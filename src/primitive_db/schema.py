@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+
+"""Типизированная схема таблицы: приведение и проверка значений колонок.
+
+Схема разбирается из метаданных один раз (колонки в метаданных могут быть
+записаны в старых форматах) и кэшируется до изменения списка колонок.
+Для каждой колонки заранее выбирается функция приведения, а для строки
+целиком генерируется одна функция (см. _compile_row_caster), поэтому при
+вставке и обновлении тип не ищется заново для каждого значения.
+
+Типы колонок: int, float, str, bool, date (хранится как 'ГГГГ-ММ-ДД'),
+timestamp (хранится как 'ГГГГ-ММ-ДД ЧЧ:ММ:СС[.ffffff]'). Даты хранятся
+строками ISO: они сериализуются в JSON без преобразований, а порядок строк
+совпадает с порядком дат, поэтому сравнения в WHERE, индексы и зонные карты
+работают с ними как с обычными строками. Тип с суффиксом NULLABLE_SUFFIX
+(например, int?) допускает пустое значение: None или литерал NULL_LITERAL
+(а у нестроковых типов — и пустую строку, как в CSV).
+"""
+
+import copy
+import math
+from datetime import date, datetime
+
+from src.primitive_db.constants import (
+    ALLOWED_TYPES,
+    ID_COLUMN,
+    NULL_LITERAL,
+    NULLABLE_SUFFIX,
+)
+
+
+def _to_int(v):
+    """Приводит значение к int (строка, целое или float без дробной части)."""
+    if type(v) is int:
+        return v
+    if isinstance(v, str):
+        return int(v)
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    raise ValueError(f"Нельзя привести к int: {v!r}")
+
+
+def _to_float(v):
+    """Приводит значение к конечному float (строка или число)."""
+    if isinstance(v, bool) or not isinstance(v, (int, float, str)):
+        raise ValueError(f"Нельзя привести к float: {v!r}")
+    number = float(v)
+    if not math.isfinite(number):
+        raise ValueError(f"Недопустимое значение float: {v!r}")
+    return number
+
+
+def _to_str(v):
+    """Приводит значение к str (пустое значение не допускается)."""
+    if isinstance(v, str):
+        return v
+    if v is None:
+        raise ValueError("Пустое значение не допускается.")
+    return str(v)
+
+
+def _to_bool(v):
+    """Приводит значение к bool (строка/число/булево)."""
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, int):
+        return v != 0
+    if isinstance(v, str):
+        s = v.strip().lower()
+        if s in ("true", "t", "yes", "y", "1"):
+            return True
+        if s in ("false", "f", "no", "n", "0"):
+            return False
+    raise ValueError(f"Нельзя привести к bool: {v!r}")
+
+
+def _to_date(v):
+    """Приводит дату ('ГГГГ-ММ-ДД' или date) к строке ISO."""
+    if isinstance(v, datetime):
+        return v.date().isoformat()
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, str):
+        try:
+            return date.fromisoformat(v.strip()).isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f"Нельзя привести к date (ГГГГ-ММ-ДД): {v!r}")
+
+
+def _to_timestamp(v):
+    """Приводит момент времени ('ГГГГ-ММ-ДД[ ЧЧ:ММ[:СС[.ffffff]]]', datetime
+    или date) к строке ISO с пробелом между датой и временем.
+
+    Часовые пояса не поддерживаются: иначе порядок строк не совпадал бы
+    с порядком моментов времени.
+    """
+    if isinstance(v, str):
+        try:
+            v = datetime.fromisoformat(v.strip())
+        except ValueError:
+            raise ValueError(
+                f"Нельзя привести к timestamp (ГГГГ-ММ-ДД ЧЧ:ММ:СС): {v!r}"
+            ) from None
+    elif isinstance(v, date) and not isinstance(v, datetime):
+        v = datetime(v.year, v.month, v.day)
+    if not isinstance(v, datetime):
+        raise ValueError(f"Нельзя привести к timestamp: {v!r}")
+    if v.tzinfo is not None:
+        raise ValueError(f"Часовой пояс в timestamp не поддерживается: {v!r}")
+    return v.isoformat(sep=" ")
+
+
+# Маппинг имён типов на функции приведения значения
+TYPE_CASTERS = {
+    "int": _to_int,
+    "float": _to_float,
+    "str": _to_str,
+    "bool": _to_bool,
+    "date": _to_date,
+    "timestamp": _to_timestamp,
+}
+
+
+def split_type(col_type: str) -> tuple[str, bool]:
+    """Разбирает тип колонки на (базовый тип, допускает ли пустое значение)."""
+    if col_type.endswith(NULLABLE_SUFFIX):
+        return col_type[: -len(NULLABLE_SUFFIX)], True
+    return col_type, False
+
+
+def is_valid_type(col_type: str) -> bool:
+    """Является ли строка допустимым типом колонки (с суффиксом или без)."""
+    return split_type(col_type)[0] in ALLOWED_TYPES
+
+
+def _nullable(cast, base: str):
+    """Функция приведения, пропускающая пустые значения как None."""
+    blank = ("",) if base != "str" else ()
+
+    def cast_or_null(value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            text = value.strip()
+            if text.lower() == NULL_LITERAL or text in blank:
+                return None
+        return cast(value)
+    return cast_or_null
+
+
+def _caster(col_type: str):
+    """Функция приведения значения для типа колонки (None — тип неизвестен)."""
+    if not isinstance(col_type, str):
+        return None
+    base, nullable = split_type(col_type)
+    cast = TYPE_CASTERS.get(base)
+    if cast is None or not nullable:
+        return cast
+    return _nullable(cast, base)
+
+
+def parse_columns(raw_cols: list) -> list[dict]:
+    """Приводит описания колонок из метаданных к виду {"name", "type"}:
+    поддерживаются словари, пары (имя, тип) и строки 'имя:тип'.
+    """
+    cols = []
+    for c in raw_cols:
+        if isinstance(c, dict):
+            name = c.get("name")
+            typ = c.get("type")
+        elif isinstance(c, (tuple, list)) and len(c) == 2:
+            name, typ = c[0], c[1]
+        elif isinstance(c, str) and ":" in c:
+            name, typ = c.split(":", 1)
+            name = name.strip()
+            typ = typ.strip()
+        else:
+            continue
+
+        cols.append({"name": name, "type": typ})
+    return cols
+
+
+# Значения bool, приводимые без вызова функции (частый случай при импорте)
+_BOOL_WORDS = {
+    **dict.fromkeys(("true", "t", "yes", "y", "1"), True),
+    **dict.fromkeys(("false", "f", "no", "n", "0"), False),
+}
+
+# Выражения приведения значения v функцией c с быстрой проверкой частого
+# случая; для остальных типов — просто вызов c(v)
+_FAST_CASTS = {
+    "str": "{v} if {v}.__class__ is str else {c}({v})",
+    "int": "int({v}) if {v}.__class__ is str else {c}({v})",
+    "bool": "_BOOL_WORDS[{v}] if {v}.__class__ is str and {v} in _BOOL_WORDS "
+            "else {c}({v})",
+}
+
+
+def _compile_row_caster(types: list, casters: list):
+    """Генерирует функцию приведения значений строки (как namedtuple):
+    значения распаковываются в переменные и приводятся одним выражением
+    без цикла по колонкам. Неверное число значений или неприводимое
+    значение дают TypeError/ValueError.
+    """
+    names = [f"v{i}" for i in range(len(casters))]
+    parts = []
+    for i, (col_type, name) in enumerate(zip(types, names)):
+        template = _FAST_CASTS.get(col_type, "{c}({v})")
+        parts.append("(" + template.format(v=name, c=f"c{i}") + ")")
+    source = (
+        "def cast_row(values):\n"
+        f"    [{', '.join(names)}] = values\n"
+        f"    return [{', '.join(parts)}]\n"
+    )
+    namespace = {f"c{i}": cast for i, cast in enumerate(casters)}
+    namespace["_BOOL_WORDS"] = _BOOL_WORDS
+    exec(source, namespace)
+    return namespace["cast_row"]
+
+
+class TableSchema:
+    """Разобранная схема таблицы с функциями приведения колонок."""
+
+    def __init__(self, raw_cols: list):
+        # Список колонок из метаданных и его копия — для проверки актуальности
+        self.raw = raw_cols
+        self.source = copy.deepcopy(raw_cols)
+        self.columns = parse_columns(raw_cols)
+        self.types = {col["name"]: col["type"] for col in self.columns}
+        # Колонки данных (без ID) в порядке значений insert
+        self.names = [col["name"] for col in self.columns[1:]]
+        self._casters = {}
+        self._error = None
+        if not self.columns or self.columns[0]["name"] != ID_COLUMN:
+            self._error = f"Первая колонка должна быть {ID_COLUMN}:int"
+        for col in self.columns[1:]:
+            cast = _caster(col["type"])
+            if cast is None and self._error is None:
+                self._error = (
+                    f"Неподдерживаемый тип '{col['type']}' "
+                    f"для колонки '{col['name']}'."
+                )
+            self._casters[col["name"]] = cast
+        self._cast_row = None
+        if self._error is None:
+            self._cast_row = _compile_row_caster(
+                [self.types[name] for name in self.names],
+                [self._casters[name] for name in self.names],
+            )
+
+    def _check(self) -> None:
+        """Ошибка, если схема не позволяет приводить значения."""
+        if self._error is not None:
+            raise ValueError(self._error)
+
+    def _row_error(self, values) -> str:
+        """Описание ошибки приведения строки (ищется только после сбоя)."""
+        if len(values) != len(self.names):
+            return f"Ожидалось {len(self.names)} значений, получено {len(values)}."
+        for name, value in zip(self.names, values):
+            try:
+                self.cast_value(name, value)
+            except ValueError as e:
+                return str(e)
+        return f"Неверные значения: {values!r}"
+
+    def cast_values(self, values) -> list:
+        """Приводит значения строки (без ID, в порядке колонок) к типам схемы."""
+        self._check()
+        try:
+            return self._cast_row(values)
+        except (TypeError, ValueError):
+            raise ValueError(self._row_error(values)) from None
+
+    def cast_rows(self, rows) -> list[list]:
+        """Приводит значения многих строк; в ошибке указывается номер строки."""
+        self._check()
+        cast_row = self._cast_row
+        result = []
+        append = result.append
+        for number, values in enumerate(rows, start=1):
+            try:
+                append(cast_row(values))
+            except (TypeError, ValueError):
+                raise ValueError(
+                    f"Строка {number}: {self._row_error(values)}"
+                ) from None
+        return result
+
+    def cast_value(self, column: str, value):
+        """Приводит значение одной колонки; ошибка называет колонку."""
+        self._check()
+        if column == ID_COLUMN:
+            raise ValueError(f"Колонку {ID_COLUMN} изменять нельзя.")
+        if column not in self._casters:
+            raise ValueError(f"Нет колонки '{column}'.")
+        try:
+            return self._casters[column](value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(
+                f"Колонка '{column}' ({self.types[column]}): {e}"
+            ) from None
+
+    def cast_set(self, set_clause: dict) -> dict:
+        """Приводит значения SET к типам колонок."""
+        return {
+            column: self.cast_value(column, value)
+            for column, value in set_clause.items()
+        }
+
+
+# Разобранные схемы: таблица -> TableSchema
+_SCHEMAS = {}
+
+
+def table_schema(metadata: dict, table_name: str) -> TableSchema:
+    """Возвращает схему таблицы, разбирая её заново, только если список
+    колонок в метаданных изменился.
+    """
+    tables = metadata.get("tables", {})
+    if table_name not in tables:
+        raise ValueError(f"Таблица '{table_name}' не существует.")
+    raw_cols = tables[table_name].get("columns", [])
+    schema = _SCHEMAS.get(table_name)
+    if schema is None or (schema.raw is not raw_cols and schema.source != raw_cols):
+        schema = TableSchema(raw_cols)
+        _SCHEMAS[table_name] = schema
+    else:
+        schema.raw = raw_cols
+    return schema
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""Режим сервера: database serve.
+
+Сервер asyncio держит таблицы, индексы и кэш select в памяти одного процесса
+и принимает команды того же языка, что и интерактивный режим, через сокет
+Unix или TCP на localhost. Протокол — строки JSON в обе стороны:
+
+    запрос:  {"id": 1, "command": "select users WHERE ID = 5", "rows": true}
+    ответ:   {"id": 1, "output": "...", "rows": [{"ID": 5, ...}]}
+
+"output" — текст, который команда напечатала бы в консоли; при "rows": true
+строки select возвращаются списком словарей, без отрисовки таблицы. Ошибка
+самого запроса (неверный JSON, пустая команда) — ответ {"id": ..., "error":
+"..."}. Клиент может отправлять запросы, не дожидаясь ответов (конвейер):
+ответы приходят в порядке запросов.
+
+Команды выполняются по одной. Соединение, начавшее транзакцию (begin),
+обслуживается монопольно до commit или rollback; при разрыве соединения
+транзакция откатывается.
+"""
+
+import asyncio
+import json
+import os
+import shlex
+import signal
+import socket
+
+from src.decorators import set_auto_confirm, set_log_time_enabled
+from src.primitive_db.constants import (
+    BUFFER_CHECKPOINT_EVERY,
+    SERVER_HOST,
+    SERVER_SOCKET_PATH,
+)
+from src.primitive_db.engine import (
+    _checkpoint,
+    _finish,
+    _recover,
+    execute_captured,
+)
+from src.primitive_db.utils import in_transaction, rollback_transaction
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def _remove_stale_socket(path: str) -> None:
+    """Удаляет файл сокета, оставшийся от завершившегося сервера.
+
+    Если по сокету отвечает работающий сервер, выбрасывает ValueError.
+    """
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise ValueError(f"Сокет '{path}' уже обслуживается другим сервером.")
+
+
+class _Server:
+    """Состояние сервера: очередь выполнения и счётчик команд."""
+
+    def __init__(self):
+        # Захвачена на время команды, а соединением с открытой
+        # транзакцией — до её завершения
+        self._gate = asyncio.Lock()
+        self._commands = 0
+
+    def _handle_request(self, line: bytes) -> tuple[bool, dict]:
+        """Выполняет один запрос; возвращает (продолжать?, ответ)."""
+        request = {}
+        try:
+            request = json.loads(line)
+            parts = shlex.split(request["command"])
+        except (ValueError, KeyError, TypeError) as e:
+            request_id = request.get("id") if isinstance(request, dict) else None
+            return True, {"id": request_id, "error": f"Неверный запрос: {e}"}
+
+        response = {"id": request.get("id")}
+        if not parts:
+            response["error"] = "Пустая команда."
+            return True, response
+
+        try:
+            keep_going, output, rows = execute_captured(
+                parts, bool(request.get("rows"))
+            )
+        except Exception as e:
+            # Сбой одной команды не должен останавливать сервер
+            response["error"] = f"Неожиданная ошибка: {e}"
+            return True, response
+        response["output"] = output
+        if rows is not None:
+            response["rows"] = rows
+
+        self._commands += 1
+        if self._commands >= BUFFER_CHECKPOINT_EVERY:
+            _checkpoint()
+            self._commands = 0
+        return keep_going, response
+
+    async def handle_connection(self, reader, writer) -> None:
+        """Обслуживает одно соединение: запросы выполняются по порядку."""
+        owns_transaction = False
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+
+                if not owns_transaction:
+                    await self._gate.acquire()
+                try:
+                    keep_going, response = self._handle_request(line)
+                finally:
+                    owns_transaction = in_transaction()
+                    if not owns_transaction:
+                        self._gate.release()
+
+                writer.write((_ENCODER.encode(response) + "\n").encode("utf-8"))
+                await writer.drain()
+                if not keep_going:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            if owns_transaction:
+                rollback_transaction()
+                self._gate.release()
+            writer.close()
+
+
+async def _serve(socket_path: str, host: str, port: int | None) -> None:
+    """Запускает сервер и ждёт сигнала завершения (SIGINT или SIGTERM)."""
+    server_state = _Server()
+    if port is None:
+        _remove_stale_socket(socket_path)
+        server = await asyncio.start_unix_server(
+            server_state.handle_connection, path=socket_path
+        )
+        print(f"Сервер слушает сокет {socket_path}")
+    else:
+        server = await asyncio.start_server(
+            server_state.handle_connection, host=host, port=port
+        )
+        print(f"Сервер слушает {host}:{port}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with server:
+        await stop.wait()
+    if port is None:
+        os.unlink(socket_path)
+    print("Сервер остановлен.")
+
+
+def serve(
+    socket_path: str = SERVER_SOCKET_PATH,
+    host: str = SERVER_HOST,
+    port: int | None = None,
+    assume_yes: bool = False,
+) -> None:
+    """Запускает сервер на сокете Unix socket_path или, если задан port,
+    на TCP host:port.
+
+    Как и в пакетном режиме, время выполнения не печатается, а опасные
+    операции подтверждаются только при assume_yes.
+    """
+    set_log_time_enabled(False)
+    set_auto_confirm(assume_yes)
+    try:
+        _recover()
+        asyncio.run(_serve(socket_path, host, port))
+    finally:
+        _finish()
+        set_auto_confirm(None)
+        set_log_time_enabled(True)
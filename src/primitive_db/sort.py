@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""Сортировка результатов запроса (ORDER BY).
+
+Небольшой результат сортируется в памяти; с LIMIT выбираются первые K строк
+кучей (heapq), без хранения остальных; результат больше бюджета памяти
+сортируется внешним слиянием: отсортированные порции сбрасываются во
+временные файлы и затем сливаются потоково.
+"""
+
+import heapq
+import json
+import os
+import tempfile
+from functools import total_ordering
+from itertools import islice
+
+from src.primitive_db.constants import SORT_MEMORY_ROWS
+from src.primitive_db.index import sort_key
+
+
+@total_ordering
+class _Descending:
+    """Ключ с обратным порядком (для колонок DESC при смешанных направлениях)."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+def _make_key(order_by: list) -> tuple:
+    """Возвращает (функция ключа, reverse) для списка (колонка, по убыванию?).
+
+    Значения разных типов сравниваются как в сортированном индексе:
+    пустые, затем числа, затем строки.
+    """
+    columns = [column for column, _ in order_by]
+    directions = {desc for _, desc in order_by}
+
+    if len(directions) == 1:
+        if len(columns) == 1:
+            column = columns[0]
+
+            def key(row):
+                return sort_key(row.get(column))
+        else:
+            def key(row):
+                return tuple(sort_key(row.get(c)) for c in columns)
+        return key, directions.pop()
+
+    def key(row):
+        return tuple(
+            _Descending(sort_key(row.get(c))) if desc else sort_key(row.get(c))
+            for c, desc in order_by
+        )
+    return key, False
+
+
+def _spill(rows: list, directory: str, number: int) -> str:
+    """Записывает отсортированную порцию во временный файл; возвращает путь."""
+    path = os.path.join(directory, f"run{number}.jsonl")
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(encoder.encode(row))
+            f.write("\n")
+    return path
+
+
+def _read_run(path: str):
+    """Построчно читает порцию из временного файла."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _external_sort(rows, key, reverse: bool, memory_rows: int):
+    """Сортирует поток строк порциями по memory_rows; если всё поместилось
+    в одну порцию — в памяти, иначе слиянием временных файлов.
+    """
+    chunk = list(islice(rows, memory_rows))
+    chunk.sort(key=key, reverse=reverse)
+    rest = list(islice(rows, 1))
+    if not rest:
+        yield from chunk
+        return
+
+    with tempfile.TemporaryDirectory(prefix="primitive_db_sort_") as directory:
+        runs = [_spill(chunk, directory, 0)]
+        chunk = rest
+        while chunk:
+            chunk.extend(islice(rows, memory_rows - len(chunk)))
+            chunk.sort(key=key, reverse=reverse)
+            runs.append(_spill(chunk, directory, len(runs)))
+            chunk = list(islice(rows, 1))
+        del chunk
+
+        readers = [_read_run(path) for path in runs]
+        yield from heapq.merge(*readers, key=key, reverse=reverse)
+
+
+def sort_rows(
+    rows, order_by: list, limit=None, offset=0, memory_rows: int = SORT_MEMORY_ROWS
+):
+    """Лениво выдаёт строки в порядке ORDER BY с учётом OFFSET и LIMIT.
+
+    order_by — список пар (колонка, по убыванию?). memory_rows — сколько строк
+    можно держать в памяти: больший результат сортируется через временные
+    файлы; с LIMIT в памяти хранятся только offset + limit строк.
+    """
+    key, reverse = _make_key(order_by)
+    rows = iter(rows)
+
+    if limit is not None and offset + limit <= memory_rows:
+        select_top = heapq.nlargest if reverse else heapq.nsmallest
+        return islice(select_top(offset + limit, rows, key=key), offset, None)
+
+    stop = None if limit is None else offset + limit
+    return islice(_external_sort(rows, key, reverse, memory_rows), offset, stop)
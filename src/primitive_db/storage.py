@@ -0,0 +1,1480 @@
+#!/usr/bin/env python3
+
+"""Движки хранения данных таблиц: JSON-файл целиком, журнал строк
+и двоичный постраничный формат.
+
+Чтение файла таблицы идёт под разделяемой блокировкой данных, публикация
+новой версии (дозапись или замена файла) — под исключительной (см. lock.py).
+
+Журнал и двоичный формат делятся на сегменты по SEGMENT_ROWS строк
+с границами ID в каждом (segments): сегмент читается независимо от
+остальных (read_segment), в том числе другим процессом (см. parallel.py).
+
+Для них же при записи ведутся зонные карты — статистика колонок по блокам
+из ZONE_ROWS строк (см. zonemap.py): перебор с условием (scan, segments)
+пропускает блоки, в которых условию не удовлетворяет ни одна строка.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import partial
+
+from src.primitive_db.constants import (
+    BINARY_DELTA_MAX_SHARE,
+    BINARY_FILE_EXT,
+    BINARY_PAGE_SIZE,
+    COMPACT_MIN_DEAD,
+    DATA_DIR,
+    DEFAULT_STORAGE,
+    DELTA_FILE_EXT,
+    ID_COLUMN,
+    LOG_FILE_EXT,
+    SEGMENT_ROWS,
+    TABLE_FILE_EXT,
+    WAL_FSYNC_POLICY,
+    ZONE_FILE_EXT,
+    ZONE_ROWS,
+)
+from src.primitive_db.lock import data_lock
+from src.primitive_db.zonemap import (
+    build_zone,
+    prepare_zone,
+    skipped_ranges,
+    zone_may_match,
+)
+
+# Один кодировщик на все записи журнала: json.dumps с параметрами создаёт
+# новый кодировщик при каждом вызове
+_LOG_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+# Префиксы записей журнала в том виде, в каком их пишет LogStorage
+_PUT_PREFIX = b'{"put":{"' + ID_COLUMN.encode() + b'":'
+_DEL_PREFIX = b'{"del":'
+
+
+def _record_key(line: bytes) -> tuple[str, object]:
+    """Возвращает вид записи журнала ('put'/'del') и ID строки.
+
+    Для записей, где ID идёт первым (так пишет LogStorage), ID читается
+    прямо из начала строки без разбора всего JSON.
+    """
+    for kind, prefix, end in (
+        ("put", _PUT_PREFIX, b","),
+        ("del", _DEL_PREFIX, b"}"),
+    ):
+        if line.startswith(prefix):
+            stop = line.find(end, len(prefix))
+            digits = line[len(prefix):stop]
+            if stop != -1 and digits.isdigit():
+                return kind, int(digits)
+
+    record = json.loads(line)
+    if "put" in record:
+        return "put", record["put"][ID_COLUMN]
+    return "del", record.get("del")
+
+
+def _ensure_data_dir() -> None:
+    """Создаёт каталог для данных таблиц, если его нет."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+
+def replace_file(filepath: str, write_func) -> None:
+    """Записывает файл (в двоичном режиме) через временный файл
+    и атомарное переименование: при сбое на диске остаётся либо старая,
+    либо новая версия целиком.
+
+    Временный файл сбрасывается на диск до переименования (кроме режима
+    fsync "os"), иначе после сбоя питания на месте старой версии может
+    оказаться пустой файл.
+    """
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, "wb") as f:
+        write_func(f)
+        f.flush()
+        if WAL_FSYNC_POLICY != "os":
+            os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+def sync_path(path: str) -> None:
+    """Сбрасывает на диск файл или каталог (записи о переименованиях
+    и удалениях), если он существует.
+    """
+    if WAL_FSYNC_POLICY == "os":
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except (FileNotFoundError, IsADirectoryError, PermissionError):
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Каталоги не везде поддерживают fsync
+        pass
+    finally:
+        os.close(fd)
+
+
+class StaleSegmentError(Exception):
+    """Файл таблицы заменён после разбиения на сегменты."""
+
+
+def _file_id(f) -> tuple:
+    """Идентификатор открытого файла: (устройство, inode, размер)."""
+    st = os.fstat(f.fileno())
+    return (st.st_dev, st.st_ino, st.st_size)
+
+
+def _open_segment(segment: dict):
+    """Открывает файл сегмента, проверяя, что это тот же файл, что и при
+    разбиении (замена файла меняет inode, дозапись — только размер).
+    """
+    try:
+        f = open(segment["path"], "rb")
+    except FileNotFoundError:
+        raise StaleSegmentError(segment["path"]) from None
+    device, inode, size = _file_id(f)
+    expected = segment["file"]
+    if (device, inode) != (expected[0], expected[1]) or size < expected[2]:
+        f.close()
+        raise StaleSegmentError(segment["path"])
+    return f
+
+
+def _id_bounds(ids: list) -> tuple:
+    """Наименьший и наибольший ID сегмента (None, если ID не целые)."""
+    if ids and all(type(row_id) is int for row_id in ids):
+        return min(ids), max(ids)
+    return None, None
+
+
+def _inode(path: str) -> list:
+    """Устройство и inode файла: меняются при замене файла."""
+    st = os.stat(path)
+    return [st.st_dev, st.st_ino]
+
+
+def _range_filter(ranges: list):
+    """Возвращает проверку «позиция вне всех диапазонов [start, stop)»
+    (диапазоны упорядочены) или None, если диапазонов нет.
+    """
+    if not ranges:
+        return None
+    starts = [start for start, _ in ranges]
+
+    def outside(pos) -> bool:
+        i = bisect_right(starts, pos) - 1
+        return i < 0 or pos >= ranges[i][1]
+    return outside
+
+
+def _complement(ranges: list, start: int, stop: int) -> list:
+    """Части диапазона [start, stop), не покрытые упорядоченными ranges."""
+    parts = []
+    for low, high in ranges:
+        if high <= start or low >= stop:
+            continue
+        if low > start:
+            parts.append([start, low])
+        start = max(start, high)
+    if start < stop:
+        parts.append([start, stop])
+    return parts
+
+
+def _cut_torn_record(path: str) -> None:
+    """Отрезает оборванную последнюю строку файла записей (JSON Lines),
+    чтобы следующая дозапись не склеилась с ней в одну строку.
+    """
+    try:
+        f = open(path, "r+b")
+    except FileNotFoundError:
+        return
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # Ищем конец последней целой записи, читая файл с конца порциями
+        end = size
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            found = f.read(end - start).rfind(b"\n")
+            if found != -1:
+                end = start + found + 1
+                break
+            end = start
+        f.truncate(end)
+
+
+def file_signature(filepath: str) -> tuple | None:
+    """Возвращает (размер, mtime) файла или None, если файла нет."""
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+class JsonStorage:
+    """Таблица целиком в одном JSON-файле; любая запись перезаписывает файл."""
+
+    name = "json"
+    ext = TABLE_FILE_EXT
+
+    def path(self, table_name: str) -> str:
+        """Возвращает путь к файлу данных таблицы."""
+        return os.path.join(DATA_DIR, f"{table_name}{self.ext}")
+
+    def signature(self, table_name: str) -> tuple | None:
+        """Подпись данных таблицы (меняется при любой записи) или None,
+        если файла нет.
+        """
+        return file_signature(self.path(table_name))
+
+    def sync(self, table_name: str) -> None:
+        """Сбрасывает на диск файлы данных таблицы."""
+        sync_path(self.path(table_name))
+
+    def exists(self, table_name: str) -> bool:
+        """Проверяет, есть ли на диске файл таблицы этого формата."""
+        return os.path.isfile(self.path(table_name))
+
+    def load(self, table_name: str) -> list[dict]:
+        """Загружает все строки таблицы; при отсутствии файла — пустой список."""
+        _ensure_data_dir()
+        try:
+            with data_lock(table_name).hold(shared=True):
+                with open(self.path(table_name), "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def scan(self, table_name: str, condition=None):
+        """Выдаёт строки таблицы по одной (JSON-файл читается целиком).
+
+        condition — дерево условия WHERE: движки с зонными картами не читают
+        блоки, где ему не удовлетворяет ни одна строка. Остальные строки
+        выдаются без проверки условия.
+        """
+        yield from self.load(table_name)
+
+    def count(self, table_name: str) -> int:
+        """Возвращает число строк таблицы."""
+        return len(self.load(table_name))
+
+    def fetch(self, table_name: str, ids) -> list[dict]:
+        """Возвращает строки с указанными ID (в порядке хранения)."""
+        ids = set(ids)
+        return [row for row in self.load(table_name) if row.get(ID_COLUMN) in ids]
+
+    def save(self, table_name: str, rows: list[dict]) -> None:
+        """Сохраняет все строки таблицы, атомарно перезаписывая файл."""
+        _ensure_data_dir()
+        data = json.dumps(rows, ensure_ascii=False, indent=2).encode("utf-8")
+        with data_lock(table_name).hold():
+            replace_file(self.path(table_name), lambda f: f.write(data))
+
+    def append(self, table_name: str, rows: list[dict]) -> None:
+        """Добавляет новые строки в конец таблицы."""
+        self.apply(table_name, rows, [], [])
+
+    def write(self, table_name: str, rows: list[dict]) -> None:
+        """Заменяет изменённые строки (по ID) их новыми версиями."""
+        self.apply(table_name, [], rows, [])
+
+    def remove(self, table_name: str, ids) -> None:
+        """Удаляет строки с указанными ID."""
+        self.apply(table_name, [], [], ids)
+
+    def apply(self, table_name: str, appended, written, removed) -> None:
+        """Применяет пачку изменений за одну перезапись файла.
+
+        Чтение и перезапись идут под одной блокировкой: изменения других
+        процессов, опубликованные раньше, не теряются.
+        """
+        changed = {row[ID_COLUMN]: row for row in written}
+        removed = set(removed)
+        with data_lock(table_name).hold():
+            data = [
+                changed.get(row.get(ID_COLUMN), row)
+                for row in self.load(table_name)
+                if row.get(ID_COLUMN) not in removed
+            ]
+            data.extend(appended)
+            self.save(table_name, data)
+
+    def drop(self, table_name: str) -> None:
+        """Удаляет файл таблицы, если он существует."""
+        with data_lock(table_name).hold():
+            if self.exists(table_name):
+                os.remove(self.path(table_name))
+
+    def repair(self, table_name: str) -> None:
+        """Исправляет последствия сбоя во время записи (файл JSON
+        перезаписывается атомарно, исправлять нечего).
+        """
+
+    def segments(self, table_name: str, condition=None):
+        """Описания сегментов таблицы для read_segment или None, если формат
+        не делится на сегменты (JSON-массив читается только целиком).
+
+        С condition из сегментов исключаются блоки, где условию не
+        удовлетворяет ни одна строка (см. scan).
+        """
+        return None
+
+    def zone_estimate(self, table_name: str, condition) -> dict | None:
+        """Оценка перебора с условием по зонной карте: {"rows": сколько
+        строк придётся прочитать, "skipped": пропускаемых зон, "zones": всего
+        зон} или None, если зонной карты нет.
+        """
+        return None
+
+
+class LogStorage(JsonStorage):
+    """Журнал строк (JSON Lines): вставки и изменения дописываются в конец
+    записью {"put": row}, удаления — надгробием {"del": id}.
+    """
+
+    name = "log"
+    ext = LOG_FILE_EXT
+
+    def __init__(self):
+        # Первичный индекс сессии: таблица -> (подпись файла, {ID: смещение})
+        self._offsets = {}
+        # Зонные карты сессии: таблица -> состояние (см. _zone_state)
+        self._zones = {}
+
+    def _replay(self, table_name: str, keep_rows: bool = True) -> tuple[dict, int]:
+        """Проигрывает журнал: возвращает живые строки по ID и число записей.
+
+        Попутно строит карту ID -> смещение актуальной версии строки в файле;
+        при keep_rows=False строки не разбираются (нужна только карта).
+        """
+        rows = {}
+        offsets = {}
+        records = 0
+        signature = None
+        try:
+            # Снимок — файл до размера на момент открытия: пачки, дописанные
+            # позже, целиком не видны
+            with data_lock(table_name).hold(shared=True):
+                f = open(self.path(table_name), "rb")
+                signature = file_signature(self.path(table_name))
+            with f:
+                pos = 0
+                for line in f:
+                    start = pos
+                    pos += len(line)
+                    if pos > signature[0] or not line.endswith(b"\n"):
+                        # Дописано после снимка или оборвано сбоем
+                        break
+                    if not line.strip():
+                        continue
+                    records += 1
+                    if keep_rows:
+                        record = json.loads(line)
+                        if "put" in record:
+                            row = record["put"]
+                            rows[row[ID_COLUMN]] = row
+                            offsets[row[ID_COLUMN]] = start
+                        elif "del" in record:
+                            rows.pop(record["del"], None)
+                            offsets.pop(record["del"], None)
+                        continue
+                    kind, row_id = _record_key(line)
+                    if kind == "put":
+                        offsets[row_id] = start
+                    else:
+                        offsets.pop(row_id, None)
+        except FileNotFoundError:
+            pass
+        self._offsets[table_name] = (signature, offsets)
+        return rows, records
+
+    def _id_offsets(self, table_name: str) -> dict:
+        """Возвращает карту ID -> смещение; перестраивает её, если файл изменился."""
+        cached = self._offsets.get(table_name)
+        if cached is not None and cached[0] == file_signature(self.path(table_name)):
+            return cached[1]
+        self._replay(table_name, keep_rows=False)
+        return self._offsets[table_name][1]
+
+    def _zone_path(self, table_name: str) -> str:
+        """Возвращает путь к файлу зонной карты журнала."""
+        return os.path.join(DATA_DIR, f"{table_name}{ZONE_FILE_EXT}")
+
+    def _zone_state(self, table_name: str) -> dict:
+        """Возвращает зонную карту журнала (вызывается под блокировкой данных).
+
+        Файл карты — строка с устройством и inode журнала и по строке на
+        закрытую зону: ZONE_ROWS записей put между смещениями start и stop.
+        Записи после последней зоны (открытая зона, "tail") читаются всегда.
+        Карта другого файла (журнал заменён) не используется, зоны за концом
+        журнала (он обрезан) отбрасываются; файл карты исправляется при
+        следующей записи ("rewrite").
+        """
+        path = self.path(table_name)
+        signature = file_signature(path)
+        state = self._zones.get(table_name)
+        if state is not None and state["signature"] == signature:
+            return state
+
+        state = {
+            "signature": signature,
+            "zones": [],
+            "tail": 0,
+            # Записи put открытой зоны: [(конец записи, строка)]; None —
+            # ещё не прочитаны
+            "pending": None,
+            # Длина верной части файла карты
+            "size": 0,
+            "rewrite": True,
+        }
+        self._zones[table_name] = state
+        if signature is None:
+            return state
+        try:
+            with open(self._zone_path(table_name), "rb") as f:
+                header = f.readline()
+                if json.loads(header).get("file") != _inode(path):
+                    return state
+                state["size"] = len(header)
+                state["rewrite"] = False
+                for line in f:
+                    zone = json.loads(line) if line.endswith(b"\n") else None
+                    if (
+                        zone is None
+                        or zone["start"] != state["tail"]
+                        or zone["stop"] > signature[0]
+                    ):
+                        state["rewrite"] = True
+                        break
+                    state["zones"].append(prepare_zone(zone))
+                    state["tail"] = zone["stop"]
+                    state["size"] += len(line)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            state["rewrite"] = True
+        return state
+
+    def _pending_rows(self, table_name: str, state: dict, end: int) -> list:
+        """Записи put открытой зоны до смещения end: [(конец записи, строка)]."""
+        if state["pending"] is not None:
+            return state["pending"]
+        try:
+            with open(self.path(table_name), "rb") as f:
+                f.seek(state["tail"])
+                data = f.read(max(0, end - state["tail"]))
+        except FileNotFoundError:
+            return []
+
+        # Записи разбираются одним вызовом json.loads, как массив
+        lines, ends = [], []
+        pos = state["tail"]
+        for line in data.split(b"\n")[:-1]:
+            pos += len(line) + 1
+            if line.strip():
+                lines.append(line)
+                ends.append(pos)
+        records = json.loads(b"[" + b",".join(lines) + b"]")
+        return [
+            (pos, record["put"])
+            for pos, record in zip(ends, records)
+            if "put" in record
+        ]
+
+    def _extend_zones(self, table_name: str, state: dict, entries: list) -> None:
+        """Добавляет записи put [(конец записи, строка)] в открытую зону,
+        закрывая зоны по ZONE_ROWS строк, и дописывает закрытые зоны в файл
+        карты (вызывается под исключительной блокировкой данных).
+        """
+        pending = state["pending"] + entries
+        lines = []
+        closed = len(pending) - len(pending) % ZONE_ROWS
+        for start in range(0, closed, ZONE_ROWS):
+            chunk = pending[start:start + ZONE_ROWS]
+            zone = build_zone([row for _, row in chunk])
+            zone["start"], zone["stop"] = state["tail"], chunk[-1][0]
+            lines.append(self._encode(zone))
+            state["zones"].append(prepare_zone(zone))
+            state["tail"] = zone["stop"]
+        state["pending"] = pending[closed:]
+
+        if not lines and not state["rewrite"]:
+            return
+        with open(self._zone_path(table_name), "ab") as f:
+            if state["rewrite"]:
+                f.truncate(state["size"])
+                if state["size"] == 0:
+                    header = {"file": _inode(self.path(table_name))}
+                    lines.insert(0, self._encode(header))
+                state["rewrite"] = False
+            f.write(b"".join(lines))
+            state["size"] = f.tell()
+
+    def _skipped(self, table_name: str, condition) -> list:
+        """Диапазоны смещений зон, которые можно не читать при условии
+        (вызывается под блокировкой данных).
+        """
+        if condition is None:
+            return []
+        return skipped_ranges(self._zone_state(table_name)["zones"], condition)
+
+    def zone_estimate(self, table_name: str, condition) -> dict | None:
+        """Оценка перебора по зонной карте: число записей в непропускаемой
+        части журнала — по средней длине записи в закрытых зонах (старые
+        версии строк тоже считаются, зато карта смещений не нужна).
+        """
+        with data_lock(table_name).hold(shared=True):
+            state = self._zone_state(table_name)
+        zones = state["zones"]
+        if not zones:
+            return None
+        skipped = [zone for zone in zones if not zone_may_match(condition, zone)]
+        size = state["signature"][0]
+        kept = size - sum(zone["stop"] - zone["start"] for zone in skipped)
+        puts = sum(zone["rows"] for zone in zones)
+        return {
+            "rows": round(puts * kept / state["tail"]),
+            "skipped": len(skipped),
+            "zones": len(zones),
+        }
+
+    def scan(self, table_name: str, condition=None):
+        """Потоково выдаёт живые строки, не загружая таблицу.
+
+        Порядок тот же, что у load(): по первому появлению ID в журнале.
+        Дописанное позже и замена файла уже открытому чтению не видны.
+        Строки из зон, где условию не удовлетворяет ни одна строка,
+        не читаются.
+        """
+        with data_lock(table_name).hold(shared=True):
+            offsets = self._id_offsets(table_name).values()
+            outside = _range_filter(self._skipped(table_name, condition))
+            offsets = list(offsets if outside is None else filter(outside, offsets))
+            try:
+                f = open(self.path(table_name), "rb")
+            except FileNotFoundError:
+                # Таблица создана, но в неё ещё ничего не записано
+                return
+        with f:
+            for pos in offsets:
+                f.seek(pos)
+                yield json.loads(f.readline())["put"]
+
+    def load(self, table_name: str) -> list[dict]:
+        """Загружает живые строки; уплотняет журнал, если в нём много мусора."""
+        _ensure_data_dir()
+        rows, records = self._replay(table_name)
+        data = list(rows.values())
+
+        dead = records - len(data)
+        if dead >= COMPACT_MIN_DEAD and dead > len(data):
+            self._compact(table_name, data)
+
+        return data
+
+    def _compact(self, table_name: str, rows: list[dict]) -> None:
+        """Переписывает журнал живыми строками, если его никто не читает
+        и не дописал после проигрывания (иначе уплотнение откладывается).
+        """
+        lock = data_lock(table_name)
+        if not lock.try_acquire():
+            return
+        try:
+            cached = self._offsets.get(table_name)
+            if cached is not None and cached[0] == file_signature(
+                self.path(table_name)
+            ):
+                self.save(table_name, rows)
+        finally:
+            lock.release()
+
+    def count(self, table_name: str) -> int:
+        """Возвращает число живых строк по карте смещений (строки не разбираются)."""
+        return len(self._id_offsets(table_name))
+
+    def fetch(self, table_name: str, ids) -> list[dict]:
+        """Читает строки с указанными ID по смещениям, не загружая таблицу."""
+        with data_lock(table_name).hold(shared=True):
+            offsets = self._id_offsets(table_name)
+            positions = sorted(
+                offsets[row_id] for row_id in ids if row_id in offsets
+            )
+            if not positions:
+                return []
+
+            rows = []
+            with open(self.path(table_name), "rb") as f:
+                for pos in positions:
+                    f.seek(pos)
+                    rows.append(json.loads(f.readline())["put"])
+        return rows
+
+    def segments(self, table_name: str, condition=None) -> list[dict]:
+        """Делит живые строки по возрастанию ID на сегменты по SEGMENT_ROWS;
+        сегмент хранит смещения своих строк в файле и границы ID. Строки
+        из зон, где условию не удовлетворяет ни одна строка, не включаются.
+        """
+        path = self.path(table_name)
+        with data_lock(table_name).hold(shared=True):
+            offsets = self._id_offsets(table_name)
+            outside = _range_filter(self._skipped(table_name, condition))
+            try:
+                with open(path, "rb") as f:
+                    file_id = _file_id(f)
+            except FileNotFoundError:
+                return []
+
+        ids = list(offsets)
+        if outside is not None:
+            ids = [row_id for row_id in ids if outside(offsets[row_id])]
+        try:
+            ids.sort()
+        except TypeError:
+            pass
+        segments = []
+        for start in range(0, len(ids), SEGMENT_ROWS):
+            chunk = ids[start:start + SEGMENT_ROWS]
+            low, high = _id_bounds(chunk)
+            positions = array("q", sorted(offsets[row_id] for row_id in chunk))
+            segments.append({
+                "path": path,
+                "file": file_id,
+                "rows": len(chunk),
+                "min_id": low,
+                "max_id": high,
+                "offsets": positions.tobytes(),
+            })
+        return segments
+
+    def read_segment(self, segment: dict) -> list[dict]:
+        """Читает строки сегмента одним куском файла: от первой его строки
+        до последней (строки между ними, не входящие в сегмент, пропускаются).
+        """
+        positions = array("q")
+        positions.frombytes(segment["offsets"])
+        if not positions:
+            return []
+        with _open_segment(segment) as f:
+            f.seek(positions[0])
+            data = f.read(positions[-1] - positions[0]) + f.readline()
+
+        lines = data.split(b"\n")[:-1]
+        if len(lines) == len(positions):
+            return [json.loads(line)["put"] for line in lines]
+
+        wanted = set(positions)
+        rows = []
+        pos = positions[0]
+        for line in lines:
+            if pos in wanted:
+                rows.append(json.loads(line)["put"])
+            pos += len(line) + 1
+        return rows
+
+    def save(self, table_name: str, rows: list[dict]) -> None:
+        """Переписывает журнал заново, оставляя только живые строки."""
+        _ensure_data_dir()
+        path = self.path(table_name)
+        offsets = {}
+        entries = []
+
+        def write_rows(f):
+            pos = 0
+            for row in rows:
+                line = self._encode({"put": row})
+                offsets[row[ID_COLUMN]] = pos
+                f.write(line)
+                pos += len(line)
+                entries.append((pos, row))
+
+        with data_lock(table_name).hold():
+            replace_file(path, write_rows)
+            signature = file_signature(path)
+            self._offsets[table_name] = (signature, offsets)
+            # Карта нового файла пишется после замены журнала: при сбое между
+            # ними в карте останется inode старого файла, и она не будет
+            # использована
+            state = {
+                "signature": signature,
+                "zones": [],
+                "tail": 0,
+                "pending": [],
+                "size": 0,
+                "rewrite": True,
+            }
+            self._zones[table_name] = state
+            self._extend_zones(table_name, state, entries)
+
+    def _encode(self, record: dict) -> bytes:
+        """Сериализует запись журнала в одну строку."""
+        return (_LOG_ENCODER.encode(record) + "\n").encode("utf-8")
+
+    def _append_records(self, table_name: str, records) -> None:
+        """Дописывает записи в конец журнала одной операцией записи
+        и переносит их в карту смещений и зонную карту.
+        """
+        _ensure_data_dir()
+        path = self.path(table_name)
+        records = list(records)
+        if not records:
+            return
+
+        lines = [self._encode(record) for record in records]
+        with data_lock(table_name).hold():
+            cached = self._offsets.get(table_name)
+            valid = cached is not None and cached[0] == file_signature(path)
+            zones = self._zone_state(table_name)
+            with open(path, "ab") as f:
+                pos = f.tell()
+                zones["pending"] = self._pending_rows(table_name, zones, pos)
+                f.write(b"".join(lines))
+            signature = file_signature(path)
+
+            entries = []
+            end = pos
+            for record, line in zip(records, lines):
+                end += len(line)
+                if "put" in record:
+                    entries.append((end, record["put"]))
+            self._extend_zones(table_name, zones, entries)
+            zones["signature"] = signature
+
+        if not valid:
+            self._offsets.pop(table_name, None)
+            return
+
+        offsets = cached[1]
+        for record, line in zip(records, lines):
+            if "put" in record:
+                offsets[record["put"][ID_COLUMN]] = pos
+            else:
+                offsets.pop(record["del"], None)
+            pos += len(line)
+        self._offsets[table_name] = (signature, offsets)
+
+    def append(self, table_name: str, rows: list[dict]) -> None:
+        """Дописывает новые строки в журнал."""
+        self._append_records(table_name, ({"put": row} for row in rows))
+
+    def write(self, table_name: str, rows: list[dict]) -> None:
+        """Дописывает новые версии изменённых строк."""
+        self._append_records(table_name, ({"put": row} for row in rows))
+
+    def remove(self, table_name: str, ids) -> None:
+        """Дописывает надгробия для удалённых строк."""
+        self._append_records(table_name, ({"del": row_id} for row_id in ids))
+
+    def apply(self, table_name: str, appended, written, removed) -> None:
+        """Дописывает пачку изменений одной операцией записи."""
+        records = [{"del": row_id} for row_id in removed]
+        records.extend({"put": row} for row in written)
+        records.extend({"put": row} for row in appended)
+        self._append_records(table_name, records)
+
+    def drop(self, table_name: str) -> None:
+        """Удаляет файл журнала, его зонную карту и карту смещений таблицы."""
+        self._offsets.pop(table_name, None)
+        self._zones.pop(table_name, None)
+        with data_lock(table_name).hold():
+            super().drop(table_name)
+            if os.path.exists(self._zone_path(table_name)):
+                os.remove(self._zone_path(table_name))
+
+    def repair(self, table_name: str) -> None:
+        """Отрезает оборванную последнюю запись журнала, чтобы следующая
+        дозапись не склеилась с ней в одну строку.
+        """
+        with data_lock(table_name).hold():
+            self._offsets.pop(table_name, None)
+            self._zones.pop(table_name, None)
+            _cut_torn_record(self.path(table_name))
+
+
+# Заголовок двоичного файла: сигнатура, версия, размер страницы, число строк,
+# смещение и длина каталога колонок (JSON в конце файла)
+_BINARY_MAGIC = b"PDBT"
+_BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct("<4sHIQQI")
+# Строк в одной порции при потоковом чтении
+_BINARY_BATCH_ROWS = 4096
+_MISSING = object()
+
+
+def _column_type(values: list) -> str:
+    """Тип колонки для двоичного формата по её значениям.
+
+    int/bool/str хранятся в своём представлении, всё остальное (None, float,
+    смешанные типы, отсутствующие значения) — как JSON в куче строк.
+    """
+    types = set(map(type, values))
+    if types == {bool}:
+        return "bool"
+    if types == {int}:
+        return "int"
+    if types == {str}:
+        return "str"
+    return "json"
+
+
+def _to_le(data: array) -> array:
+    """Приводит массив к порядку байт little-endian (формат файла)."""
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data
+
+
+def _apply_changes(rows: list[dict], changes: dict) -> list[dict]:
+    """Заменяет строки их новыми версиями из changes {ID: строка или None
+    (строка удалена)}.
+    """
+    result = []
+    for row in rows:
+        row = changes.get(row.get(ID_COLUMN), row)
+        if row is not None:
+            result.append(row)
+    return result
+
+
+def _touches(ids: list | None, zone: dict) -> bool:
+    """Попадает ли один из упорядоченных ID (None — неизвестно какие)
+    в границы колонки ID зоны.
+    """
+    if ids is None:
+        return True
+    bounds = zone["columns"].get(ID_COLUMN)
+    if bounds is None or bounds[0] is None:
+        return True
+    try:
+        i = bisect_left(ids, bounds[0])
+        return i < len(ids) and ids[i] <= bounds[1]
+    except TypeError:
+        return True
+
+
+class BinaryStorage(JsonStorage):
+    """Двоичный постраничный формат: колонки хранятся раздельно.
+
+    int — массив int64, bool — по байту на строку, str (и JSON-значения
+    прочих типов) — массив смещений uint64 и куча байт UTF-8. Данные колонок
+    выровнены по BINARY_PAGE_SIZE, каталог колонок (имя, тип, смещения),
+    сегментов строк (диапазон позиций, границы ID) и положение зонной карты
+    записаны в конце файла, а заголовок хранит число строк. Файл читается
+    через mmap, поэтому поиск по ID затрагивает только нужные страницы.
+
+    Вставки, изменения и удаления не перезаписывают файл: они дописываются
+    записями {"put": row} и {"del": id} в дельта-файл рядом с ним и
+    накладываются на строки файла при чтении. Дельта-файл вливается в файл
+    таблицы (одной перезаписью), когда становится больше
+    BINARY_DELTA_MAX_SHARE таблицы.
+    """
+
+    name = "binary"
+    ext = BINARY_FILE_EXT
+
+    def __init__(self):
+        # Разобранные зонные карты: путь -> (идентификатор файла, зоны)
+        self._zone_cache = {}
+        # Дельта-файлы сессии: таблица -> состояние (см. _delta)
+        self._deltas = {}
+
+    def _delta_path(self, table_name: str) -> str:
+        """Возвращает путь к дельта-файлу таблицы."""
+        return os.path.join(DATA_DIR, f"{table_name}{DELTA_FILE_EXT}")
+
+    def signature(self, table_name: str) -> tuple | None:
+        """Подпись файла таблицы вместе с подписью дельта-файла."""
+        base = file_signature(self.path(table_name))
+        if base is None:
+            return None
+        return base + (file_signature(self._delta_path(table_name)),)
+
+    def sync(self, table_name: str) -> None:
+        """Сбрасывает на диск файл таблицы и дельта-файл."""
+        sync_path(self.path(table_name))
+        sync_path(self._delta_path(table_name))
+
+    def _delta(self, table_name: str, file_id: tuple) -> dict:
+        """Возвращает изменения из дельта-файла (вызывается под блокировкой
+        данных): {"changes": {ID: строка или None}, "records": число записей,
+        "size": длина целой части файла, ...}.
+
+        Первая строка дельта-файла — устройство и inode файла таблицы:
+        дельта-файл от заменённого файла таблицы (сбой между перезаписью
+        и удалением дельта-файла) не используется. Оборванная последняя
+        запись пропускается и отрезается следующей дозаписью.
+        """
+        path = self._delta_path(table_name)
+        key = (file_id, file_signature(path))
+        state = self._deltas.get(table_name)
+        if state is not None and state["key"] == key:
+            return state
+
+        state = {
+            "key": key,
+            "changes": {},
+            "records": 0,
+            "size": 0,
+            # ID строк файла таблицы и производные от них (см. _delta_view)
+            "base": None,
+            "view": None,
+        }
+        self._deltas[table_name] = state
+        if key[1] is None:
+            return state
+        try:
+            with open(path, "rb") as f:
+                lines = f.read().split(b"\n")[:-1]
+        except FileNotFoundError:
+            return state
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            header = {}
+        if header.get("file") != list(file_id[:2]):
+            return state
+        records = json.loads(b"[" + b",".join(lines[1:]) + b"]")
+
+        changes = state["changes"]
+        for record in records:
+            if "put" in record:
+                changes[record["put"][ID_COLUMN]] = record["put"]
+            else:
+                changes[record["del"]] = None
+        state["records"] = len(records)
+        state["size"] = sum(map(len, lines)) + len(lines)
+        return state
+
+    def _delta_view(self, mm, row_count: int, directory: dict, delta: dict) -> tuple:
+        """Изменения дельта-файла относительно файла таблицы: (изменения,
+        новые строки, проверка «зону нельзя пропускать» или None).
+
+        Статистика зоны, где изменена или удалена строка, устарела: такие
+        зоны при переборе с условием не пропускаются.
+        """
+        changes = delta["changes"]
+        if not changes:
+            return changes, [], None
+        if delta["view"] is None:
+            if delta["base"] is None:
+                id_column = next(
+                    (c for c in directory["columns"] if c["name"] == ID_COLUMN),
+                    None,
+                )
+                ids = (
+                    self._read_values(mm, id_column, 0, row_count)
+                    if id_column is not None
+                    else []
+                )
+                delta["base"] = set(ids)
+            base = delta["base"]
+            added = [
+                row
+                for row_id, row in changes.items()
+                if row is not None and row_id not in base
+            ]
+            touched = [row_id for row_id in changes if row_id in base]
+            try:
+                touched.sort()
+            except TypeError:
+                touched = None
+            keep = partial(_touches, touched) if touched != [] else None
+            delta["view"] = (added, keep)
+        added, keep = delta["view"]
+        return changes, added, keep
+
+    def _remove_delta(self, table_name: str) -> None:
+        """Удаляет дельта-файл (вызывается под блокировкой данных)."""
+        self._deltas.pop(table_name, None)
+        try:
+            os.remove(self._delta_path(table_name))
+        except FileNotFoundError:
+            pass
+
+    def _pad(self, f) -> int:
+        """Дополняет файл нулями до границы страницы; возвращает позицию."""
+        pos = f.tell()
+        gap = -pos % BINARY_PAGE_SIZE
+        if gap:
+            f.write(b"\0" * gap)
+        return pos + gap
+
+    def _write_segment(self, f, data: bytes) -> list:
+        """Пишет сегмент с границы страницы; возвращает [смещение, длина]."""
+        start = self._pad(f)
+        f.write(data)
+        return [start, len(data)]
+
+    def save(self, table_name: str, rows: list[dict]) -> None:
+        """Сохраняет строки в двоичном формате (через временный файл)."""
+        _ensure_data_dir()
+        rows = list(rows)
+        names = {}
+        for row in rows:
+            for name in row:
+                names.setdefault(name)
+
+        def write_file(f):
+            f.write(b"\0" * _BINARY_HEADER.size)
+            columns = []
+            for name in names:
+                values = [row.get(name, _MISSING) for row in rows]
+                columns.append(self._write_column(f, name, values))
+
+            segments = []
+            for start in range(0, len(rows), SEGMENT_ROWS):
+                stop = min(start + SEGMENT_ROWS, len(rows))
+                ids = [row.get(ID_COLUMN) for row in rows[start:stop]]
+                segments.append([start, stop, *_id_bounds(ids)])
+
+            zones = []
+            for start in range(0, len(rows), ZONE_ROWS):
+                zone = build_zone(rows[start:start + ZONE_ROWS])
+                zone["start"], zone["stop"] = start, start + zone["rows"]
+                zones.append(zone)
+            # Зонная карта — отдельным блоком: каталог читается при каждом
+            # открытии файла, а карта нужна только перебору с условием
+            zones = self._write_segment(
+                f, json.dumps(zones, ensure_ascii=False).encode("utf-8")
+            )
+
+            directory = json.dumps(
+                {"columns": columns, "segments": segments, "zones": zones},
+                ensure_ascii=False,
+            )
+            directory = directory.encode("utf-8")
+            dir_offset = self._pad(f)
+            f.write(directory)
+
+            f.seek(0)
+            f.write(
+                _BINARY_HEADER.pack(
+                    _BINARY_MAGIC,
+                    _BINARY_VERSION,
+                    BINARY_PAGE_SIZE,
+                    len(rows),
+                    dir_offset,
+                    len(directory),
+                )
+            )
+
+        with data_lock(table_name).hold():
+            replace_file(self.path(table_name), write_file)
+            # Изменения дельта-файла уже в новом файле таблицы
+            self._remove_delta(table_name)
+
+    def _write_column(self, f, name: str, values: list) -> dict:
+        """Пишет сегменты одной колонки; возвращает её запись в каталоге."""
+        col_type = _column_type(values)
+        entry = {"name": name, "type": col_type}
+
+        if col_type == "int":
+            try:
+                entry["data"] = self._write_segment(
+                    f, _to_le(array("q", values)).tobytes()
+                )
+                return entry
+            except OverflowError:
+                col_type = entry["type"] = "json"
+
+        if col_type == "bool":
+            entry["data"] = self._write_segment(f, bytes(values))
+            return entry
+
+        if col_type == "str":
+            encoded = [v.encode("utf-8") for v in values]
+        else:
+            # Пустая строка в куче — значения нет (пустого JSON не бывает)
+            encoded = [
+                b"" if v is _MISSING else _LOG_ENCODER.encode(v).encode("utf-8")
+                for v in values
+            ]
+
+        offsets = array("Q", [0])
+        total = 0
+        for item in encoded:
+            total += len(item)
+            offsets.append(total)
+        entry["data"] = self._write_segment(f, _to_le(offsets).tobytes())
+        entry["heap"] = self._write_segment(f, b"".join(encoded))
+        return entry
+
+    def _open_directory(self, table_name: str):
+        """Открывает файл через mmap; возвращает (mmap, число строк, каталог,
+        идентификатор файла, изменения из дельта-файла) или None, если файла
+        нет. Файл и дельта-файл читаются под одной блокировкой.
+        """
+        try:
+            with data_lock(table_name).hold(shared=True):
+                with open(self.path(table_name), "rb") as f:
+                    file_id = _file_id(f)
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                delta = self._delta(table_name, file_id)
+        except FileNotFoundError:
+            return None
+        row_count, directory = self._read_directory(mm, self.path(table_name))
+        return mm, row_count, directory, file_id, delta
+
+    def _read_directory(self, mm, path: str) -> tuple[int, dict]:
+        """Читает заголовок и каталог файла: (число строк, каталог)."""
+        magic, version, _, row_count, dir_offset, dir_length = (
+            _BINARY_HEADER.unpack_from(mm, 0)
+        )
+        if magic != _BINARY_MAGIC or version != _BINARY_VERSION:
+            mm.close()
+            raise ValueError(f"Файл '{path}' не является таблицей в двоичном формате.")
+        return row_count, json.loads(mm[dir_offset:dir_offset + dir_length])
+
+    def _read_values(self, mm, column: dict, start: int, stop: int) -> list:
+        """Читает значения колонки для строк [start, stop)."""
+        offset = column["data"][0]
+        col_type = column["type"]
+
+        if col_type == "int":
+            data = array("q")
+            data.frombytes(mm[offset + 8 * start:offset + 8 * stop])
+            return _to_le(data).tolist()
+        if col_type == "bool":
+            return [b != 0 for b in mm[offset + start:offset + stop]]
+
+        bounds = array("Q")
+        bounds.frombytes(mm[offset + 8 * start:offset + 8 * (stop + 1)])
+        bounds = _to_le(bounds).tolist()
+        heap_start = column["heap"][0] + bounds[0]
+        heap = mm[heap_start:column["heap"][0] + bounds[-1]]
+        base = bounds[0]
+        items = [
+            heap[bounds[i] - base:bounds[i + 1] - base]
+            for i in range(len(bounds) - 1)
+        ]
+        if col_type == "str":
+            return [item.decode("utf-8") for item in items]
+        return [json.loads(item) if item else _MISSING for item in items]
+
+    def _rows(self, mm, columns: list, start: int, stop: int) -> list[dict]:
+        """Собирает строки [start, stop) из значений колонок."""
+        names = [column["name"] for column in columns]
+        values = [self._read_values(mm, c, start, stop) for c in columns]
+        rows = [dict(zip(names, row_values)) for row_values in zip(*values)]
+        if any(column["type"] == "json" for column in columns):
+            rows = [
+                {k: v for k, v in row.items() if v is not _MISSING} for row in rows
+            ]
+        return rows
+
+    def _row_ranges(
+        self, mm, directory: dict, file_id, path: str, condition, start, stop,
+        keep=None,
+    ) -> list:
+        """Диапазоны позиций из [start, stop), которые нужно прочитать для
+        условия: зоны, где ему не удовлетворяет ни одна строка, исключаются
+        (кроме зон, для которых keep(зона) истинно).
+        """
+        location = directory.get("zones")
+        if condition is None or location is None:
+            return [[start, stop]] if start < stop else []
+        cached = self._zone_cache.get(path)
+        if cached is None or cached[0] != file_id:
+            offset, length = location
+            zones = json.loads(mm[offset:offset + length])
+            cached = self._zone_cache[path] = (file_id, list(map(prepare_zone, zones)))
+        return _complement(skipped_ranges(cached[1], condition, keep), start, stop)
+
+    def zone_estimate(self, table_name: str, condition) -> dict | None:
+        """Оценка перебора по зонной карте из файла (строки зон известны точно)."""
+        path = self.path(table_name)
+        opened = self._open_directory(table_name)
+        if opened is None:
+            return None
+        mm, row_count, directory, file_id, delta = opened
+        try:
+            if condition is None or directory.get("zones") is None:
+                return None
+            _, added, keep = self._delta_view(mm, row_count, directory, delta)
+            ranges = self._row_ranges(
+                mm, directory, file_id, path, condition, 0, row_count, keep
+            )
+        finally:
+            mm.close()
+        zones = self._zone_cache[path][1]
+        return {
+            "rows": sum(stop - start for start, stop in ranges) + len(added),
+            "skipped": sum(
+                not zone_may_match(condition, zone) and not (keep and keep(zone))
+                for zone in zones
+            ),
+            "zones": len(zones),
+        }
+
+    def scan(self, table_name: str, condition=None):
+        """Потоково выдаёт строки порциями по _BINARY_BATCH_ROWS, пропуская
+        зоны, где условию не удовлетворяет ни одна строка. Изменённые строки
+        выдаются на своих местах, новые — после строк файла.
+        """
+        opened = self._open_directory(table_name)
+        if opened is None:
+            return
+        mm, row_count, directory, file_id, delta = opened
+        try:
+            changes, added, keep = self._delta_view(mm, row_count, directory, delta)
+            ranges = self._row_ranges(
+                mm,
+                directory,
+                file_id,
+                self.path(table_name),
+                condition,
+                0,
+                row_count,
+                keep,
+            )
+            for low, high in ranges:
+                for start in range(low, high, _BINARY_BATCH_ROWS):
+                    stop = min(start + _BINARY_BATCH_ROWS, high)
+                    rows = self._rows(mm, directory["columns"], start, stop)
+                    yield from _apply_changes(rows, changes) if changes else rows
+        finally:
+            mm.close()
+        yield from added
+
+    def load(self, table_name: str) -> list[dict]:
+        """Загружает все строки таблицы; при отсутствии файла — пустой список."""
+        _ensure_data_dir()
+        return list(self.scan(table_name))
+
+    def count(self, table_name: str) -> int:
+        """Возвращает число строк: из заголовка файла с поправкой на
+        удалённые и новые строки дельта-файла.
+        """
+        opened = self._open_directory(table_name)
+        if opened is None:
+            return 0
+        mm, row_count, directory, _, delta = opened
+        try:
+            changes, added, _ = self._delta_view(mm, row_count, directory, delta)
+        finally:
+            mm.close()
+        if not changes:
+            return row_count
+        base = delta["base"]
+        removed = sum(
+            1 for row_id, row in changes.items() if row is None and row_id in base
+        )
+        return row_count - removed + len(added)
+
+    def fetch(self, table_name: str, ids) -> list[dict]:
+        """Читает строки с указанными ID: колонка ID целиком, остальные
+        колонки — только в позициях найденных строк.
+        """
+        opened = self._open_directory(table_name)
+        if opened is None:
+            return []
+        mm, row_count, directory, _, delta = opened
+        columns = directory["columns"]
+        wanted = set(ids)
+        try:
+            changes, added, _ = self._delta_view(mm, row_count, directory, delta)
+            id_column = next(
+                (c for c in columns if c["name"] == ID_COLUMN and c["type"] == "int"),
+                None,
+            )
+            if id_column is None:
+                rows = [
+                    row for row in self._rows(mm, columns, 0, row_count)
+                    if row.get(ID_COLUMN) in wanted
+                ]
+            else:
+                all_ids = self._read_values(mm, id_column, 0, row_count)
+                positions = {row_id: pos for pos, row_id in enumerate(all_ids)}
+                found = sorted(
+                    positions[row_id] for row_id in wanted if row_id in positions
+                )
+                rows = []
+                for pos in found:
+                    rows.extend(self._rows(mm, columns, pos, pos + 1))
+        finally:
+            mm.close()
+        if changes:
+            rows = _apply_changes(rows, changes)
+            rows.extend(row for row in added if row[ID_COLUMN] in wanted)
+        return rows
+
+    def segments(self, table_name: str, condition=None) -> list[dict]:
+        """Сегменты — диапазоны позиций строк из каталога файла (для файлов
+        без каталога сегментов они вычисляются по колонке ID). В сегменте
+        остаются только зоны, которые могут удовлетворять условию ("ranges");
+        сегменты без таких зон не возвращаются. Изменения из дельта-файла
+        передаются сегменту, в границы ID которого попадают ("changes"),
+        новые строки — отдельным сегментом ("added").
+        """
+        path = self.path(table_name)
+        opened = self._open_directory(table_name)
+        if opened is None:
+            return []
+        mm, row_count, directory, file_id, delta = opened
+        try:
+            changes, added, keep = self._delta_view(mm, row_count, directory, delta)
+            bounds = directory.get("segments")
+            if bounds is None:
+                id_column = next(
+                    (c for c in directory["columns"] if c["name"] == ID_COLUMN),
+                    None,
+                )
+                bounds = []
+                for start in range(0, row_count, SEGMENT_ROWS):
+                    stop = min(start + SEGMENT_ROWS, row_count)
+                    ids = (
+                        self._read_values(mm, id_column, start, stop)
+                        if id_column is not None
+                        else []
+                    )
+                    bounds.append([start, stop, *_id_bounds(ids)])
+
+            segments = []
+            for start, stop, low, high in bounds:
+                ranges = self._row_ranges(
+                    mm, directory, file_id, path, condition, start, stop, keep
+                )
+                if not ranges:
+                    continue
+                segment = {
+                    "path": path,
+                    "file": file_id,
+                    "rows": sum(end - begin for begin, end in ranges),
+                    "min_id": low,
+                    "max_id": high,
+                    "ranges": ranges,
+                }
+                if changes:
+                    segment["changes"] = {
+                        row_id: row
+                        for row_id, row in changes.items()
+                        if low is None or type(row_id) is int and low <= row_id <= high
+                    }
+                segments.append(segment)
+        finally:
+            mm.close()
+        if added:
+            segments.append({
+                "path": path,
+                "file": file_id,
+                "rows": len(added),
+                "min_id": None,
+                "max_id": None,
+                "ranges": [],
+                "added": added,
+            })
+        return segments
+
+    def read_segment(self, segment: dict) -> list[dict]:
+        """Читает строки сегмента (диапазоны позиций) через mmap
+        и накладывает на них изменения сегмента.
+        """
+        if "added" in segment:
+            return segment["added"]
+        with _open_segment(segment) as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _, directory = self._read_directory(mm, segment["path"])
+            rows = []
+            for start, stop in segment["ranges"]:
+                rows.extend(self._rows(mm, directory["columns"], start, stop))
+        finally:
+            mm.close()
+        if segment.get("changes"):
+            rows = _apply_changes(rows, segment["changes"])
+        return rows
+
+    def apply(self, table_name: str, appended, written, removed) -> None:
+        """Дописывает пачку изменений в дельта-файл одной операцией записи;
+        если в нём стало больше BINARY_DELTA_MAX_SHARE строк таблицы,
+        вливает его в файл таблицы.
+        """
+        records = [{"del": row_id} for row_id in removed]
+        records.extend({"put": row} for row in written)
+        records.extend({"put": row} for row in appended)
+        if not records:
+            return
+
+        with data_lock(table_name).hold():
+            opened = self._open_directory(table_name)
+            if opened is None:
+                # Файла таблицы ещё нет: он создаётся сразу со всеми строками
+                self.save(table_name, [*written, *appended])
+                return
+            mm, row_count, _, file_id, delta = opened
+            mm.close()
+
+            lines = [(_LOG_ENCODER.encode(r) + "\n").encode("utf-8") for r in records]
+            with open(self._delta_path(table_name), "ab") as f:
+                # Оборванная запись или дельта-файл от другого файла таблицы
+                # отрезаются
+                f.truncate(delta["size"])
+                if delta["size"] == 0:
+                    header = {"file": list(file_id[:2])}
+                    lines.insert(0, (_LOG_ENCODER.encode(header) + "\n").encode())
+                    delta["changes"], delta["records"] = {}, 0
+                f.write(b"".join(lines))
+                delta["size"] = f.tell()
+
+            changes = delta["changes"]
+            for record in records:
+                if "put" in record:
+                    changes[record["put"][ID_COLUMN]] = record["put"]
+                else:
+                    changes[record["del"]] = None
+            delta["records"] += len(records)
+            delta["view"] = None
+            delta["key"] = (file_id, file_signature(self._delta_path(table_name)))
+
+            limit = max(COMPACT_MIN_DEAD, row_count * BINARY_DELTA_MAX_SHARE)
+            if delta["records"] > limit:
+                self.save(table_name, self.load(table_name))
+
+    def drop(self, table_name: str) -> None:
+        """Удаляет файл таблицы и её дельта-файл."""
+        with data_lock(table_name).hold():
+            super().drop(table_name)
+            self._remove_delta(table_name)
+
+    def repair(self, table_name: str) -> None:
+        """Отрезает оборванную последнюю запись дельта-файла."""
+        with data_lock(table_name).hold():
+            self._deltas.pop(table_name, None)
+            _cut_torn_record(self._delta_path(table_name))
+
+
+# Зарегистрированные движки; порядок задаёт приоритет при поиске файла таблицы
+STORAGE_ENGINES = {
+    LogStorage.name: LogStorage(),
+    BinaryStorage.name: BinaryStorage(),
+    JsonStorage.name: JsonStorage(),
+}
+
+
+def get_storage(table_name: str):
+    """Возвращает движок хранения таблицы: по найденному файлу или по умолчанию."""
+    for storage in STORAGE_ENGINES.values():
+        if storage.exists(table_name):
+            return storage
+    return STORAGE_ENGINES[DEFAULT_STORAGE]
+
+
+def table_signature(table_name: str) -> tuple | None:
+    """Возвращает подпись данных таблицы (размер и mtime файлов) или None,
+    если файла нет.
+    """
+    return get_storage(table_name).signature(table_name)
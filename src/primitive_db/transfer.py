@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+"""Импорт и экспорт строк таблиц в файлах CSV и JSON Lines."""
+
+import csv
+import json
+import os
+
+from src.primitive_db.constants import ID_COLUMN
+
+TRANSFER_FORMATS = ("csv", "jsonl")
+# Размер буфера записи при экспорте
+EXPORT_BUFFER_SIZE = 1024 * 1024
+
+
+def detect_format(filepath: str) -> str:
+    """Определяет формат файла по расширению (.csv или .jsonl)."""
+    ext = os.path.splitext(filepath)[1].lower().lstrip(".")
+    if ext == "ndjson":
+        ext = "jsonl"
+    if ext not in TRANSFER_FORMATS:
+        raise ValueError(
+            f"Неизвестный формат файла '{filepath}'. "
+            f"Поддерживаются: {', '.join(TRANSFER_FORMATS)}."
+        )
+    return ext
+
+
+def _read_csv(filepath: str, columns: list[str]):
+    """Построчно читает CSV; первая строка считается заголовком,
+    если состоит из имён колонок таблицы (колонка ID игнорируется).
+    """
+    with open(filepath, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return
+
+        header = [cell.strip() for cell in first]
+        if set(header) - {ID_COLUMN} == set(columns):
+            positions = [header.index(name) for name in columns]
+            for values in reader:
+                if values:
+                    yield [values[pos] for pos in positions]
+            return
+
+        yield first
+        for values in reader:
+            if values:
+                yield values
+
+
+def _read_jsonl(filepath: str, columns: list[str]):
+    """Построчно читает JSON Lines: объект {колонка: значение} или список значений."""
+    with open(filepath, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, list):
+                yield record
+                continue
+            if not isinstance(record, dict):
+                raise ValueError(f"Строка {lineno}: ожидается объект или список.")
+            missing = [name for name in columns if name not in record]
+            if missing:
+                raise ValueError(
+                    f"Строка {lineno}: нет значений для колонок {', '.join(missing)}."
+                )
+            yield [record[name] for name in columns]
+
+
+_READERS = {
+    "csv": _read_csv,
+    "jsonl": _read_jsonl,
+}
+
+
+def read_records(filepath: str, columns: list[str], fmt: str | None = None):
+    """Потоково читает значения строк (без ID) из файла CSV или JSON Lines."""
+    fmt = fmt or detect_format(filepath)
+    return _READERS[fmt](filepath, columns)
+
+
+def _write_csv(f, columns: list[str], rows) -> int:
+    """Пишет строки в CSV с заголовком; возвращает их число."""
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([row.get(name) for name in columns])
+        count += 1
+    return count
+
+
+def _write_jsonl(f, columns: list[str], rows) -> int:
+    """Пишет строки в JSON Lines (один объект на строку); возвращает их число."""
+    encoder = json.JSONEncoder(ensure_ascii=False)
+    count = 0
+    for row in rows:
+        f.write(encoder.encode({name: row.get(name) for name in columns}))
+        f.write("\n")
+        count += 1
+    return count
+
+
+_WRITERS = {
+    "csv": _write_csv,
+    "jsonl": _write_jsonl,
+}
+
+
+def write_records(filepath: str, columns: list[str], rows, fmt: str | None = None):
+    """Потоково записывает строки в файл CSV или JSON Lines; возвращает их число.
+
+    rows может быть генератором: строки не накапливаются в памяти.
+    """
+    fmt = fmt or detect_format(filepath)
+    if fmt not in _WRITERS:
+        raise ValueError(
+            f"Неизвестный формат '{fmt}'. "
+            f"Поддерживаются: {', '.join(TRANSFER_FORMATS)}."
+        )
+    with open(
+        filepath, "w", encoding="utf-8", newline="", buffering=EXPORT_BUFFER_SIZE
+    ) as f:
+        return _WRITERS[fmt](f, columns, rows)
@@ -2,58 +2,595 @@
 
 import json
 import os
+from contextlib import contextmanager
 
-from src.primitive_db.constants import DATA_DIR, TABLE_FILE_EXT
+from src.primitive_db.buffer import (
+    cached_metadata,
+    dirty_tables,
+    drop_buffer,
+    evict,
+    get_buffer,
+    store_metadata,
+)
+from src.primitive_db.columnar import ColumnarTable, columnar_available
+from src.primitive_db.constants import (
+    BUFFER_FLUSH_POLICY,
+    BUFFER_POOL_MAX_ROWS,
+    COLUMNAR_ENABLED,
+    COLUMNAR_MIN_ROWS,
+    DATA_DIR,
+    DEFAULT_STORAGE,
+    ID_COLUMN,
+)
+from src.primitive_db.index import drop_table_indexes, rows_removed, rows_written
+from src.primitive_db.lock import data_lock, writer_lock
+from src.primitive_db.storage import (
+    STORAGE_ENGINES,
+    JsonStorage,
+    file_signature,
+    get_storage,
+    replace_file,
+    sync_path,
+    table_signature,
+)
+from src.primitive_db.wal import get_wal
 
 
 def load_metadata(filepath):
-    """Загружает метаданные БД из JSON; при отсутствии файла возвращает пустой dict."""
+    """Загружает метаданные БД из JSON; при отсутствии файла возвращает пустой dict.
+
+    Разобранные метаданные берутся из буферного пула, пока файл не изменился.
+    """
+    signature = file_signature(filepath)
+    cached = cached_metadata(filepath, signature)
+    if cached is not None:
+        return cached
+
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
-            return data
     except FileNotFoundError:
         return {}
 
+    store_metadata(filepath, signature, data)
+    return data
+
+
+def _write_metadata(filepath, data) -> None:
+    """Атомарно перезаписывает файл метаданных."""
+    text = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    replace_file(filepath, lambda f: f.write(text))
+    store_metadata(filepath, file_signature(filepath), data)
+
 
 def save_metadata(filepath, data):
-    """Сохраняет метаданные БД в JSON-файл."""
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Сохраняет метаданные БД в JSON-файл.
+
+    Снимок метаданных сначала фиксируется в журнале: иначе при
+    восстановлении более старый снимок из журнала перекрыл бы этот файл.
+    """
+    get_wal().append({"meta": filepath, "data": data}, sync=True)
+    _write_metadata(filepath, data)
+
 
+# Счётчики записей в таблицы за сессию (для инвалидации кэшей)
+_WRITE_COUNTERS = {}
+# Момент сброса изменений на диск (см. BUFFER_FLUSH_POLICY)
+_FLUSH_SETTINGS = {"policy": BUFFER_FLUSH_POLICY}
+# Таблицы, файлы которых изменены после последней контрольной точки
+_UNSYNCED = set()
+# Открытая транзакция: изменения копятся в памяти до commit;
+# блокировки записи изменённых таблиц держатся до её конца
+_TRANSACTION = {"active": False, "locks": []}
 
-def _ensure_data_dir() -> None:
-    """Создаёт каталог для данных таблиц, если его нет."""
-    os.makedirs(DATA_DIR, exist_ok=True)
+
+def set_flush_policy(policy: str) -> None:
+    """Задаёт момент сброса изменений на диск: 'write' или 'checkpoint'."""
+    if policy not in ("write", "checkpoint"):
+        raise ValueError(f"Неизвестный режим сброса '{policy}'.")
+    _FLUSH_SETTINGS["policy"] = policy
+
+
+def _log(record: dict) -> None:
+    """Дописывает запись в журнал; внутри транзакции изменения попадут
+    в журнал одной записью при commit.
+    """
+    if not _TRANSACTION["active"]:
+        get_wal().append(record)
+
+
+@contextmanager
+def table_write_lock(table_name: str):
+    """Блокировка записи таблицы на время команды: другие процессы не
+    изменят таблицу между чтением строк и записью результата.
+
+    Внутри транзакции блокировка держится до commit или rollback.
+    """
+    lock = writer_lock(table_name)
+    lock.acquire()
+    if _TRANSACTION["active"] and lock not in _TRANSACTION["locks"]:
+        lock.acquire()
+        _TRANSACTION["locks"].append(lock)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def _bump_version(table_name: str) -> None:
+    """Отмечает, что данные таблицы изменились."""
+    _WRITE_COUNTERS[table_name] = _WRITE_COUNTERS.get(table_name, 0) + 1
+
+
+def table_version(table_name: str) -> tuple:
+    """Версия данных таблицы: счётчик записей сессии и подпись файла.
+
+    Подпись файла учитывает изменения, сделанные другими процессами.
+    """
+    return (_WRITE_COUNTERS.get(table_name, 0), table_signature(table_name))
+
+
+def _fresh_buffer(table_name: str):
+    """Возвращает буфер таблицы со строками, актуальными относительно диска."""
+    buffer = get_buffer(table_name)
+    signature = table_signature(table_name)
+    if buffer.rows is None or buffer.signature != signature:
+        # Подпись берётся под той же блокировкой, что и строки
+        with data_lock(table_name).hold(shared=True):
+            rows = get_storage(table_name).load(table_name)
+            buffer.signature = table_signature(table_name)
+        buffer.rows = buffer.overlay({row[ID_COLUMN]: row for row in rows})
+        buffer.columnar = None
+        evict(BUFFER_POOL_MAX_ROWS)
+    return buffer
 
 
 def load_table_data(table_name: str):
-    """Загружает данные таблицы из JSON; при отсутствии файла — пустой список."""
-    _ensure_data_dir()
-    filename = f"{table_name}{TABLE_FILE_EXT}"
-    filepath = os.path.join(DATA_DIR, filename)
+    """Загружает данные таблицы; при отсутствии файла — пустой список.
+
+    Таблица читается с диска только при первом обращении или после изменения
+    файла извне; строки не следует изменять на месте.
+    """
+    return list(_fresh_buffer(table_name).rows.values())
+
+
+def columnar_table(table_name: str, columns: list[dict], build: bool = True):
+    """Возвращает колоночное представление таблицы из пула или None,
+    если NumPy недоступен или таблица меньше COLUMNAR_MIN_ROWS строк.
+
+    При build=False представление не строится (и таблица не загружается):
+    возвращается только уже готовое и актуальное.
+    """
+    if not (COLUMNAR_ENABLED and columnar_available()):
+        return None
+
+    if build:
+        buffer = _fresh_buffer(table_name)
+    else:
+        buffer = get_buffer(table_name)
+        if buffer.columnar is None or buffer.signature != table_signature(
+            table_name
+        ):
+            return None
+
+    if len(buffer.rows) < COLUMNAR_MIN_ROWS:
+        return None
+    if buffer.columnar is None or buffer.columnar.schema != columns:
+        if not build:
+            return None
+        buffer.columnar = ColumnarTable(list(buffer.rows.values()), columns)
+    return buffer.columnar
+
+
+def iter_table_rows(table_name: str, condition=None):
+    """Выдаёт строки таблицы по одной, не загружая её в буферный пул.
+
+    Если таблица уже в пуле — строки берутся оттуда; иначе читаются с диска
+    потоково (отложенные изменения перед этим сбрасываются), и блоки файла,
+    где условию condition не удовлетворяет ни одна строка, пропускаются по
+    зонным картам. Само условие проверяет вызывающий.
+    """
+    buffer = get_buffer(table_name)
+    if buffer.rows is not None and buffer.signature == table_signature(table_name):
+        yield from list(buffer.rows.values())
+        return
+
+    flush_table(table_name)
+    if buffer.dirty:
+        # Незафиксированные изменения транзакции есть только в памяти
+        yield from load_table_data(table_name)
+        return
+    yield from get_storage(table_name).scan(table_name, condition)
+
+
+def count_table_rows(table_name: str) -> int:
+    """Возвращает число строк таблицы, не загружая её в буферный пул."""
+    buffer = get_buffer(table_name)
+    if buffer.rows is not None and buffer.signature == table_signature(table_name):
+        return len(buffer.rows)
+
+    flush_table(table_name)
+    if buffer.dirty:
+        return len(_fresh_buffer(table_name).rows)
+    return get_storage(table_name).count(table_name)
+
+
+def table_cold(table_name: str) -> bool:
+    """Сбрасывает отложенные изменения таблицы; True, если её строк нет
+    в буферном пуле (или они устарели), а файл на диске содержит все
+    изменения — тогда таблицу выгодно читать с диска по частям.
+    """
+    flush_table(table_name)
+    buffer = get_buffer(table_name)
+    if buffer.dirty:
+        # Незафиксированные изменения транзакции есть только в памяти
+        return False
+    return buffer.rows is None or buffer.signature != table_signature(table_name)
+
+
+def fetch_table_rows(table_name: str, ids) -> list[dict]:
+    """Возвращает строки таблицы с указанными ID."""
+    buffer = get_buffer(table_name)
+    if buffer.rows is not None and buffer.signature == table_signature(table_name):
+        rows = [buffer.rows[row_id] for row_id in ids if row_id in buffer.rows]
+    else:
+        ids = list(ids)
+        found = get_storage(table_name).fetch(table_name, ids)
+        found = buffer.overlay({row[ID_COLUMN]: row for row in found})
+        rows = [found[row_id] for row_id in ids if row_id in found]
+    return sorted(rows, key=lambda row: row[ID_COLUMN])
+
+
+def flush_table(table_name: str) -> None:
+    """Сбрасывает на диск отложенные изменения таблицы
+    (внутри транзакции изменения остаются в памяти до commit).
+    """
+    buffer = get_buffer(table_name)
+    if not buffer.dirty or _TRANSACTION["active"]:
+        return
+
+    with writer_lock(table_name).hold(), data_lock(table_name).hold():
+        before = table_signature(table_name)
+        in_sync = buffer.signature == before
+        get_storage(table_name).apply(table_name, *buffer.take_pending())
+        # Индексы уже содержат эти изменения — им нужна лишь новая подпись
+        rows_written(table_name, [], before)
+        buffer.signature = table_signature(table_name) if in_sync else None
+    _UNSYNCED.add(table_name)
+
+
+def flush_tables() -> None:
+    """Сбрасывает на диск изменения всех таблиц."""
+    if _TRANSACTION["active"]:
+        return
+    for table_name in dirty_tables():
+        flush_table(table_name)
+
+
+def in_transaction() -> bool:
+    """Открыта ли транзакция."""
+    return _TRANSACTION["active"]
+
+
+def begin_transaction() -> None:
+    """Открывает транзакцию: изменения таблиц копятся в памяти.
+
+    Ранее отложенные изменения сначала сбрасываются на диск, чтобы откат
+    затронул только изменения транзакции.
+    """
+    if _TRANSACTION["active"]:
+        raise ValueError("Транзакция уже открыта.")
+    flush_tables()
+    _TRANSACTION["active"] = True
+
+
+def commit_transaction() -> int:
+    """Фиксирует транзакцию; возвращает число изменённых таблиц.
 
+    Все изменения записываются в журнал одной записью (она либо целиком
+    есть в журнале, либо её нет), затем каждая таблица сбрасывается на диск
+    одной записью.
+    """
+    if not _TRANSACTION["active"]:
+        raise ValueError("Нет открытой транзакции.")
+
+    records = []
+    tables = dirty_tables()
+    for table_name in tables:
+        appended, written, removed = get_buffer(table_name).pending()
+        records.append({"table": table_name, "put": appended + written, "del": removed})
+    if records:
+        get_wal().append({"tx": records}, sync=True)
+
+    _TRANSACTION["active"] = False
+    flush_tables()
+    _release_transaction_locks()
+    return len(tables)
+
+
+def rollback_transaction() -> int:
+    """Откатывает транзакцию: изменения в памяти отбрасываются, таблицы
+    будут заново прочитаны с диска. Возвращает число таблиц.
+
+    Выданные в транзакции ID не возвращаются (как у последовательностей).
+    """
+    if not _TRANSACTION["active"]:
+        raise ValueError("Нет открытой транзакции.")
+
+    tables = dirty_tables()
+    for table_name in tables:
+        drop_buffer(table_name)
+        # Индексы уже содержат изменения транзакции: они будут перестроены
+        drop_table_indexes(table_name, ())
+        _bump_version(table_name)
+
+    _TRANSACTION["active"] = False
+    _release_transaction_locks()
+    return len(tables)
+
+
+def _release_transaction_locks() -> None:
+    """Снимает блокировки записи, удерживаемые до конца транзакции."""
+    for lock in _TRANSACTION["locks"]:
+        lock.release()
+    _TRANSACTION["locks"].clear()
+
+
+def _sync_data_dir() -> None:
+    """Сбрасывает на диск каталоги с файлами данных и метаданных."""
+    sync_path(DATA_DIR)
+    sync_path(os.curdir)
+
+
+def checkpoint() -> None:
+    """Контрольная точка: сбрасывает изменения в файлы, фиксирует файлы
+    на диске (fsync) и очищает журнал упреждающей записи.
+
+    Журнал очищается, только если с БД не работают другие процессы; если
+    в нём есть их записи (например, упавшего процесса), они сначала
+    применяются заново.
+    """
+    flush_tables()
+    for table_name in _UNSYNCED:
+        get_storage(table_name).sync(table_name)
+    _UNSYNCED.clear()
+    _sync_data_dir()
+
+    wal = get_wal()
+    if not wal.try_exclusive():
+        return
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
+        if wal.foreign():
+            _replay_wal(wal)
+        else:
+            wal.reset()
+    finally:
+        wal.release_exclusive()
+
+
+def _after_write(table_name: str) -> None:
+    """Завершает запись: версия таблицы и немедленный сброс, если он включён."""
+    _bump_version(table_name)
+    if _FLUSH_SETTINGS["policy"] == "write":
+        flush_table(table_name)
+
+
+def append_table_rows(table_name: str, rows: list[dict]) -> None:
+    """Добавляет новые строки в таблицу без перезаписи существующих."""
+    _log({"table": table_name, "put": rows})
+    before = table_signature(table_name)
+    get_buffer(table_name).stage_append(rows)
+    rows_written(table_name, rows, before)
+    _after_write(table_name)
+
+
+def load_table_rows(table_name: str, rows: list[dict]) -> None:
+    """Добавляет много новых строк (insert_many, import).
+
+    В пустую таблицу строки записываются без журнала упреждающей записи:
+    файл таблицы создаётся заново атомарной заменой и сразу фиксируется на
+    диске, так что после сбоя таблица либо пуста, либо содержит все строки,
+    а строки кодируются один раз, а не для журнала и файла по отдельности.
+    Так можно, только если в журнале нет записей этой таблицы: иначе
+    восстановление проиграло бы их (например, удаление таблицы с тем же
+    именем) поверх загруженного файла. Внутри транзакции, при несброшенных
+    изменениях таблицы, для непустой таблицы и при таких записях строки
+    добавляются как обычно (append_table_rows).
+    """
+    buffer = get_buffer(table_name)
+    if _TRANSACTION["active"] or buffer.dirty:
+        append_table_rows(table_name, rows)
+        return
+
+    storage = get_storage(table_name)
+    with writer_lock(table_name).hold(), data_lock(table_name).hold():
+        if storage.count(table_name) or get_wal().touches(table_name):
+            loaded = False
+        else:
+            before = table_signature(table_name)
+            storage.save(table_name, rows)
+            storage.sync(table_name)
+            _sync_data_dir()
+            buffer.rows = {row[ID_COLUMN]: row for row in rows}
+            buffer.signature = table_signature(table_name)
+            buffer.columnar = None
+            rows_written(table_name, rows, before)
+            loaded = True
+    if loaded:
+        _bump_version(table_name)
+    else:
+        append_table_rows(table_name, rows)
+
+
+def write_table_rows(table_name: str, rows: list[dict]) -> None:
+    """Сохраняет новые версии изменённых строк таблицы."""
+    _log({"table": table_name, "put": rows})
+    before = table_signature(table_name)
+    get_buffer(table_name).stage_write(rows)
+    rows_written(table_name, rows, before)
+    _after_write(table_name)
+
+
+def remove_table_rows(table_name: str, ids) -> None:
+    """Удаляет из таблицы строки с указанными ID."""
+    ids = list(ids)
+    _log({"table": table_name, "del": ids})
+    before = table_signature(table_name)
+    get_buffer(table_name).stage_remove(ids)
+    rows_removed(table_name, ids, before)
+    _after_write(table_name)
+
+
+def convert_table_data(table_name: str, storage_name: str) -> int:
+    """Переписывает данные таблицы в указанном формате хранения
+    (старый файл удаляется); возвращает число строк.
+    """
+    if storage_name not in STORAGE_ENGINES:
+        raise ValueError(
+            f"Неизвестный формат хранения '{storage_name}'. "
+            f"Допустимы: {', '.join(STORAGE_ENGINES)}."
+        )
+
+    target = STORAGE_ENGINES[storage_name]
+    with writer_lock(table_name).hold(), data_lock(table_name).hold():
+        flush_table(table_name)
+        source = get_storage(table_name)
+        rows = load_table_data(table_name)
+        before = table_signature(table_name)
+        target.save(table_name, rows)
+        if source is not target:
+            source.drop(table_name)
+        # Содержимое не изменилось — индексам нужно лишь запомнить новую подпись
+        rows_written(table_name, [], before)
+        get_buffer(table_name).signature = table_signature(table_name)
+    _UNSYNCED.add(table_name)
+    return len(rows)
+
+
+def compact_table_data(table_name: str) -> int:
+    """Уплотняет данные таблицы; возвращает число строк.
+
+    Таблица в старом формате JSON при этом переводится в формат по умолчанию,
+    остальные форматы сохраняются.
+    """
+    source = get_storage(table_name)
+    storage_name = DEFAULT_STORAGE if source.name == JsonStorage.name else source.name
+    return convert_table_data(table_name, storage_name)
+
+
+def delete_table_data_file(table_name: str, index_columns=()) -> None:
+    """Удаляет файлы данных и индексов таблицы (при drop таблицы)."""
+    drop_buffer(table_name)
+    for storage in STORAGE_ENGINES.values():
+        storage.drop(table_name)
+    drop_table_indexes(table_name, index_columns)
+    _UNSYNCED.discard(table_name)
+    _bump_version(table_name)
+
+
+def drop_table_data(filepath, data, table_name: str, index_columns=()) -> None:
+    """Удаляет таблицу: сохраняет метаданные без неё и удаляет её файлы.
+
+    Обе части фиксируются в журнале одной записью: сбой между ними
+    не оставит ни таблицу без данных, ни осиротевший файл данных.
+    """
+    with writer_lock(table_name).hold():
+        get_wal().append(
+            {
+                "drop": table_name,
+                "indexes": list(index_columns),
+                "meta": filepath,
+                "data": data,
+            },
+            sync=True,
+        )
+        _write_metadata(filepath, data)
+        delete_table_data_file(table_name, index_columns)
+
+
+def _replay_changes(table_name: str, reset, changes: dict) -> None:
+    """Применяет к файлу таблицы изменения из журнала (по ID строк).
+
+    Повторное применение безопасно: строка с тем же ID просто заменяется.
+    """
+    storage = get_storage(table_name)
+    rows = storage.load(table_name) if reset is None else reset
+    rows = {row[ID_COLUMN]: row for row in rows}
+    for row_id, row in changes.items():
+        if row is None:
+            rows.pop(row_id, None)
+        else:
+            rows[row_id] = row
+    storage.save(table_name, list(rows.values()))
+    storage.sync(table_name)
+
+
+def recover_wal() -> int:
+    """Применяет записи журнала, оставшиеся после сбоя; возвращает их число.
+
+    Пока с БД работают другие процессы, журнал не трогается: его проиграет
+    последний из них в контрольной точке.
+    """
+    wal = get_wal()
+    if not wal.try_exclusive():
+        return 0
+    try:
+        return _replay_wal(wal)
+    finally:
+        wal.release_exclusive()
+
+
+def _replay_wal(wal) -> int:
+    """Проигрывает журнал и очищает его; возвращает число записей.
+
+    Для каждой таблицы из журнала собирается итоговое состояние изменённых
+    строк, и файл таблицы переписывается один раз; метаданные берутся из
+    последнего снимка. Затем файлы сбрасываются на диск.
+    """
+    records = wal.records()
+    if not records:
+        return 0
+
+    metadata = {}
+    # Таблица -> (полный набор строк или None, {ID: строка или None})
+    tables = {}
+    # Запись транзакции содержит все её изменения
+    records = [
+        part for record in records for part in record.get("tx", (record,))
+    ]
+    for record in records:
+        if "meta" in record:
+            metadata[record["meta"]] = record["data"]
+        if "drop" in record:
+            tables.pop(record["drop"], None)
+            delete_table_data_file(record["drop"], record.get("indexes", ()))
+            continue
+        if "table" not in record:
+            continue
 
+        reset, changes = tables.setdefault(record["table"], (None, {}))
+        if "rows" in record:
+            reset, changes = record["rows"], {}
+            tables[record["table"]] = (reset, changes)
+        for row in record.get("put", ()):
+            changes[row[ID_COLUMN]] = row
+        for row_id in record.get("del", ()):
+            changes[row_id] = None
 
-def save_table_data(table_name: str, data) -> None:
-    """Сохраняет данные таблицы в JSON-файл."""
-    _ensure_data_dir()
-    filename = f"{table_name}{TABLE_FILE_EXT}"
-    filepath = os.path.join(DATA_DIR, filename)
+    for table_name, (reset, changes) in tables.items():
+        get_storage(table_name).repair(table_name)
+        _replay_changes(table_name, reset, changes)
+        drop_buffer(table_name)
+        _bump_version(table_name)
+    for filepath, data in metadata.items():
+        _write_metadata(filepath, data)
 
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    _sync_data_dir()
+    wal.reset()
+    return len(records)
 
 
-def delete_table_data_file(table_name: str) -> None:
-    """Удаляет файл данных таблицы, если он существует (при drop таблицы)."""
-    _ensure_data_dir()
-    filename = f"{table_name}{TABLE_FILE_EXT}"
-    filepath = os.path.join(DATA_DIR, filename)
-    if os.path.isfile(filepath):
-        os.remove(filepath)
+def repair_table_files(table_names) -> None:
+    """Исправляет файлы таблиц после сбоя во время дозаписи."""
+    for table_name in table_names:
+        get_storage(table_name).repair(table_name)
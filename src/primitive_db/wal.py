@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""Журнал упреждающей записи (WAL).
+
+Каждое изменение сначала дописывается в журнал одной строкой JSON и лишь
+затем применяется к файлам данных. Журнал сбрасывается на диск (fsync)
+согласно WAL_FSYNC_POLICY:
+
+- "always"   — после каждой записи;
+- "interval" — групповая фиксация: не чаще раза в WAL_FSYNC_INTERVAL_MS,
+  все записи за интервал фиксируются одним fsync;
+- "os"       — без fsync, момент записи на диск выбирает ОС.
+
+В контрольной точке файлы данных сбрасываются на диск, и журнал очищается;
+при запуске записи, оставшиеся в журнале после сбоя, применяются заново.
+
+Журнал общий для всех процессов, работающих с БД: запись дописывается под
+блокировкой, а каждый процесс на всё время работы держит разделяемую
+блокировку сеанса. Очистить или проиграть журнал может только процесс,
+оставшийся в сеансе один.
+"""
+
+import json
+import os
+import threading
+
+from src.primitive_db.constants import (
+    LOCK_FILE_EXT,
+    WAL_FSYNC_INTERVAL_MS,
+    WAL_FSYNC_POLICY,
+    WAL_PATH,
+)
+from src.primitive_db.lock import get_lock
+
+WAL_FSYNC_POLICIES = ("always", "interval", "os")
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class WriteAheadLog:
+    """Файл журнала, открытый на дозапись, и состояние его синхронизации."""
+
+    def __init__(self, path: str, policy: str, interval_ms: int):
+        if policy not in WAL_FSYNC_POLICIES:
+            raise ValueError(
+                f"Неизвестный режим fsync '{policy}'. "
+                f"Допустимы: {', '.join(WAL_FSYNC_POLICIES)}."
+            )
+        self.path = path
+        self.policy = policy
+        self.interval = interval_ms / 1000
+        self._file = None
+        self._lock = threading.Lock()
+        self._unsynced = False
+        self._timer = None
+        # Сколько байт дописал этот процесс после последней очистки
+        self._appended = 0
+        lock_path = f"{path}{LOCK_FILE_EXT}"
+        self._session = get_lock(lock_path, 0, "Блокировка сеанса журнала")
+        self._append_lock = get_lock(lock_path, 1, "Блокировка журнала")
+
+    def _handle(self):
+        """Возвращает файл журнала, открывая его (и входя в сеанс)
+        при первом обращении.
+        """
+        if self._file is None:
+            self._session.acquire(shared=True)
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def append(self, record: dict, sync: bool = False) -> None:
+        """Дописывает запись; sync=True — зафиксировать её немедленно
+        (кроме режима "os").
+        """
+        line = (_ENCODER.encode(record) + "\n").encode("utf-8")
+        with self._lock:
+            f = self._handle()
+            with self._append_lock.hold():
+                f.write(line)
+                f.flush()
+            self._appended += len(line)
+            self._unsynced = True
+            if self.policy == "always" or (sync and self.policy != "os"):
+                self._fsync()
+            elif self.policy == "interval" and self._timer is None:
+                self._timer = threading.Timer(self.interval, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _fsync(self) -> None:
+        """Сбрасывает журнал на диск (вызывается под блокировкой)."""
+        if self._unsynced and self._file is not None:
+            os.fsync(self._file.fileno())
+        self._unsynced = False
+
+    def sync(self) -> None:
+        """Фиксирует все записи, ещё не сброшенные на диск."""
+        with self._lock:
+            self._timer = None
+            if self.policy != "os":
+                self._fsync()
+
+    def records(self) -> list[dict]:
+        """Читает записи журнала; оборванная последняя строка
+        (сбой во время записи) отбрасывается.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.read().split(b"\n")
+        except FileNotFoundError:
+            return []
+
+        records = []
+        # После последнего перевода строки — пустая строка или оборванная запись
+        for line in lines[:-1]:
+            if line.strip():
+                records.append(json.loads(line))
+        return records
+
+    def touches(self, table_name: str) -> bool:
+        """Есть ли в журнале изменения или удаление таблицы (в том числе
+        внутри транзакций). Разбираются только строки, где встречается
+        имя таблицы.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.read().split(b"\n")
+        except FileNotFoundError:
+            return False
+
+        name = _ENCODER.encode(table_name).encode("utf-8")
+        for line in lines[:-1]:
+            if name not in line:
+                continue
+            record = json.loads(line)
+            for part in record.get("tx", (record,)):
+                if table_name in (part.get("table"), part.get("drop")):
+                    return True
+        return False
+
+    def try_exclusive(self) -> bool:
+        """Пытается остаться в сеансе одному (без ожидания); при успехе
+        другие процессы не войдут в сеанс до release_exclusive.
+        """
+        self._handle()
+        return self._session.try_acquire()
+
+    def release_exclusive(self) -> None:
+        """Снова допускает другие процессы в сеанс."""
+        self._session.release()
+
+    def foreign(self) -> bool:
+        """Есть ли в журнале записи других процессов (или прошлых запусков)."""
+        f = self._handle()
+        return os.fstat(f.fileno()).st_size > self._appended
+
+    def reset(self) -> None:
+        """Очищает журнал (после контрольной точки или восстановления)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            f = self._handle()
+            f.seek(0)
+            f.truncate()
+            self._appended = 0
+            self._unsynced = True
+            if self.policy != "os":
+                self._fsync()
+            self._unsynced = False
+
+    def close(self) -> None:
+        """Фиксирует записи и закрывает файл журнала."""
+        self.sync()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_WAL = {"log": None}
+
+
+def get_wal() -> WriteAheadLog:
+    """Возвращает журнал сессии (создаётся при первом обращении)."""
+    if _WAL["log"] is None:
+        _WAL["log"] = WriteAheadLog(WAL_PATH, WAL_FSYNC_POLICY, WAL_FSYNC_INTERVAL_MS)
+    return _WAL["log"]
+
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+"""Зонные карты: статистика блоков таблицы для пропуска их при переборе.
+
+Файл таблицы делится на зоны по ZONE_ROWS строк. Для каждой колонки зоны
+хранятся наименьшее и наибольшее значение, число пустых значений и фильтр
+Блума различных значений (только если границ недостаточно: у bool-колонок и
+у целых колонок, где встречается каждое значение между границами, фильтра
+нет). По ним zone_may_match решает, может ли в зоне найтись строка,
+удовлетворяющая условию WHERE: ответ «нет» точен, и зону можно не читать,
+ответ «да» означает лишь «возможно».
+
+Зона — словарь {"rows": число строк, "columns": {колонка: [min, max,
+пустых, фильтр Блума]}, "start": ..., "stop": ...}; границы [start, stop)
+задаёт движок хранения: позиции строк в двоичном формате, смещения байт
+в журнале строк (см. storage.py).
+"""
+
+import base64
+import json
+import zlib
+from itertools import chain
+
+from src.primitive_db.constants import ID_COLUMN
+
+# Фильтр Блума: бит на различное значение и число хеш-функций
+# (около 3% ложных срабатываний)
+_BLOOM_BITS_PER_VALUE = 8
+_BLOOM_HASHES = 3
+# Префикс сохранённого фильтра с текущими хеш-функциями: фильтры без него
+# построены прежними функциями и не используются
+_BLOOM_PREFIX = "2:"
+_KEY_ENCODER = json.JSONEncoder(ensure_ascii=False, sort_keys=True)
+_MASK64 = (1 << 64) - 1
+
+
+def _bloom_hashes(value) -> tuple[int, int]:
+    """Два хеша значения для двойного хеширования: равные значения (1, 1.0,
+    True) дают одинаковые хеши, как при сравнении в условии WHERE. Целые
+    перемешиваются умножением, остальные значения — через CRC32 и Adler-32
+    (hash() не подходит: для строк он разный в разных процессах).
+    """
+    if isinstance(value, (bool, int, float)) and value == int(value):
+        mixed = int(value) * 0x9E3779B97F4A7C15 & _MASK64
+        return mixed >> 32, mixed & 0xFFFFFFFF | 1
+    if isinstance(value, str):
+        data = b"s" + value.encode("utf-8")
+    elif isinstance(value, float):
+        data = b"n" + repr(value).encode()
+    else:
+        data = b"j" + _KEY_ENCODER.encode(value).encode("utf-8")
+    return zlib.crc32(data), zlib.adler32(data) | 1
+
+
+def _make_bloom(values) -> str | None:
+    """Фильтр Блума по множеству значений (base64) или None, если значения
+    нельзя хешировать.
+    """
+    size = max(64, len(values) * _BLOOM_BITS_PER_VALUE)
+    bits = bytearray(size // 8 + 1)
+    try:
+        for value in values:
+            first, second = _bloom_hashes(value)
+            for i in range(_BLOOM_HASHES):
+                position = (first + i * second) % size
+                bits[position >> 3] |= 1 << (position & 7)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return _BLOOM_PREFIX + base64.b64encode(bits).decode("ascii")
+
+
+def _bloom_contains(bloom: int, size: int, value) -> bool:
+    """Может ли значение входить в множество фильтра."""
+    try:
+        first, second = _bloom_hashes(value)
+    except (TypeError, ValueError, OverflowError):
+        return True
+    return all(
+        bloom >> (first + i * second) % size & 1 for i in range(_BLOOM_HASHES)
+    )
+
+
+def _needs_bloom(distinct: set, low, high) -> bool:
+    """Нужен ли колонке фильтр Блума: у bool-колонки и у целой колонки,
+    где между границами встречается каждое значение, равенство точно
+    проверяется по границам.
+    """
+    if low is None:
+        return True
+    if isinstance(low, bool) and isinstance(high, bool):
+        return False
+    if type(low) is int and type(high) is int and len(distinct) == high - low + 1:
+        return not all(type(value) is int for value in distinct)
+    return True
+
+
+def _column_stats(values: list, with_bloom: bool) -> list:
+    """Статистика колонки зоны: [min, max, пустых, фильтр Блума]."""
+    present = [value for value in values if value is not None]
+    low = high = None
+    if present:
+        try:
+            low, high = min(present), max(present)
+        except TypeError:
+            # Значения разных типов несравнимы: границ нет
+            pass
+    bloom = None
+    if with_bloom and present:
+        try:
+            distinct = set(present)
+        except TypeError:
+            distinct = None
+        if distinct is not None and _needs_bloom(distinct, low, high):
+            bloom = _make_bloom(distinct)
+    return [low, high, len(values) - len(present), bloom]
+
+
+def build_zone(rows: list[dict]) -> dict:
+    """Статистика зоны по её строкам (без положения в файле).
+
+    Для колонки ID фильтр Блума не строится: её значения уникальны,
+    и границ достаточно.
+    """
+    names = dict.fromkeys(chain.from_iterable(rows))
+    return {
+        "rows": len(rows),
+        "columns": {
+            name: _column_stats(
+                [row.get(name) for row in rows], with_bloom=name != ID_COLUMN
+            )
+            for name in names
+        },
+    }
+
+
+def prepare_zone(zone: dict) -> dict:
+    """Готовит прочитанную зону к проверкам: фильтры Блума из base64
+    переводятся в числа (один раз при загрузке), фильтры прежнего формата
+    отбрасываются.
+    """
+    for stats in zone["columns"].values():
+        if isinstance(stats[3], str):
+            if not stats[3].startswith(_BLOOM_PREFIX):
+                stats[3] = None
+                continue
+            data = base64.b64decode(stats[3][len(_BLOOM_PREFIX):])
+            stats[3] = (int.from_bytes(data, "little"), (len(data) - 1) * 8)
+    return zone
+
+
+def _may_compare(op: str, value, stats: list, rows: int) -> bool:
+    """Может ли хоть одно значение колонки зоны дать True при сравнении."""
+    low, high, nulls, bloom = stats
+    if op == "!=":
+        # Пустое значение не равно никакому непустому
+        return not (nulls == 0 and low is not None and low == high == value)
+    if value is None:
+        return True
+    if nulls >= rows:
+        # Все значения пусты: сравнение с непустым значением ложно
+        return False
+
+    if low is not None:
+        try:
+            if op == "=" and (value < low or value > high):
+                return False
+            if op == "<" and not low < value:
+                return False
+            if op == "<=" and not low <= value:
+                return False
+            if op == ">" and not high > value:
+                return False
+            if op == ">=" and not high >= value:
+                return False
+        except TypeError:
+            return True
+
+    if op == "=" and isinstance(bloom, tuple):
+        return _bloom_contains(bloom[0], bloom[1], value)
+    return True
+
+
+def zone_may_match(condition, zone: dict) -> bool:
+    """Может ли в зоне найтись строка, удовлетворяющая условию (дерево
+    parser.parse_condition; None — любое условие).
+    """
+    if condition is None:
+        return True
+    kind = condition[0]
+    if kind == "and":
+        return all(zone_may_match(child, zone) for child in condition[1])
+    if kind == "or":
+        return any(zone_may_match(child, zone) for child in condition[1])
+    if kind == "not":
+        # Отрицание по статистике не проверить
+        return True
+
+    column = condition[2] if kind == "cmp" else condition[1]
+    stats = zone["columns"].get(column)
+    if stats is None:
+        # Колонки нет ни в одной строке зоны: сравнение ложно, кроме !=
+        return kind == "cmp" and condition[1] == "!="
+    rows = zone["rows"]
+    if kind == "cmp":
+        return _may_compare(condition[1], condition[3], stats, rows)
+    if kind == "in":
+        return any(_may_compare("=", value, stats, rows) for value in condition[2])
+    if kind == "between":
+        return _may_compare(">=", condition[2], stats, rows) and _may_compare(
+            "<=", condition[3], stats, rows
+        )
+    return True
+
+
+def skipped_ranges(zones: list[dict], condition, keep=None) -> list[list]:
+    """Границы [start, stop) зон, в которых ни одна строка не удовлетворяет
+    условию; соседние зоны объединяются в один диапазон. Зоны, для которых
+    keep(зона) истинно, не пропускаются (их статистика могла устареть).
+    """
+    ranges = []
+    if condition is None:
+        return ranges
+    for zone in zones:
+        if zone_may_match(condition, zone) or (keep is not None and keep(zone)):
+            continue
+        if ranges and ranges[-1][1] == zone["start"]:
+            ranges[-1][1] = zone["stop"]
+        else:
+            ranges.append([zone["start"], zone["stop"]])
+    return ranges